@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+###########################################
+## BinLog.py
+##
+## Created: 17 October 2026
+## Modified: 17 October 2026
+##
+## Purpose: Compact binary format for the cache and branch logger traces
+##
+## A component of the CORE-V-WALLY configurable RISC-V project.
+##
+## Copyright (C) 2021-23 Harvey Mudd College & Oklahoma State University
+##
+## SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+##
+## Licensed under the Solderpad Hardware License v 2.1 (the “License”); you may not use this file
+## except in compliance with the License, or, at your option, the Apache License version 2.0. You
+## may obtain a copy of the License at
+##
+## https:##solderpad.org/licenses/SHL-2.1/
+##
+## Unless required by applicable law or agreed to in writing, any work distributed under the
+## License is distributed on an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+## either express or implied. See the License for the specific language governing permissions
+## and limitations under the License.
+################################################################################################
+
+# how to invoke this converter:
+# BinLog.py <log file> (-o <binary log>) (-t icache|dcache|branch)
+# converts an ICache.log, DCache.log or branch_<type><size>.log written by
+# testbench.sv into a binary log (by default the same name ending in .binlog).
+# BinLog.py -i <binary log> prints the header and segment index of a binary log.
+#
+# Every tool that reads logs through LogReader.py (CacheSim.py and friends)
+# accepts a binary log wherever it accepts a text log, and skips all of the
+# text parsing. A binary log is laid out as
+#   header - 32 bytes: magic "WALLYLOG", version (u16), reserved (u16, u32),
+#            offset and length (u64 each) of the index
+#   blocks - one per LogBatch of the text log. Each block holds the block's
+#            records column by column, every column a fixed-width field
+#            ('Q' = little-endian u64, 'c' = one character)
+#   index  - JSON: logger type, source log, first memfile, column list,
+#            record count, and per block its offset, record count, marker and
+#            label. The blocks that start at BEGIN and TRAIN markers are the
+#            segment boundaries.
+# All little-endian, so a block's columns load straight into arrays.
+
+import sys
+import os
+import json
+import struct
+import argparse
+from array import array
+import LogReader
+
+VERSION = 1
+HEADER = struct.Struct('<8sHHIQQ')
+
+LAYOUTS = {'icache': LogReader.CACHELAYOUT, 'dcache': LogReader.CACHELAYOUT,
+           'branch': LogReader.BRANCHLAYOUT}
+TYPECODES = {'hex': 'Q', 'char': 'c'}
+
+# guesses the logger type of a text log from its file name
+def loggertype(path):
+    name = os.path.basename(path).lower()
+    for logger in LAYOUTS:
+        if name.startswith(logger):
+            return logger
+    return 'dcache'
+
+# Writes a binary log one LogBatch at a time.
+# Use as a context manager, or call close() to write the index.
+# layout overrides the logger's record layout, for branch logs of the old layout.
+class BinLogWriter:
+    def __init__(self, path, logger, source='', layout=None):
+        self.path = path
+        self.layout = layout or LAYOUTS[logger]
+        self.index = {'logger': logger, 'source': source, 'memfile': '',
+                      'columns': [[name, TYPECODES[kind]] for name, kind in self.layout],
+                      'addrdigits': 0, 'records': 0, 'blocks': []}
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(LogReader.BINMAGIC, VERSION, 0, 0, 0, 0))
+
+    def write(self, batch):
+        offset = self.file.tell()
+        for name, kind in self.layout:
+            column = getattr(batch, name)
+            if kind == 'hex':
+                if sys.byteorder != 'little':
+                    column = array('Q', column)
+                    column.byteswap()
+                self.file.write(column.tobytes())
+            else:
+                self.file.write(column)
+        if batch.marker == 'BEGIN' and not self.index['memfile']:
+            self.index['memfile'] = batch.label
+        self.index['addrdigits'] = max(self.index['addrdigits'], batch.addrdigits)
+        self.index['records'] += len(batch)
+        self.index['blocks'].append([offset, len(batch), batch.marker, batch.label])
+
+    def close(self):
+        indexoffset = self.file.tell()
+        text = json.dumps(self.index).encode()
+        self.file.write(text)
+        self.file.seek(0)
+        self.file.write(HEADER.pack(LogReader.BINMAGIC, VERSION, 0, 0, indexoffset, len(text)))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# reads the index of a binary log
+def readindex(path):
+    with open(os.path.expanduser(path), "rb") as f:
+        magic, version, _, _, indexoffset, indexlength = HEADER.unpack(f.read(HEADER.size))
+        if magic != LogReader.BINMAGIC:
+            raise ValueError(path + " is not a binary log")
+        if version != VERSION:
+            raise ValueError(path + " is binary log version " + str(version) + ", expected " + str(VERSION))
+        f.seek(indexoffset)
+        return json.loads(f.read(indexlength))
+
+# yields the LogBatches of the blocks starting in the byte range [start, stop)
+def readlog(path, start=0, stop=None):
+    index = readindex(path)
+    log = LogReader.maplog(path)
+    with log:
+        for offset, count, marker, label in index['blocks']:
+            if offset < start or (stop is not None and offset >= stop):
+                continue
+            columns = {}
+            pos = offset
+            for name, typecode in index['columns']:
+                if typecode == 'Q':
+                    column = array('Q', log[pos:pos + 8*count])
+                    if sys.byteorder != 'little':
+                        column.byteswap()
+                    pos += 8*count
+                else:
+                    column = log[pos:pos + count]
+                    pos += count
+                columns[name] = column
+            yield LogReader.LogBatch(marker, label, offset, pos, index['addrdigits'], **columns)
+
+# returns the (marker, label, start, end) byte ranges of the segments
+# of a binary log, split at BEGIN and TRAIN like LogReader.segments()
+def segments(path):
+    index = readindex(path)
+    ranges = []
+    marker, label, start = None, '', HEADER.size
+    blocks = index['blocks']
+    for offset, count, blockmarker, blocklabel in blocks:
+        if blockmarker == 'BEGIN' or blockmarker == 'TRAIN':
+            if offset > start or marker is not None:
+                ranges.append((marker, label, start, offset))
+            marker, label, start = blockmarker, blocklabel, offset
+    recordsize = sum(8 if typecode == 'Q' else 1 for name, typecode in index['columns'])
+    end = blocks[-1][0] + blocks[-1][1]*recordsize if blocks else start
+    if end > start or marker is not None:
+        ranges.append((marker, label, start, end))
+    return ranges
+
+# converts the text log src into the binary log dst
+def convert(src, dst, logger=None):
+    if logger is None:
+        logger = loggertype(src)
+    layout = LogReader.branchlayout(src) if logger == 'branch' else LAYOUTS[logger]
+    with BinLogWriter(dst, logger, os.path.abspath(src), layout) as writer:
+        for batch in LogReader.readlog(src, layout):
+            writer.write(batch)
+    return writer.index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converts cache and branch logger traces to a binary log.")
+    parser.add_argument('log', help="Text log to convert, or binary log to describe with -i")
+    parser.add_argument('-o', "--output", help="Binary log to write (default: the log name ending in .binlog)")
+    parser.add_argument('-t', "--type", choices=sorted(LAYOUTS), help="Logger type (default: guessed from the file name)")
+    parser.add_argument('-i', "--info", action='store_true', help="Print the header and segment index of a binary log")
+
+    args = parser.parse_args()
+    log = os.path.expanduser(args.log)
+
+    if args.info:
+        index = readindex(log)
+        print("Logger:", index['logger'], " Source:", index['source'], " First memfile:", index['memfile'])
+        print("Columns:", ' '.join(name + ':' + typecode for name, typecode in index['columns']), " Records:", index['records'])
+        for marker, label, start, end in segments(log):
+            print(" ", marker, label, "bytes", start, "-", end)
+    else:
+        output = args.output or os.path.splitext(log)[0] + ".binlog"
+        index = convert(log, output, args.type)
+        print("Wrote", index['records'], index['logger'], "records in", len(index['blocks']), "blocks to", output)
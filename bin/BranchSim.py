@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+
+###########################################
+## BranchSim.py
+##
+## Created: 17 October 2026
+## Modified: 17 October 2026
+##
+## Purpose: Trace-driven simulation of Wally's branch direction predictors
+##
+## A component of the CORE-V-WALLY configurable RISC-V project.
+##
+## Copyright (C) 2021-23 Harvey Mudd College & Oklahoma State University
+##
+## SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+##
+## Licensed under the Solderpad Hardware License v 2.1 (the “License”); you may not use this file
+## except in compliance with the License, or, at your option, the Apache License version 2.0. You
+## may obtain a copy of the License at
+##
+## https:##solderpad.org/licenses/SHL-2.1/
+##
+## Unless required by applicable law or agreed to in writing, any work distributed under the
+## License is distributed on an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+## either express or implied. See the License for the specific language governing permissions
+## and limitations under the License.
+################################################################################################
+
+# how to invoke this simulator:
+# BranchSim.py <log file or directory> [...] (-p <predictor> ...) (-s <size> ...) (-j <jobs>) (-b) (-r)
+# e.g. 'BranchSim.py branch_twobit16.log' reports the direction misprediction rate of
+# every predictor at every size of bpred-sim.py's bpdSize. The logs are written by
+# testbench.sv with BPRED_LOGGER set to 1; a directory stands for all the *.log files in it,
+# such as the per-benchmark files of SeparateBranch.sh. Binary logs made by BinLog.py
+# work too. The conditional branches a log records do not depend on the predictor
+# the RTL ran with, so one log serves every predictor and size. Logs that also hold
+# the other control flow instructions (see FrontEndSim.py) are simulated on their
+# conditional branches only.
+#
+# The predictors are
+#   twobit, gshare, global, gshare_basic, global_basic - as in src/ifu/bpred, with the
+#       PHT and GHR reset to 0 at each TRAIN marker (as testbench.sv and the reset do),
+#       counting the branches between BEGIN and END as the HPM counters do
+#   twobitCModel, gshareCModel - the bimodal and gshare predictors of the sim_bp C model
+#       run by CModelBranchAccuracy.sh: counters start weakly taken, the index is PC[k+1:2]
+#       (xored with the history for gshare), and, like sim_bp on the output of
+#       SeparateBranch.sh, every branch from TRAIN to END is counted
+# A trace has no timing, so every prediction sees all the updates of the branches
+# before it. The RTL's gshare and gshare_basic differ only in how they handle branches
+# still in the pipeline (speculative history and forwarding), so they give the same
+# numbers here, as do global and global_basic.
+#
+# The output is the geometric mean over the benchmarks of the misprediction rate in
+# percent, per predictor, named as in parseHPMC.py (e.g. gshare10, twobitCModel6).
+# Add -b to print every benchmark's rate as well, and -r to compare with the C model's
+# RefData in parseHPMC.py. Add -j <jobs> to simulate that many TRAIN segments
+# at once (the default is one process per core).
+#
+# With NumPy installed, each PHT is simulated a whole segment at a time (see
+# counterpredictions); without it, a branch at a time.
+
+import sys
+import os
+import ast
+import math
+import argparse
+import multiprocessing
+from array import array
+from itertools import repeat
+import LogReader
+try:
+    import numpy as np
+except ImportError:
+    np = None # predictsegment falls back to simulating each branch in turn
+
+SIZES = [6, 8, 10, 12, 14, 16]
+PREDICTORS = ['twobit', 'gshare', 'global', 'gshare_basic', 'global_basic', 'twobitCModel', 'gshareCModel']
+# the C model predictors, which count warm-up branches and start their counters weakly taken
+CMODELS = ('twobitCModel', 'gshareCModel')
+# the history length every segment's GHRs are computed for; shorter ones are its top bits
+MAXHISTORY = 16
+
+# the name parseHPMC.py gives a predictor: gshare_basic is gshareBasic there
+def reportname(predictor, size):
+    head, _, tail = predictor.partition('_')
+    return head + tail.capitalize() + str(size)
+
+# the PHT index of a branch at pc with global history ghr (k bits, newest branch in
+# the top bit) for a predictor with 2**k entries. The RTL folds PC[1] into the top
+# bit of its PC hash, {PC[k+1]^PC[1], PC[k:2]}, so compressed branches on the two
+# halves of a word do not share an entry. Works on ints and on NumPy arrays alike.
+def phtindex(predictor, k, pc, ghr):
+    mask = (1 << k) - 1
+    if predictor in CMODELS:
+        pchash = (pc >> 2) & mask
+    else:
+        pchash = ((pc >> 2) & mask) ^ (((pc >> 1) & 1) << (k - 1))
+    if predictor.startswith('global'):
+        return ghr
+    if predictor.startswith('gshare'):
+        return pchash ^ ghr
+    return pchash
+
+# the initial value of the 2-bit counters
+def initialcounter(predictor):
+    return 2 if predictor in CMODELS else 0
+
+# The control flow instructions of one TRAIN segment of a log, at which the RTL resets
+# its predictor.
+#   pcs - array of the PCs
+#   dirs - bytes holding 't' or 'n' per instruction
+#   targets - array of the computed targets (0 for logs of the old layout)
+#   classes - bytes holding 'b', 'j', 'c' or 'r' per instruction ('b' for logs of the
+#             old layout, which only hold conditional branches)
+#   measured - bytes holding 1 for each instruction between BEGIN and END, else 0
+#   trained - bytes holding 1 for each instruction before END, which is what the C model counts
+#   label - the memfile of the segment's BEGIN marker
+class Segment:
+    def __init__(self, label=''):
+        self.label = label
+        self.pcs = array('Q')
+        self.dirs = bytearray()
+        self.targets = array('Q')
+        self.classes = bytearray()
+        self.measured = bytearray()
+        self.trained = bytearray()
+
+    def add(self, batch, measured, trained):
+        self.pcs.extend(batch.pc)
+        self.dirs += batch.dir
+        if 'cls' in batch.columns:
+            self.targets.extend(batch.target)
+            self.classes += batch.cls
+        else:
+            self.targets.extend(repeat(0, len(batch)))
+            self.classes += b'b'*len(batch)
+        self.measured += bytes([measured])*len(batch)
+        self.trained += bytes([trained])*len(batch)
+
+    # the segment of just the conditional branches, which are all the
+    # direction predictors see
+    def conditional(self):
+        if self.classes.count(b'b') == len(self.classes):
+            return self
+        branches = Segment(self.label)
+        for i, cls in enumerate(self.classes):
+            if cls == 98: # 'b'
+                branches.pcs.append(self.pcs[i])
+                branches.dirs.append(self.dirs[i])
+                branches.targets.append(self.targets[i])
+                branches.classes.append(cls)
+                branches.measured.append(self.measured[i])
+                branches.trained.append(self.trained[i])
+        return branches
+
+    def __len__(self):
+        return len(self.pcs)
+
+# reads the TRAIN segment in the byte range [start, end) of a log
+def readsegment(path, start, end):
+    segment = Segment()
+    begun = ended = False
+    for batch in LogReader.readbranchlog(path, start, end):
+        # a binary log's empty END block can fall at the start of the next
+        # segment's range, so TRAIN and BEGIN undo an END before them
+        if batch.marker == 'TRAIN':
+            ended = False
+        elif batch.marker == 'BEGIN':
+            begun = True
+            ended = False
+            segment.label = batch.label
+        elif batch.marker == 'END':
+            ended = True
+        segment.add(batch, begun and not ended, not ended)
+    if not begun:
+        # a log without BEGIN markers, such as one cut by SeparateBranch.sh
+        # without them, counts every branch for every predictor
+        segment.measured = bytearray(segment.trained)
+    return segment
+
+# splits a log at its TRAIN markers, returning (start, end) byte ranges. The BEGIN
+# markers found by LogReader.segments do not reset the predictor, so they stay inside
+# their TRAIN segment.
+def trainranges(path):
+    ranges = []
+    for marker, label, start, end in LogReader.segments(path):
+        if ranges and marker != 'TRAIN':
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+# returns, for a sequence of PHT indices and outcomes in program order, whether the
+# 2-bit saturating counter each branch reads predicts taken. The counters start at init.
+#
+# Every branch applies x -> clamp(x +- 1, 0, 3) to its entry's counter, and a run of
+# such steps is again of the form x -> clamp(x + add, lo, hi). So, with the branches
+# sorted by index, each branch's counter follows from composing the steps of the
+# branches before it on its entry, which is done for all branches at once by pointer
+# jumping: each round composes a branch's function with the one ending just before
+# it, doubling the steps it covers. A branch drops out once its function reaches back
+# to the first branch on its entry, or is constant, which two or three steps in the
+# same direction make it; so biased branches settle within a few rounds.
+def counterpredictions(indices, taken, init):
+    n = len(indices)
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+    order = np.argsort(indices, kind='stable')
+    entry = indices[order]
+    steps = taken[order]
+    pos = np.arange(n)
+    first = np.ones(n, dtype=bool)
+    first[1:] = entry[1:] != entry[:-1]
+    entrystart = np.maximum.accumulate(np.where(first, pos, 0))
+
+    # the function of the steps reach..i of each branch i, as clamp(x + add, lo, hi)
+    add = np.where(steps, 1, -1).astype(np.int64)
+    lo = np.where(steps, 1, 0).astype(np.int64)
+    hi = np.where(steps, 3, 2).astype(np.int64)
+    reach = pos.copy()
+    active = np.nonzero(~first)[0]
+    while active.size:
+        prev = reach[active] - 1
+        add1, lo1, hi1 = add[prev], lo[prev], hi[prev]
+        add2, lo2, hi2 = add[active], lo[active], hi[active]
+        add[active] = add1 + add2
+        lo[active] = np.clip(lo1 + add2, lo2, hi2)
+        hi[active] = np.clip(hi1 + add2, lo2, hi2)
+        reach[active] = reach[prev]
+        active = active[(lo[active] != hi[active]) & (reach[active] > entrystart[active])]
+
+    # the counter after each branch, then before it
+    after = np.where(reach == entrystart, np.clip(init + add, lo, hi), lo)
+    before = np.empty(n, dtype=np.int64)
+    before[first] = init
+    before[~first] = after[np.nonzero(~first)[0] - 1]
+    predictions = np.empty(n, dtype=bool)
+    predictions[order] = before >= 2
+    return predictions
+
+# the global history before each branch, MAXHISTORY bits with the newest outcome on top,
+# starting from 0 at the beginning of the segment
+def histories(taken):
+    ghr = np.zeros(len(taken), dtype=np.int64)
+    outcomes = taken.astype(np.int64)
+    for j in range(1, min(MAXHISTORY, len(taken) - 1) + 1):
+        ghr[j:] |= outcomes[:-j] << (MAXHISTORY - j)
+    return ghr
+
+# the PCs, outcomes and counted flags of a segment as NumPy arrays
+def branchcolumns(segment):
+    pcs = np.frombuffer(segment.pcs, dtype=np.uint64).astype(np.int64) # bit 63 never indexes the PHT
+    taken = np.frombuffer(bytes(segment.dirs), dtype=np.uint8) == 116 # 't'
+    measured = np.frombuffer(bytes(segment.measured), dtype=np.uint8).astype(bool)
+    trained = np.frombuffer(bytes(segment.trained), dtype=np.uint8).astype(bool)
+    return pcs, taken, measured, trained
+
+# returns whether predictor, with 2**k PHT entries, predicts each branch of a segment
+# of conditional branches taken: a NumPy array, or a list without NumPy.
+# ghr is the segment's histories(), if already computed.
+def predictdirections(branches, predictor, k, ghr=None):
+    if np is None:
+        pht = [initialcounter(predictor)] * (1 << k)
+        history = 0
+        predictions = []
+        for pc, direction in zip(branches.pcs, branches.dirs):
+            taken = direction == 116 # 't'
+            index = phtindex(predictor, k, pc, history)
+            predictions.append(pht[index] >= 2)
+            pht[index] = min(pht[index] + 1, 3) if taken else max(pht[index] - 1, 0)
+            history = (history >> 1) | (taken << (k - 1))
+        return predictions
+
+    pcs, taken, measured, trained = branchcolumns(branches)
+    if ghr is None:
+        ghr = histories(taken)
+    indices = phtindex(predictor, k, pcs, ghr >> (MAXHISTORY - k))
+    return counterpredictions(indices, taken, initialcounter(predictor))
+
+# simulates every predictor and size on a segment, returning a dictionary of
+# (predictor, size): (branches, mispredictions) over the branches it counts
+def predictsegment(segment, predictors, sizes):
+    counts = {}
+    branches = segment.conditional()
+    if np is None:
+        taken = [direction == 116 for direction in branches.dirs] # 't'
+        for predictor in predictors:
+            counted = branches.trained if predictor in CMODELS else branches.measured
+            for k in sizes:
+                predictions = predictdirections(branches, predictor, k)
+                counts[(predictor, k)] = (sum(counted), sum(count and prediction != outcome
+                                                            for prediction, outcome, count in zip(predictions, taken, counted)))
+        return counts
+
+    pcs, taken, measured, trained = branchcolumns(branches)
+    ghr = histories(taken)
+    for predictor in predictors:
+        counted = trained if predictor in CMODELS else measured
+        for k in sizes:
+            wrong = predictdirections(branches, predictor, k, ghr) != taken
+            counts[(predictor, k)] = (int(counted.sum()), int((wrong & counted).sum()))
+    return counts
+
+# simulates one TRAIN segment, for the worker processes of simulate.
+# returns the benchmark's label and its counts.
+def simsegment(job):
+    path, start, end, predictors, sizes = job
+    segment = readsegment(path, start, end)
+    label = segment.label or "%s@%d" % (os.path.basename(path), start)
+    return label, predictsegment(segment, predictors, sizes)
+
+# the log files given on the command line, with directories standing for their *.log files
+def logfiles(paths):
+    files = []
+    for path in paths:
+        path = os.path.expanduser(path)
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.log')))
+        else:
+            files.append(path)
+    return files
+
+# simulates every predictor and size on every TRAIN segment of the logs, jobs
+# segments at a time, and returns a list of (benchmark, counts) in log order.
+# Segments that count no branches are left out.
+def simulate(paths, predictors=PREDICTORS, sizes=SIZES, jobs=1):
+    work = [(path, start, end, predictors, sizes) for path in logfiles(paths) for start, end in trainranges(path)]
+    if jobs > 1 and len(work) > 1:
+        with multiprocessing.Pool(min(jobs, len(work))) as pool:
+            results = pool.map(simsegment, work)
+    else:
+        results = list(map(simsegment, work))
+    return [(label, counts) for label, counts in results if any(branches for branches, misses in counts.values())]
+
+# the geometric mean of the misprediction rates in percent of the benchmarks that
+# count any branches, as CModelBranchAccuracy.sh computed it; 0 if any rate is 0
+def geomean(rates):
+    if not rates:
+        return 0.0
+    if min(rates) == 0:
+        return 0.0
+    return math.exp(sum(math.log(rate) for rate in rates)/len(rates))
+
+def missrate(branches, misses):
+    return 100*misses/branches
+
+# summarizes simulate's results as a dictionary of parseHPMC.py name: geometric mean
+def summarize(results, predictors=PREDICTORS, sizes=SIZES):
+    summary = {}
+    for predictor in predictors:
+        for k in sizes:
+            rates = [missrate(*counts[(predictor, k)]) for label, counts in results if counts[(predictor, k)][0]]
+            summary[reportname(predictor, k)] = geomean(rates)
+    return summary
+
+# the C model's reference numbers, read from parseHPMC.py (which cannot be imported,
+# since it runs on import)
+def refdata():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parseHPMC.py')) as f:
+        for node in ast.parse(f.read()).body:
+            if isinstance(node, ast.Assign) and any(getattr(target, 'id', None) == 'RefData' for target in node.targets):
+                return dict(ast.literal_eval(node.value))
+    return {}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulates Wally's branch direction predictors on BPRED_LOGGER logs.")
+    parser.add_argument('logs', nargs='+', help="Log files, or directories of *.log files")
+    parser.add_argument('-p', "--predictors", nargs='+', choices=PREDICTORS, default=PREDICTORS, help="Predictors to simulate (default all)")
+    parser.add_argument('-s', "--sizes", nargs='+', type=int, default=SIZES, help="log2 of the PHT entries (default 6 to 16 by 2)", metavar="K")
+    parser.add_argument('-j', "--jobs", type=int, default=os.cpu_count(), help="Worker processes, simulating the logs' TRAIN segments in parallel")
+    parser.add_argument('-b', "--benchmarks", action='store_true', help="Also report the misprediction rate of each benchmark")
+    parser.add_argument('-r', "--ref", action='store_true', help="Compare with the C model's RefData in parseHPMC.py")
+
+    args = parser.parse_args()
+    if any(k < 1 or k > MAXHISTORY for k in args.sizes):
+        sys.exit("sizes must be between 1 and %d" % MAXHISTORY)
+    results = simulate(args.logs, args.predictors, args.sizes, args.jobs)
+    if args.benchmarks:
+        for label, counts in results:
+            print(label)
+            for (predictor, k), (branches, misses) in counts.items():
+                if branches:
+                    print("  %-16s %10d branches %10d mispredicted %8.3f%%" % (reportname(predictor, k), branches, misses, missrate(branches, misses)))
+    reference = refdata() if args.ref else {}
+    for name, rate in summarize(results, args.predictors, args.sizes).items():
+        if name in reference:
+            print("%s %.6f (RefData %.6f)" % (name, rate, reference[name]))
+        else:
+            print("%s %.6f" % (name, rate))
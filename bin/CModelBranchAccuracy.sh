@@ -3,7 +3,7 @@
 ###########################################
 ## Written: ross1728@gmail.com
 ## Created: 12 March 2023
-## Modified: 
+## Modified: 17 October 2026
 ##
 ## Purpose: Takes a directory of branch outcomes organized as 1 files per benchmark.
 ##          Computes the geometric mean.
@@ -27,31 +27,11 @@
 ################################################################################################
 
 
-Directory="$1"
-Files="$1/*.log"
-
-for Pred in "bimodal" "gshare"
-do
-    for Size in $(seq 6 2 16)
-    do
-	if [ $Pred = "gshare" ]; then
-	    SizeString="$Size $Size 18 1"
-	elif [ $Pred = "bimodal" ]; then
-	    SizeString="$Size 18 1"
-	fi
+# The bimodal and gshare C models are simulated by BranchSim.py, which replaces
+# running sim_bp on every file and predictor size and multiplying the rates with bc.
+# It prints one "<predictor><size> <geometric mean>" line per predictor and size,
+# named as in parseHPMC.py's RefData (twobitCModel for bimodal).
 
-	Product=1.0
-	Count=0
-	for File in $Files
-	do
-	    #echo "sim_bp $Pred $Size $Size 18 1 $File | tail -1 | awk '{print $4}'"
-	    #echo "sim_bp $Pred $SizeString $File | tail -1 | awk '{print $4}'"
-	    BMDR=`sim_bp $Pred $SizeString $File | tail -1 | awk '{print $4}'`
-	    Product=`echo "$Product * $BMDR" | bc`
-	    Count=$((Count+1))
-	done
+Directory="$1"
 
-	GeoMean=`perl -E "say $Product**(1/$Count)"`
-	echo "$Pred$Size $GeoMean"
-    done
-done
+python3 "$(dirname "$0")/BranchSim.py" "$Directory" -p twobitCModel gshareCModel
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+###########################################
+## CacheHier.py
+##
+## Created: 17 October 2026
+## Modified: 17 October 2026
+##
+## Purpose: Simulate Wally's L1 I$ and D$ in front of a shared L2 cache,
+##          driven by an ICache.log and a DCache.log
+##
+## A component of the CORE-V-WALLY configurable RISC-V project.
+##
+## Copyright (C) 2021-23 Harvey Mudd College & Oklahoma State University
+##
+## SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+##
+## Licensed under the Solderpad Hardware License v 2.1 (the “License”); you may not use this file
+## except in compliance with the License, or, at your option, the Apache License version 2.0. You
+## may obtain a copy of the License at
+##
+## https:##solderpad.org/licenses/SHL-2.1/
+##
+## Unless required by applicable law or agreed to in writing, any work distributed under the
+## License is distributed on an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+## either express or implied. See the License for the specific language governing permissions
+## and limitations under the License.
+################################################################################################
+
+# how to invoke this simulator:
+# CacheHier.py -i <ICache.log> -d <DCache.log> (--l2 <geometry>) (--l1i <geometry>) (--l1d <geometry>)
+#              (--l2latency <cycles>) (--ahbw <bits>) (--latency <cycles>) (--burst <beats>)
+# Geometries are L,W,A,T[,policy[,victim]] as for CacheSweep.py. The L1s default to the
+# rv64gc and buildroot configs (64,4,56,44 each, with pseudo-LRU like Wally), and the
+# L2 to 256 KiB, 8 ways, 64 byte lines (512,8,56,41).
+# e.g. 'CacheHier.py -i ICache.log -d DCache.log --l2 1024,8,56,40 --l2latency 12'.
+#
+# Every L1 miss reads its line from the L2, and every line an L1 writes back
+# (on a dirty eviction or a flush) is written into the L2, which allocates on
+# writes too. Misses and writebacks of the L2 go to memory. Memory transfers
+# are costed with CacheSim.BusModel (see CacheSim.py -b), so --ahbw, --latency
+# and --burst match the ahb regression variants. The report compares the
+# average L1 miss latency and the memory traffic with and without the L2;
+# writebacks are assumed to be buffered, so they add traffic but not latency.
+#
+# The loggers do not record time, so the two logs are interleaved as well as
+# they allow: when both logs have the same sequence of BEGIN/TRAIN markers, as
+# when they come from the same run, their segments are paired up and all the
+# caches are emptied at the start of each pair. Within a pair the logs are
+# advanced in slices of --slice records, always from the log that is further
+# behind in proportion to its length. Logs with different markers are
+# interleaved over their whole length, emptying each L1 at its own markers.
+
+import os
+import argparse
+import LogReader
+import CacheSim
+import CacheSweep
+
+# access totals for one L1 cache
+class L1Stats:
+    def __init__(self, name, geometry):
+        self.name = name
+        self.geometry = geometry
+        self.accesses = 0
+        self.misses = 0
+        self.writebacks = 0 # dirty lines written back, on evictions and flushes
+        self.l2misses = 0   # misses that also missed in the L2
+
+# access totals for the L2 cache
+class L2Stats:
+    def __init__(self, geometry):
+        self.geometry = geometry
+        self.reads = 0
+        self.readmisses = 0
+        self.writes = 0
+        self.writemisses = 0
+        self.writebacks = 0 # dirty lines written back to memory
+
+# An L1 I$ and D$ in front of a shared L2, each a CacheSim.Cache
+# (or CacheSim.VictimCache) made from a CacheSweep.Geometry.
+class Hierarchy:
+    def __init__(self, l1i, l1d, l2):
+        self.l1 = {'I': l1i.makecache(), 'D': l1d.makecache()}
+        self.l1stats = {'I': L1Stats("ICache", l1i), 'D': L1Stats("DCache", l1d)}
+        self.l2 = l2.makecache()
+        self.l2stats = L2Stats(l2)
+
+    # empties one L1, or all the caches
+    def reset(self, which=None):
+        for cache in [self.l1[which]] if which else [self.l1['I'], self.l1['D'], self.l2]:
+            cache.invalidate()
+            cache.clear_pLRU()
+
+    # reads the line holding addr into an L1 from the L2.
+    # returns True if the L2 missed
+    def l2read(self, addr):
+        result = self.l2.cacheaccess(addr, False)
+        self.l2stats.reads += 1
+        if result == 'H' or result == 'V':
+            return False
+        self.l2stats.readmisses += 1
+        if result == 'D':
+            self.l2stats.writebacks += 1
+        return True
+
+    # writes a line written back by an L1 into the L2
+    def l2write(self, addr):
+        result = self.l2.cacheaccess(addr, True)
+        self.l2stats.writes += 1
+        if result != 'H' and result != 'V':
+            self.l2stats.writemisses += 1
+            if result == 'D':
+                self.l2stats.writebacks += 1
+
+    # simulates a slice of the accesses of one L1 and the L2 traffic they cause
+    def run(self, which, addrs, ops):
+        cache = self.l1[which]
+        stats = self.l1stats[which]
+        offsetlen = cache.offsetlen
+        writes = ops.translate(CacheSim.writetable)
+        for addr, op, write in zip(addrs, ops, writes):
+            if op == 70: # F
+                for line in cache.dirtylines():
+                    self.l2write(line << offsetlen)
+                stats.writebacks += cache.flush()
+            elif op == 73: # I
+                cache.invalidate()
+            else:
+                stats.accesses += 1
+                result = cache.cacheaccess(addr, write)
+                if result != 'H' and result != 'V':
+                    stats.misses += 1
+                    if result == 'D':
+                        stats.writebacks += 1
+                        self.l2write(cache.evicted << offsetlen)
+                    if self.l2read(addr):
+                        stats.l2misses += 1
+
+# yields the records of the byte range [start, end) of a cache log in slices of
+# at most slicelen records, as (position, marker, addr, op). position is the
+# byte offset reached at the end of the slice, estimated within a batch, and
+# marker is the batch's marker for its first slice and None after that.
+def slices(path, start, end, slicelen):
+    for batch in LogReader.readcachelog(path, start, end):
+        count = len(batch)
+        if count == 0:
+            yield batch.end, batch.marker, batch.addr, batch.op
+        for i in range(0, count, slicelen):
+            j = min(i + slicelen, count)
+            position = batch.start + (batch.end - batch.start)*j//count
+            yield position, batch.marker if i == 0 else None, batch.addr[i:j], batch.op[i:j]
+
+# runs the I$ and D$ byte ranges of one segment pair through the hierarchy,
+# taking the next slice from whichever log is proportionally further behind
+def runpair(hier, ipath, irange, dpath, drange, slicelen):
+    streams = {}
+    for which, path, (start, end) in (('I', ipath, irange), ('D', dpath, drange)):
+        if path is not None and end > start:
+            streams[which] = [0.0, start, end - start, slices(path, start, end, slicelen)]
+    while streams:
+        which = min(streams, key=lambda w: streams[w][0])
+        stream = streams[which]
+        try:
+            position, marker, addrs, ops = next(stream[3])
+        except StopIteration:
+            del streams[which]
+            continue
+        stream[0] = (position - stream[1])/stream[2]
+        if marker == 'BEGIN' or marker == 'TRAIN':
+            hier.reset(which)
+        hier.run(which, addrs, ops)
+
+# simulates a pair of logs through the hierarchy
+def simulate(hier, ipath, dpath, slicelen=1024):
+    isegs = LogReader.segments(ipath)
+    dsegs = LogReader.segments(dpath)
+    if [seg[:2] for seg in isegs] == [seg[:2] for seg in dsegs]:
+        for iseg, dseg in zip(isegs, dsegs):
+            hier.reset()
+            runpair(hier, ipath, iseg[2:], dpath, dseg[2:], slicelen)
+    else:
+        print("The logs have different BEGIN/TRAIN markers, so they are interleaved over their whole length.")
+        hier.reset()
+        irange = (isegs[0][2], isegs[-1][3]) if isegs else (0, 0)
+        drange = (dsegs[0][2], dsegs[-1][3]) if dsegs else (0, 0)
+        runpair(hier, ipath, irange, dpath, drange, slicelen)
+
+def percent(part, whole):
+    return "%.3f%%" % (100*part/whole) if whole else "-"
+
+# prints the hierarchy's miss rates, and the L1 miss latency and memory
+# traffic with and without the L2
+def report(hier, ahbw=64, burst=0, latency=0, l2latency=10):
+    l2 = hier.l2stats
+    l2bus = CacheSim.BusModel(1 << hier.l2.offsetlen, ahbw, burst, latency)
+    print("%-8s %-22s %12s %12s %10s %12s" % ("Cache", "Geometry", "Accesses", "Misses", "Miss rate", "Writebacks"))
+    for stats in hier.l1stats.values():
+        print("%-8s %-22s %12d %12d %10s %12d" % (stats.name, stats.geometry, stats.accesses, stats.misses,
+              percent(stats.misses, stats.accesses), stats.writebacks))
+    l2accesses = l2.reads + l2.writes
+    l2misses = l2.readmisses + l2.writemisses
+    print("%-8s %-22s %12d %12d %10s %12d" % ("L2", l2.geometry, l2accesses, l2misses,
+          percent(l2misses, l2accesses), l2.writebacks))
+    print("L2 reads: %d, %d misses (%s); writes: %d, %d misses (%s)" % (l2.reads, l2.readmisses,
+          percent(l2.readmisses, l2.reads), l2.writes, l2.writemisses, percent(l2.writemisses, l2.writes)))
+
+    print("Average L1 miss latency (cycles), with %d bit AHB, RAM latency %d, L2 latency %d:" % (ahbw, latency, l2latency))
+    for which, stats in hier.l1stats.items():
+        l1bus = CacheSim.BusModel(1 << hier.l1[which].offsetlen, ahbw, burst, latency)
+        withl2 = l2latency + stats.l2misses*l2bus.linecycles/stats.misses if stats.misses else 0.0
+        print("  %-8s without L2 %10.2f   with L2 %10.2f" % (stats.name, l1bus.linecycles, withl2))
+    nol2bytes = sum((stats.misses + stats.writebacks) << hier.l1[which].offsetlen
+                    for which, stats in hier.l1stats.items())
+    withl2bytes = (l2misses + l2.writebacks)*l2bus.linebytes
+    print("Memory traffic: %d bytes without L2, %d bytes with L2 (%s)" % (nol2bytes, withl2bytes,
+          percent(withl2bytes, nol2bytes)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulates L1 caches in front of a shared L2 from ICache and DCache logs.")
+    parser.add_argument('-i', "--icache", required=True, help="ICache log file")
+    parser.add_argument('-d', "--dcache", required=True, help="DCache log file")
+    parser.add_argument("--l1i", type=CacheSweep.Geometry.parse, default="64,4,56,44", help="L1 I$ geometry (default 64,4,56,44)", metavar="L,W,A,T")
+    parser.add_argument("--l1d", type=CacheSweep.Geometry.parse, default="64,4,56,44", help="L1 D$ geometry (default 64,4,56,44)", metavar="L,W,A,T")
+    parser.add_argument("--l2", type=CacheSweep.Geometry.parse, default="512,8,56,41", help="L2 geometry (default 512,8,56,41)", metavar="L,W,A,T")
+    parser.add_argument("--l2latency", type=int, default=10, help="Cycles to read a line from the L2 (default 10)")
+    parser.add_argument("--ahbw", type=int, default=64, help="AHB width in bits (default 64)")
+    parser.add_argument("--latency", type=int, default=0, help="RAM_LATENCY cycles per beat (default 0)")
+    parser.add_argument("--burst", type=int, default=0, help="Beats per AHB burst (default 0, a whole line; 1 disables bursts)")
+    parser.add_argument("--slice", type=int, default=1024, help="Records taken from one log at a time when interleaving (default 1024)")
+
+    args = parser.parse_args()
+    hier = Hierarchy(args.l1i, args.l1d, args.l2)
+    simulate(hier, os.path.expanduser(args.icache), os.path.expanduser(args.dcache), args.slice)
+    report(hier, args.ahbw, args.burst, args.latency, args.l2latency)
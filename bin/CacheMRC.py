@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+###########################################
+## CacheMRC.py
+##
+## Created: 17 October 2026
+## Modified: 17 October 2026
+##
+## Purpose: Compute true-LRU miss-ratio curves for every cache size and
+##          associativity from one pass over an ICache.log or DCache.log
+##
+## A component of the CORE-V-WALLY configurable RISC-V project.
+##
+## Copyright (C) 2021-23 Harvey Mudd College & Oklahoma State University
+##
+## SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+##
+## Licensed under the Solderpad Hardware License v 2.1 (the “License”); you may not use this file
+## except in compliance with the License, or, at your option, the Apache License version 2.0. You
+## may obtain a copy of the License at
+##
+## https:##solderpad.org/licenses/SHL-2.1/
+##
+## Unless required by applicable law or agreed to in writing, any work distributed under the
+## License is distributed on an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+## either express or implied. See the License for the specific language governing permissions
+## and limitations under the License.
+################################################################################################
+
+# how to invoke this analysis:
+# CacheMRC.py -f <log file> -o <offset bits> (-s <max set bits>) (-w <max ways>)
+# e.g. 'CacheMRC.py -f DCache.log -o 6 -s 10 -w 16' for 64-byte lines.
+# CacheSim.py <geometry> -f <log file> -p --mrc adds the curves to the --perf report,
+# using the line size of the simulated geometry.
+#
+# An LRU cache with S sets and W ways hits on an access exactly when fewer than
+# W other lines of the same set were touched since the previous access to the
+# line (its stack distance, after Mattson et al.). So one histogram of stack
+# distances per set count gives the miss ratio of every associativity (and so
+# every capacity) with that many sets. The distance of each access is the number
+# of distinct lines referenced since the line was last touched; marking only the
+# most recent access of every line in a Fenwick (binary indexed) tree over time
+# turns that into one prefix-sum query, so the whole log costs O(N log N) per
+# set count. For set-associative caches each set keeps its own timeline and tree.
+#
+# This models true LRU, not the pseudo-LRU of Wally's caches (they agree for 1 and
+# 2 ways); use CacheSim.py or CacheSweep.py for exact pLRU results. The cache is
+# emptied at every BEGIN/TRAIN marker and every I record, like in CacheSim.py;
+# flushes do not change which lines are present.
+
+import os
+import argparse
+from array import array
+import LogReader
+
+# Histograms of LRU stack distances over a log, for 2**s sets for each s in setbits.
+#   hist[s][d] - the number of accesses with stack distance d in their set
+#   cold[s]    - the number of first accesses to a line since the cache was emptied
+class StackDistances:
+    def __init__(self, offsetlen, setbits):
+        self.offsetlen = offsetlen
+        self.setbits = list(setbits)
+        self.accesses = 0
+        self.hist = {}
+        self.cold = {}
+        self.segments = [array('Q')]
+
+    # collects the line address of every access in a batch,
+    # starting a new segment where the cache is emptied
+    def add(self, batch):
+        segments = self.segments
+        if (batch.marker == 'BEGIN' or batch.marker == 'TRAIN') and len(segments[-1]):
+            segments.append(array('Q'))
+        start = 0
+        ops = batch.op
+        for i in range(len(ops)):
+            if ops[i] == 70 or ops[i] == 73: # F or I
+                segments[-1].extend(a >> self.offsetlen for a in batch.addr[start:i])
+                if ops[i] == 73 and len(segments[-1]):
+                    segments.append(array('Q'))
+                start = i + 1
+        segments[-1].extend(a >> self.offsetlen for a in batch.addr[start:])
+
+    # computes the histograms from the batches added so far
+    # (and from batches, if given)
+    def run(self, batches=()):
+        for batch in batches:
+            self.add(batch)
+        self.accesses = sum(len(segment) for segment in self.segments)
+        for s in self.setbits:
+            self.hist[s], self.cold[s] = self.distances(self.segments, s)
+        return self
+
+    # computes the stack distance histogram for 2**s sets
+    def distances(self, segments, s):
+        mask = (1 << s) - 1
+        # give each set its own tree, with one slot per access to the set
+        counts = [0]*(mask+1)
+        for segment in segments:
+            for line in segment:
+                counts[line & mask] += 1
+        trees = [array('l', bytes(8*(count + 1))) for count in counts]
+        nextslot = [1]*(mask+1) # Fenwick trees are 1-indexed
+        marks = [0]*(mask+1)    # the number of marks in each set's tree
+        hist = [0]
+        cold = 0
+        for segment in segments:
+            last = {}
+            for line in segment:
+                setnum = line & mask
+                tree = trees[setnum]
+                size = len(tree)
+                slot = nextslot[setnum]
+                nextslot[setnum] = slot + 1
+                prev = last.get(line)
+                if prev is None:
+                    cold += 1
+                    marks[setnum] += 1
+                else:
+                    # distinct lines touched since prev = marks after prev
+                    d = marks[setnum]
+                    i = prev
+                    while i > 0:
+                        d -= tree[i]
+                        i &= i - 1
+                    # prev is no longer the most recent access to line
+                    i = prev
+                    while i < size:
+                        tree[i] -= 1
+                        i += i & -i
+                    if d >= len(hist):
+                        hist.extend([0]*(d + 1 - len(hist)))
+                    hist[d] += 1
+                last[line] = slot
+                i = slot
+                while i < size:
+                    tree[i] += 1
+                    i += i & -i
+        return hist, cold
+
+    # the number of misses in an LRU cache with 2**s sets and the given ways
+    def misses(self, s, ways):
+        return self.cold[s] + sum(self.hist[s][ways:])
+
+    def missratio(self, s, ways):
+        return self.misses(s, ways)/self.accesses if self.accesses else 0.0
+
+# prints a table of miss ratios with one row per set count and one
+# column per associativity, plus the fully associative curve by capacity
+def printcurves(dists, maxways):
+    linebytes = 1 << dists.offsetlen
+    waylist = [1 << w for w in range(maxways.bit_length()) if 1 << w <= maxways]
+    print("LRU miss ratio (%) by sets x ways, over", dists.accesses, "accesses with", linebytes, "byte lines")
+    print("%8s" % "Sets" + "".join("%10s" % (str(w) + " way") for w in waylist))
+    for s in dists.setbits:
+        print("%8d" % (1 << s) + "".join("%10.3f" % (100*dists.missratio(s, w)) for w in waylist))
+    if 0 in dists.setbits:
+        print("Fully associative LRU miss ratio (%) by capacity")
+        lines = 1
+        while lines <= max(len(dists.hist[0]), 1):
+            print("%10d bytes %10.3f" % (lines*linebytes, 100*dists.missratio(0, lines)))
+            lines *= 2
+        print("%10d bytes %10.3f  (compulsory misses only)" % (lines*linebytes, 100*dists.missratio(0, lines)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Computes LRU miss-ratio curves from a cache log.")
+    parser.add_argument('-f', "--file", required=True, help="Log file to analyze")
+    parser.add_argument('-o', "--offsetlen", type=int, default=6, help="Line offset bits (default 6, 64-byte lines)")
+    parser.add_argument('-s', "--setbits", type=int, default=8, help="Analyze 1 to 2**setbits sets (default 8)")
+    parser.add_argument('-w', "--ways", type=int, default=16, help="Largest associativity in the table (default 16)")
+
+    args = parser.parse_args()
+    dists = StackDistances(args.offsetlen, range(args.setbits + 1))
+    dists.run(LogReader.readcachelog(os.path.expanduser(args.file)))
+    printcurves(dists, args.ways)
@@ -32,24 +32,67 @@
 # so the default invocation for rv64gc is 'CacheSim.py 64 4 56 44 -f <log file>'
 # the log files to run this simulator on can be generated from testbench.sv
 # by setting I_CACHE_ADDR_LOGGER and/or D_CACHE_ADDR_LOGGER to 1 before running tests.
+# The log file may also be a binary log made by BinLog.py, which is much faster to read.
 # I (Lim) recommend logging a single set of tests (such as wally64priv) at a time.
 # This helps avoid unexpected logger behavior.
+# With NumPy installed, runs of accesses are simulated a set at a time (see Cache.accessbatch).
 # With verbose mode off, the simulator only reports mismatches between its and Wally's behavior.
 # With verbose mode on, the simulator logs each access into the cache.
 # Add -p or --perf to report the hit/miss ratio. 
 # Add -d or --dist to report the distribution of loads, stores, and atomic ops.
 # These distributions may not add up to 100; this is because of flushes or invalidations.
+# Add -m or --mrc together with -p to also report true-LRU miss-ratio curves for
+# every number of sets up to this cache's and every associativity (see CacheMRC.py).
+# Add -j <jobs> to split the log at its BEGIN/TRAIN markers, where the cache is emptied,
+# and simulate the pieces in that many processes (the default is 1, a single process).
+# Verbose mode and --mrc always run in a single process.
+# Add -s or --sweep followed by more geometries (L,W,A,T) to simulate them all in one
+# pass of the log and report a hit/miss/eviction/writeback table (see CacheSweep.py).
+# Add --policy <plru|lru|fifo|random|srrip|brrip> to use another replacement policy,
+# and/or --victim <entries> to add a fully associative victim cache. Wally implements
+# pseudo-LRU without a victim cache, so these report the same table as --sweep instead
+# of checking mismatches. --seed sets the seed of the random policy.
+# Add -c or --compare to report that table for every policy on this geometry.
+# Add -b or --bus to report the bus traffic of each segment of the log: line fills,
+# writebacks on evictions and on flushes, and the bytes, AHB bursts and estimated stall
+# cycles they take. --ahbw sets the bus width in bits (default 64), --latency the
+# RAM_LATENCY of ram_ahb.sv and --burst the beats per burst (0, the default, bursts
+# whole lines; 1 is BURST_EN=0). So the 'ahb' regression variant with RAM_LATENCY=2,
+# BURST_EN=0 corresponds to '-b --latency 2 --burst 1'.
+# Add --snapshot <bytes> to save the cache state and counters every that many bytes of
+# the log (see loadsnapshot below), and --resume to continue from the latest snapshot
+# after a crash or an interrupted run. --start <byte offset> begins checking at that
+# point of the log, from the nearest snapshot before it (replaying only the rest, with
+# no output), and reports only what follows, e.g. from the point of a Linux checkpoint.
+# --snapdir picks the snapshot directory. These always run in a single process.
 
 import sys
 import math
 import argparse
 import os
+import re
+import io
+import contextlib
+import multiprocessing
+import random
+import collections
+import copy
+import pickle
+import zlib
+from array import array
+import LogReader
+try:
+    import numpy as np
+except ImportError:
+    np = None # accessbatch needs NumPy; without it every access goes through cacheaccess
 
+# A single cache line, used only to present the packed cache state
+# (for debugging and for __str__); the simulator itself never builds these.
 class CacheLine:
-    def __init__(self):
-        self.tag = 0
-        self.valid = False
-        self.dirty = False
+    def __init__(self, tag=0, valid=False, dirty=False):
+        self.tag = tag
+        self.valid = valid
+        self.dirty = dirty
     
     def __str__(self):
         string = "(V: " + str(self.valid) + ", D: " + str(self.dirty)
@@ -59,8 +102,195 @@ class CacheLine:
     def __repr__(self):
         return self.__str__()
 
+# Replacement policies. Each keeps its own packed per-set state and is told
+# about every access by the Cache:
+#   touch(setnum, waynum)  - an access hit the given way
+#   fill(setnum, waynum)   - a missing line was placed in the given way
+#   victim(setnum)         - returns the way to evict from a full set
+#   reset()                - returns the state to its power-on value
+# setlocal is True when a set's decisions only depend on that set's accesses.
+
+# Tree pseudo-LRU, as in Wally's cacheLRU. Each set's tree is packed into a
+# single integer word in the tree array, where bit i holds node i of the tree.
+class PLRUPolicy:
+    setlocal = True
+
+    def __init__(self, numsets, numways, seed=0):
+        self.numsets = numsets
+        self.numways = numways
+        self.bottomrow = (numways - 1)//2 # first index on the bottom row of the tree
+        self.reset()
+
+        # Touching a way always writes the same tree nodes (the path from
+        # the leaf to the root) with the same values, so the whole update
+        # reduces to one mask-and-set per access. Precompute it per way.
+        self.mask = []
+        self.bits = []
+        bottomrow = (self.numways - 1)//2
+        for waynum in range(self.numways if self.numways > 1 else 0):
+            index = (waynum // 2) + bottomrow
+            mask = 1 << index
+            bits = (not (waynum % 2)) << index
+            while index > 0:
+                parent = (index-1) // 2
+                mask |= 1 << parent
+                bits |= (index % 2) << parent
+                index = parent
+            self.mask.append(~mask)
+            self.bits.append(bits)
+
+    def reset(self):
+        self.tree = array('Q', bytes(8*self.numsets))
+
+    # updates the psuedo-LRU tree for the given set
+    # with an access to the given way
+    def touch(self, setnum, waynum):
+        if self.numways == 1:
+            return
+        
+        self.tree[setnum] = (self.tree[setnum] & self.mask[waynum]) | self.bits[waynum]
+
+    fill = touch
+
+    # uses the psuedo-LRU tree to select
+    # a victim way from the given set
+    # returns the victim way as an integer
+    def victim(self, setnum):
+        if self.numways == 1:
+            return 0
+        
+        tree = self.tree[setnum]
+        index = 0
+        bottomrow = (self.numways - 1) // 2 #first index on the bottom row of the tree
+        while index < bottomrow:
+            if (tree >> index) & 1 == 0:
+                # Go to the left child
+                index = index*2 + 1
+            else: #tree[index] == 1
+                # Go to the right child
+                index = index*2 + 2     
+        
+        victim = (index - bottomrow)*2
+        if (tree >> index) & 1:
+            victim += 1
+        
+        return victim
+
+# True LRU. Every line holds the time of its last access; the victim
+# is the way with the oldest time.
+class LRUPolicy:
+    setlocal = True
+
+    def __init__(self, numsets, numways, seed=0):
+        self.numsets = numsets
+        self.numways = numways
+        self.reset()
+
+    def reset(self):
+        self.stamps = array('Q', bytes(8*self.numsets*self.numways))
+        self.time = 0
+
+    def touch(self, setnum, waynum):
+        self.time += 1
+        self.stamps[setnum*self.numways + waynum] = self.time
+
+    fill = touch
+
+    def victim(self, setnum):
+        stamps = self.stamps[setnum*self.numways:(setnum+1)*self.numways]
+        return stamps.index(min(stamps))
+
+# First in, first out. Like LRU, but only fills update the time.
+class FIFOPolicy(LRUPolicy):
+    def touch(self, setnum, waynum):
+        pass
+
+    def fill(self, setnum, waynum):
+        self.time += 1
+        self.stamps[setnum*self.numways + waynum] = self.time
+
+# Uniformly random victims from a seeded generator. The generator is
+# reseeded on reset, so every segment of a log sees the same sequence
+# whether it is simulated alone or after the others.
+class RandomPolicy:
+    setlocal = False
+
+    def __init__(self, numsets, numways, seed=0):
+        self.numways = numways
+        self.seed = seed
+        self.reset()
+
+    def reset(self):
+        self.rng = random.Random(self.seed)
+
+    def touch(self, setnum, waynum):
+        pass
+
+    fill = touch
+
+    def victim(self, setnum):
+        return self.rng.randrange(self.numways)
+
+# Static re-reference interval prediction (Jaleel et al., ISCA 2010) with
+# 2-bit re-reference prediction values (RRPVs). Hits predict a near
+# re-reference (0), new lines a long one (2), and the victim is the first
+# way predicted distant (3), ageing the whole set until one is.
+class SRRIPPolicy:
+    setlocal = True
+    maxrrpv = 3
+
+    def __init__(self, numsets, numways, seed=0):
+        self.numsets = numsets
+        self.numways = numways
+        self.reset()
+
+    def reset(self):
+        self.rrpv = bytearray([self.maxrrpv])*(self.numsets*self.numways)
+
+    def touch(self, setnum, waynum):
+        self.rrpv[setnum*self.numways + waynum] = 0
+
+    def fill(self, setnum, waynum):
+        self.rrpv[setnum*self.numways + waynum] = self.maxrrpv - 1
+
+    def victim(self, setnum):
+        base = setnum*self.numways
+        rrpv = self.rrpv[base:base + self.numways]
+        age = self.maxrrpv - max(rrpv)
+        if age:
+            rrpv = bytes(value + age for value in rrpv)
+            self.rrpv[base:base + self.numways] = rrpv
+        return rrpv.index(self.maxrrpv)
+
+# Bimodal RRIP: like SRRIP, but new lines are predicted distant (3) except
+# for one fill in every 32, which resists thrashing by streaming accesses.
+class BRRIPPolicy(SRRIPPolicy):
+    setlocal = False
+    throttle = 32
+
+    def reset(self):
+        SRRIPPolicy.reset(self)
+        self.fills = 0
+
+    def fill(self, setnum, waynum):
+        self.fills += 1
+        if self.fills % self.throttle:
+            self.rrpv[setnum*self.numways + waynum] = self.maxrrpv
+        else:
+            self.rrpv[setnum*self.numways + waynum] = self.maxrrpv - 1
+
+policies = {'plru': PLRUPolicy, 'lru': LRUPolicy, 'fifo': FIFOPolicy,
+            'random': RandomPolicy, 'srrip': SRRIPPolicy, 'brrip': BRRIPPolicy}
+
+# The cache state is kept in flat, packed arrays indexed by
+# setnum*numways + waynum, so all the ways of a set are adjacent:
+#   tags  - array of unsigned 64-bit tags
+#   valid - bytearray of valid bits (0 or 1)
+#   dirty - bytearray of dirty bits (0 or 1)
+# The replacement state lives in the policy object (pseudo-LRU by default,
+# which is what Wally implements).
 class Cache:
-    def __init__(self, numsets, numways, addrlen, taglen):
+    def __init__(self, numsets, numways, addrlen, taglen, policy='plru', seed=0):
         self.numways = numways
         self.numsets = numsets
 
@@ -68,131 +298,550 @@ class Cache:
         self.taglen = taglen
         self.setlen = int(math.log(numsets, 2))
         self.offsetlen = self.addrlen - self.taglen - self.setlen
+        self.tagmask = (1 << self.taglen) - 1
+        self.setmask = (1 << self.setlen) - 1
+        self.offsetmask = (1 << self.offsetlen) - 1
 
-        self.ways = []
-        for i in range(numways):
-            self.ways.append([])
-            for j in range(numsets):
-                self.ways[i].append(CacheLine())
-        
-        self.pLRU = []
-        for i in range(self.numsets):
-            self.pLRU.append([0]*(self.numways-1))
+        numlines = numsets*numways
+        self.tags = array('Q', bytes(8*numlines))
+        self.valid = bytearray(numlines)
+        self.dirty = bytearray(numlines)
+        self.zeros = bytes(numlines)
+
+        self.policyname = policy
+        self.policy = policies[policy](numsets, numways, seed)
+
+        # the line address (tag and set) of the line evicted by the last
+        # access that returned E or D
+        self.evicted = 0
     
-    # flushes the cache by setting all dirty bits to False
+    # flushes the cache by setting all dirty bits to False.
+    # returns the number of valid dirty lines that are written back
     def flush(self):
-        for way in self.ways:
-            for line in way:
-                line.dirty = False
+        written = bin(int.from_bytes(self.valid, 'little') & int.from_bytes(self.dirty, 'little')).count('1')
+        self.dirty[:] = self.zeros
+        return written
     
     # invalidates the cache by setting all valid bits to False
     def invalidate(self):
-        for way in self.ways:
-            for line in way:
-                line.valid = False
+        self.valid[:] = self.zeros
     
-    # resets the pLRU to a fresh 2-D array of 0s
+    # resets the replacement state (the pLRU trees, for pseudo-LRU)
     def clear_pLRU(self):
-        self.pLRU = []
-        for i in range(self.numsets):
-            self.pLRU.append([0]*(self.numways-1))
+        self.policy.reset()
     
     # splits the given address into tag, set, and offset
     def splitaddr(self, addr):
         # no need for offset in the sim, but it's here for debug
-        tag = addr >> (self.setlen + self.offsetlen) & int('1'*self.taglen, 2)
-        setnum = (addr >> self.offsetlen) & int('1'*self.setlen, 2)
-        offset = addr & int('1'*self.offsetlen, 2)
+        tag = addr >> (self.setlen + self.offsetlen) & self.tagmask
+        setnum = (addr >> self.offsetlen) & self.setmask
+        offset = addr & self.offsetmask
         return tag, setnum, offset
     
+    # returns a copy of the whole cache state (lines and replacement state)
+    # as plain values that can be pickled, for restore()
+    def snapshot(self):
+        return {'geometry': (self.numsets, self.numways, self.addrlen, self.taglen, self.policyname),
+                'tags': self.tags.tobytes(), 'valid': bytes(self.valid), 'dirty': bytes(self.dirty),
+                'policy': copy.deepcopy(vars(self.policy)), 'evicted': self.evicted}
+
+    # puts the cache back in a state returned by snapshot()
+    def restore(self, state):
+        if state['geometry'] != (self.numsets, self.numways, self.addrlen, self.taglen, self.policyname):
+            raise ValueError("snapshot is of a %d,%d,%d,%d %s cache" % state['geometry'])
+        self.tags = array('Q')
+        self.tags.frombytes(state['tags'])
+        self.valid = bytearray(state['valid'])
+        self.dirty = bytearray(state['dirty'])
+        self.policy.__dict__.update(copy.deepcopy(state['policy']))
+        self.evicted = state['evicted']
+
+    # returns the line in the given way and set as a CacheLine
+    def getline(self, waynum, setnum):
+        index = setnum*self.numways + waynum
+        return CacheLine(self.tags[index], bool(self.valid[index]), bool(self.dirty[index]))
+
+    # returns the line addresses (tag and set) of the valid dirty lines,
+    # which a flush writes back
+    def dirtylines(self):
+        return [(self.tags[index] << self.setlen) | (index // self.numways)
+                for index in range(self.numsets*self.numways) if self.valid[index] and self.dirty[index]]
+
+    # returns the pLRU tree of the given set as a list of bits,
+    # with the root node first. Only a pseudo-LRU cache has one.
+    def getpLRU(self, setnum):
+        if self.policyname != 'plru':
+            raise ValueError("getpLRU needs a plru cache, not " + self.policyname)
+        word = self.policy.tree[setnum]
+        return [(word >> i) & 1 for i in range(self.numways-1)]
+    
     # performs a cache access with the given address.
     # returns a character representing the outcome:
     # H/M/E/D - hit, miss, eviction, or eviction with writeback
     def cacheaccess(self, addr, write=False):
         tag, setnum, _ = self.splitaddr(addr)
+        base = setnum*self.numways
+        end = base + self.numways
+        tags = self.tags
+        valid = self.valid
 
         # check our ways to see if we have a hit
-        for waynum in range(self.numways):
-            line = self.ways[waynum][setnum]
-            if line.tag == tag and line.valid:
-                line.dirty = line.dirty or write
-                self.update_pLRU(waynum, setnum)
+        index = base
+        while index < end:
+            try:
+                index = tags.index(tag, index, end)
+            except ValueError:
+                break
+            if valid[index]:
+                if write:
+                    self.dirty[index] = 1
+                self.policy.touch(setnum, index - base)
                 return 'H'
+            index += 1
 
         # we didn't hit, but we may not need to evict.
         # check for an empty way line.
-        for waynum in range(self.numways):
-            line = self.ways[waynum][setnum]
-            if not line.valid:
-                line.tag = tag
-                line.valid = True
-                line.dirty = write
-                self.update_pLRU(waynum, setnum)
-                return 'M'
+        index = valid.find(0, base, end)
+        if index >= 0:
+            tags[index] = tag
+            valid[index] = 1
+            self.dirty[index] = write
+            self.policy.fill(setnum, index - base)
+            return 'M'
         
         # we need to evict. Select a victim and overwrite.
-        victim = self.getvictimway(setnum)
-        line = self.ways[victim][setnum]
-        prevdirty = line.dirty
-        line.tag = tag
-        line.valid = True   # technically redundant
-        line.dirty = write
-        self.update_pLRU(victim, setnum)
+        victim = self.policy.victim(setnum)
+        index = base + victim
+        prevdirty = self.dirty[index]
+        self.evicted = (tags[index] << self.setlen) | setnum
+        tags[index] = tag
+        self.dirty[index] = write
+        self.policy.fill(setnum, victim)
         return 'D' if prevdirty else 'E'
+    
+    # Performs a run of accesses at once and returns their results as bytes
+    # holding H/M/E/D per access, like cacheaccess. addrs and writes are arrays
+    # of addresses and write flags (an array('Q') and a bytes of 0/1 will do).
+    # The sets of a cache never affect each other, so the addresses are split
+    # with NumPy and grouped by set, and each set's accesses then run in one
+    # tight loop over that set's lines. Only for policies whose state is per set
+    # (setlocal); evicted is not updated. Needs NumPy.
+    def accessbatch(self, addrs, writes):
+        addrs = np.asarray(addrs, dtype=np.uint64)
+        writes = np.frombuffer(writes, dtype=np.uint8) if isinstance(writes, (bytes, bytearray)) else np.asarray(writes, dtype=np.uint8)
+        tags = (addrs >> np.uint64(self.setlen + self.offsetlen)) & np.uint64(self.tagmask)
+        sets = ((addrs >> np.uint64(self.offsetlen)) & np.uint64(self.setmask)).astype(np.intp)
+        order = np.argsort(sets, kind='stable')
+        sets = sets[order]
+        bounds = [0] + (np.flatnonzero(sets[1:] != sets[:-1]) + 1).tolist() + [len(sets)]
+        tags = tags[order].tolist()
+        writes = writes[order].tolist()
+        sets = sets.tolist()
+        results = bytearray(len(tags))
+        for start, end in zip(bounds, bounds[1:]):
+            results[start:end] = self.accessset(sets[start], tags[start:end], writes[start:end])
+        unsorted = np.empty(len(results), dtype=np.uint8)
+        unsorted[order] = np.frombuffer(results, dtype=np.uint8)
+        return unsorted.tobytes()
 
-    # updates the psuedo-LRU tree for the given set
-    # with an access to the given way
-    def update_pLRU(self, waynum, setnum):
-        if self.numways == 1:
-            return
-        
-        tree = self.pLRU[setnum]
-        bottomrow = (self.numways - 1)//2
-        index = (waynum // 2) + bottomrow
-        tree[index] = int(not (waynum % 2))
-        while index > 0:
-            parent = (index-1) // 2
-            tree[parent] = index % 2 
-            index = parent
+    # performs a list of accesses to one set, for accessbatch.
+    # returns their results as a bytearray holding H/M/E/D.
+    def accessset(self, setnum, tags, writes):
+        numways = self.numways
+        base = setnum*numways
+        end = base + numways
+        settags = self.tags[base:end].tolist()
+        setvalid = list(self.valid[base:end])
+        setdirty = list(self.dirty[base:end])
+        ways = {settags[way]: way for way in range(numways - 1, -1, -1) if setvalid[way]} # valid tag -> way
+        results = bytearray(len(tags))
+        policy = self.policy
+        plru = type(policy) is PLRUPolicy and numways > 1
+        if plru:
+            # the pseudo-LRU updates inline, on a local copy of the set's tree
+            tree = policy.tree[setnum]
+            masks = policy.mask
+            bits = policy.bits
+        for i in range(len(tags)):
+            tag = tags[i]
+            way = ways.get(tag)
+            if way is not None:
+                if writes[i]:
+                    setdirty[way] = 1
+                results[i] = 72 # H
+            else:
+                if len(ways) < numways:
+                    way = setvalid.index(0)
+                    setvalid[way] = 1
+                    results[i] = 77 # M
+                else:
+                    if plru:
+                        index = 0
+                        while index < policy.bottomrow:
+                            index = index*2 + 1 + ((tree >> index) & 1)
+                        way = (index - policy.bottomrow)*2 + ((tree >> index) & 1)
+                    else:
+                        way = policy.victim(setnum)
+                    del ways[settags[way]]
+                    results[i] = 68 if setdirty[way] else 69 # D or E
+                settags[way] = tag
+                setdirty[way] = writes[i]
+                ways[tag] = way
+                if not plru:
+                    policy.fill(setnum, way)
+                    continue
+            if plru:
+                tree = (tree & masks[way]) | bits[way]
+            else:
+                policy.touch(setnum, way)
+        if plru:
+            policy.tree[setnum] = tree
+        self.tags[base:end] = array('Q', settags)
+        self.valid[base:end] = bytes(setvalid)
+        self.dirty[base:end] = bytes(setdirty)
+        return results
 
-    # uses the psuedo-LRU tree to select
-    # a victim way from the given set
-    # returns the victim way as an integer
-    def getvictimway(self, setnum):
-        if self.numways == 1:
-            return 0
-        
-        tree = self.pLRU[setnum]
-        index = 0
-        bottomrow = (self.numways - 1) // 2 #first index on the bottom row of the tree
-        while index < bottomrow:
-            if tree[index] == 0:
-                # Go to the left child
-                index = index*2 + 1
-            else: #tree[index] == 1
-                # Go to the right child
-                index = index*2 + 2     
-        
-        victim = (index - bottomrow)*2
-        if tree[index] == 1:
-            victim += 1
-        
-        return victim
-    
     def __str__(self):
         string = ""
         for i in range(self.numways):
             string += "Way " + str(i) + ": "
-            for line in self.ways[i]:
-                string += str(line) + ", "
+            for j in range(self.numsets):
+                string += str(self.getline(i, j)) + ", "
             string += "\n\n"
         return string
 
     def __repr__(self):
         return self.__str__()
-    
+
+# A small fully associative victim cache behind a Cache, holding the lines
+# the cache evicts (Jouppi, ISCA 1990). Lines are exclusive between the two:
+# a miss that finds its line in the victim cache moves it back into the
+# cache, and the line evicted to make room moves into the victim cache.
+# cacheaccess returns H for a hit in the cache, V for a hit in the victim
+# cache, and otherwise M, or E/D when a clean/dirty line falls out of the
+# victim cache to make room. The victim cache itself replaces LRU.
+class VictimCache:
+    def __init__(self, cache, entries):
+        self.cache = cache
+        self.entries = entries
+        self.lines = collections.OrderedDict() # line address -> dirty, oldest first
+        self.offsetlen = cache.offsetlen
+        self.evicted = 0
+
+    def flush(self):
+        written = self.cache.flush() + sum(self.lines.values())
+        for line in self.lines:
+            self.lines[line] = False
+        return written
+
+    def dirtylines(self):
+        return self.cache.dirtylines() + [line for line, dirty in self.lines.items() if dirty]
+
+    def invalidate(self):
+        self.cache.invalidate()
+        self.lines.clear()
+
+    def clear_pLRU(self):
+        self.cache.clear_pLRU()
+
+    def splitaddr(self, addr):
+        return self.cache.splitaddr(addr)
+
+    def cacheaccess(self, addr, write=False):
+        lineaddr = (addr >> self.offsetlen) & ((1 << (self.cache.addrlen - self.offsetlen)) - 1)
+        dirty = self.lines.pop(lineaddr, None)
+        result = self.cache.cacheaccess(addr, write or bool(dirty))
+        if result == 'H':
+            return 'H'
+        if result != 'M':
+            # keep the line the cache evicted
+            self.lines[self.cache.evicted] = result == 'D'
+            if len(self.lines) > self.entries:
+                self.evicted, linedirty = self.lines.popitem(last=False)
+                result = 'D' if linedirty else 'E'
+            else:
+                result = 'M'
+        return 'V' if dirty is not None else result
+
+# memory-side totals for one segment of a log (from one BEGIN/TRAIN
+# marker to the next), counted in cache lines
+class SegmentStats:
+    def __init__(self, marker=None, label=''):
+        self.marker = marker
+        self.label = label
+        self.fills = 0           # lines fetched on a miss
+        self.writebacks = 0      # dirty lines written back on an eviction
+        self.flushwritebacks = 0 # dirty lines written back by F records
+
+    # adds the H/M/E/D results of simaccesses
+    def add(self, results, flushwritebacks=0):
+        self.fills += len(results) - results.count(b'H') - results.count(b'V') - results.count(b'X')
+        self.writebacks += results.count(b'D')
+        self.flushwritebacks += flushwritebacks
+
+# Estimates the bus traffic of the line transfers counted in a SegmentStats.
+# Wally moves a line over AHB as linebytes/(AHBW/8) beats, issued as bursts of
+# burstbeats beats (the whole line with BURST_EN, one beat each without), and
+# ram_ahb.sv holds each beat for RAM_LATENCY extra cycles. Each burst costs one
+# address cycle and each beat 1 + latency cycles, which is an estimate of the
+# cycles the cache stalls for: it ignores arbitration with the other cache and
+# any overlap of a writeback with the fill that follows it.
+class BusModel:
+    def __init__(self, linebytes, ahbw=64, burstbeats=0, latency=0):
+        self.linebytes = linebytes
+        self.beats = max(linebytes*8 // ahbw, 1)
+        self.burstbeats = burstbeats if burstbeats > 0 else self.beats
+        self.latency = latency
+        self.linebursts = math.ceil(self.beats/self.burstbeats)
+        self.linecycles = self.linebursts + self.beats*(1 + latency)
+
+    # returns the bytes, bursts and stall cycles of a segment's transfers
+    def traffic(self, segment):
+        lines = segment.fills + segment.writebacks + segment.flushwritebacks
+        return lines*self.linebytes, lines*self.linebursts, lines*self.linecycles
+
+    def report(self, segments):
+        print("Bus traffic with %d byte lines, %d beats per line in bursts of %d, RAM latency %d:" %
+              (self.linebytes, self.beats, self.burstbeats, self.latency))
+        print("%-32s %10s %10s %10s %14s %10s %12s" % ("Segment", "Fills", "Writebacks", "Flushed", "Bytes", "Bursts", "Stall cycles"))
+        total = SegmentStats('', 'Total')
+        for segment in segments + [total]:
+            name = ((segment.marker or '') + ' ' + segment.label).strip() or '(start of log)'
+            print("%-32s %10d %10d %10d %14d %10d %12d" % ((name[-32:], segment.fills, segment.writebacks,
+                  segment.flushwritebacks) + self.traffic(segment)))
+            total.fills += segment.fills
+            total.writebacks += segment.writebacks
+            total.flushwritebacks += segment.flushwritebacks
+
+# running totals for a simulation, kept across batches of the log,
+# with the memory-side totals per segment in segments
+class SimStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.stores = 0
+        self.atoms = 0
+        self.totalops = 0
+        self.mismatches = 0
+        self.segments = []
+
+    def merge(self, other):
+        for name, value in vars(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+    # returns the totals as plain values that can be pickled, for setstate()
+    def getstate(self):
+        state = dict(vars(self))
+        state['segments'] = [dict(vars(segment)) for segment in self.segments]
+        return state
+
+    def setstate(self, state):
+        self.__dict__.update(state)
+        self.segments = []
+        for segmentstate in state['segments']:
+            segment = SegmentStats()
+            segment.__dict__.update(segmentstate)
+            self.segments.append(segment)
+
+# Snapshots of a simulation part way through a log, so that a long run can be
+# resumed, or started part way through. Each snapshot is a pickle file in a
+# snapshot directory (by default the log's name followed by .snapshots) named
+# for the cache and the byte offset of the log it was taken at, holding the
+# cache state, the SimStats at that point, and a checksum of the 64 KiB of the
+# log before the offset, so a snapshot of a log since rewritten is not used.
+SNAPVERSION = 1
+
+def snapshotname(cache, offset):
+    return "%d_%d_%d_%d_%s_%012d.snap" % (cache.numsets, cache.numways, cache.addrlen,
+                                          cache.taglen, cache.policyname, offset)
+
+# checksums the bytes of a log leading up to offset
+def logchecksum(path, offset):
+    log = LogReader.maplog(path)
+    if log is None:
+        return 0
+    with log:
+        return zlib.crc32(log[max(offset - 65536, 0):offset])
+
+def savesnapshot(snapdir, path, offset, cache, stats):
+    os.makedirs(snapdir, exist_ok=True)
+    snapshot = {'version': SNAPVERSION, 'offset': offset, 'checksum': logchecksum(path, offset),
+                'cache': cache.snapshot(), 'stats': stats.getstate()}
+    filename = os.path.join(snapdir, snapshotname(cache, offset))
+    # write a new file and rename it over the old, so a crash never leaves a partial snapshot
+    with open(filename + ".tmp", "wb") as f:
+        pickle.dump(snapshot, f)
+    os.replace(filename + ".tmp", filename)
+
+# finds the latest snapshot of this cache at or before the byte offset stop
+# (anywhere in the log if stop is None) that is still valid for the log,
+# restores it into cache, and returns (offset, stats). returns (0, None) if
+# there is none.
+def loadsnapshot(snapdir, path, cache, stop=None):
+    prefix = snapshotname(cache, 0)[:-len("000000000000.snap")]
+    if not os.path.isdir(snapdir):
+        return 0, None
+    names = sorted((name for name in os.listdir(snapdir) if name.startswith(prefix) and name.endswith(".snap")), reverse=True)
+    for name in names:
+        offset = int(name[len(prefix):-len(".snap")])
+        if stop is not None and offset > stop:
+            continue
+        with open(os.path.join(snapdir, name), "rb") as f:
+            snapshot = pickle.load(f)
+        if snapshot['version'] != SNAPVERSION or snapshot['checksum'] != logchecksum(path, offset):
+            continue
+        cache.restore(snapshot['cache'])
+        stats = SimStats()
+        stats.setstate(snapshot['stats'])
+        return offset, stats
+    return 0, None
+
+# maps each op code character to whether it writes the cache
+writetable = bytes.maketrans(b'RWAFI', b'\x00\x01\x01\x00\x00')
+controlre = re.compile(rb'[FI]')
+
+# runs shorter than this go through cacheaccess, since accessbatch
+# has a fixed cost for splitting and grouping the addresses
+BATCHMIN = 256
+
+# simulates the records of a batch, without any output, and returns
+# the results as bytes holding H/M/E/D per access (and X per F or I).
+# If flushes is a list, the number of lines each F writes back is appended to it.
+def simaccesses(cache, batch, flushes=None):
+    access = cache.cacheaccess
+    accessbatch = None
+    if np is not None and isinstance(cache, Cache) and cache.policy.setlocal:
+        accessbatch = cache.accessbatch
+
+    # simulate the accesses between each flush or invalidate in one go
+    def accessrun(start, end):
+        if accessbatch is not None and end - start >= BATCHMIN:
+            return accessbatch(batch.addr[start:end], writes[start:end])
+        return ''.join(map(access, batch.addr[start:end], writes[start:end])).encode()
+
+    ops = batch.op
+    writes = ops.translate(writetable)
+    results = bytearray()
+    start = 0
+    for m in controlre.finditer(ops):
+        results += accessrun(start, m.start())
+        if m.group() == b'F':
+            written = cache.flush()
+            if flushes is not None:
+                flushes.append(written)
+        else:
+            cache.invalidate()
+        results += b'X'
+        start = m.end()
+    results += accessrun(start, len(ops))
+    return bytes(results)
+
+def printmismatch(batch, i, result):
+    print("Result mismatch at address", format(batch.addr[i], '0%dx' % batch.addrdigits) + ". Wally:",
+          chr(batch.result[i]) + ", Sim:", chr(result))
+
+# simulates one LogBatch from LogReader on the cache, adding to stats
+# and printing any mismatches against Wally's results (or, in verbose
+# mode, every access)
+def runbatch(cache, batch, stats, verbose=False):
+    if batch.marker == 'BEGIN' or batch.marker == 'TRAIN':
+        # currently BEGIN and END traces aren't being recorded correctly
+        # trying TRAIN clears instead
+        cache.invalidate() # a new test is starting, so 'empty' the cache
+        cache.clear_pLRU()
+        if verbose:
+            print("New Test")
+    if batch.marker == 'BEGIN' or batch.marker == 'TRAIN' or not stats.segments:
+        stats.segments.append(SegmentStats(batch.marker, batch.label))
+
+    ops = batch.op
+    flushes = []
+    stats.totalops += len(ops)
+    stats.loads += ops.count(b'R')
+    stats.stores += ops.count(b'W')
+    stats.atoms += ops.count(b'A')
+
+    if verbose:
+        results = bytearray(batch.result)
+        for i in range(len(ops)):
+            op = ops[i:i+1]
+            if op == b'F':
+                flushes.append(cache.flush())
+                print("F")
+            elif op == b'I':
+                cache.invalidate()
+                print("I")
+            else:
+                addr = batch.addr[i]
+                results[i] = ord(cache.cacheaccess(addr, op == b'W' or op == b'A'))
+                tag, setnum, offset = cache.splitaddr(addr)
+                print(hex(addr), hex(tag), hex(setnum), hex(offset), chr(batch.result[i]), chr(results[i]))
+                if results[i] != batch.result[i]:
+                    printmismatch(batch, i, results[i])
+                    stats.mismatches += 1
+    else:
+        results = simaccesses(cache, batch, flushes)
+    stats.segments[-1].add(results, sum(flushes))
+
+    accesses = len(ops) - ops.count(b'F') - ops.count(b'I')
+    hits = results.count(b'H')
+    stats.hits += hits
+    stats.misses += accesses - hits
+
+    if not verbose and results != batch.result:
+        for i in range(len(ops)):
+            if results[i] != batch.result[i] and ops[i] != 70 and ops[i] != 73: # not F or I
+                printmismatch(batch, i, results[i])
+                stats.mismatches += 1
+
+# simulates the byte range [start, end) of a log on a fresh cache, for the
+# worker processes of runparallel. returns the stats and what was printed.
+def simrange(job):
+    numlines, numways, addrlen, taglen, path, start, end = job
+    cache = Cache(numlines, numways, addrlen, taglen)
+    stats = SimStats()
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        for batch in LogReader.readcachelog(path, start, end):
+            runbatch(cache, batch, stats)
+    return stats, out.getvalue()
+
+# Every BEGIN/TRAIN marker empties the cache, so the segments between them
+# are independent. Splits the log at the markers into about 4 (start, end)
+# byte ranges per worker.
+def workranges(path, jobs):
+    ranges = LogReader.segments(path)
+    if not ranges:
+        return []
+    total = ranges[-1][3] - ranges[0][2]
+    target = max(total // (4*jobs), 1)
+    work = []
+    start = ranges[0][2]
+    for marker, label, segstart, segend in ranges:
+        if segend - start >= target:
+            work.append((start, segend))
+            start = segend
+    if start < ranges[-1][3]:
+        work.append((start, ranges[-1][3]))
+    return work
+
+# Simulates the ranges of workranges in a process pool, and prints each job's
+# mismatches in log order. returns the merged stats.
+def runparallel(numlines, numways, addrlen, taglen, path, jobs):
+    work = [(numlines, numways, addrlen, taglen, path, start, end) for start, end in workranges(path, jobs)]
+    if not work:
+        return SimStats()
+
+    stats = SimStats()
+    with multiprocessing.Pool(min(jobs, len(work))) as pool:
+        for jobstats, output in pool.imap(simrange, work):
+            sys.stdout.write(output)
+            stats.merge(jobstats)
+    return stats
 
 if __name__ == "__main__":
+    import CacheSweep
     parser = argparse.ArgumentParser(description="Simulates a L1 cache.")
     parser.add_argument('numlines', type=int, help="The number of lines per way (a power of 2)", metavar="L")
     parser.add_argument('numways', type=int, help="The number of ways (a power of 2)", metavar='W')
@@ -202,82 +851,98 @@ if __name__ == "__main__":
     parser.add_argument('-v', "--verbose", action='store_true', help="verbose/full-trace mode")
     parser.add_argument('-p', "--perf", action='store_true', help="Report hit/miss ratio")
     parser.add_argument('-d', "--dist", action='store_true', help="Report distribution of operations")
+    parser.add_argument('-m', "--mrc", action='store_true', help="With --perf, also report true-LRU miss-ratio curves (see CacheMRC.py)")
+    parser.add_argument('-s', "--sweep", type=CacheSweep.Geometry.parse, nargs='+', default=[], help="Also simulate these geometries in one pass and report a table instead of checking mismatches", metavar="L,W,A,T")
+    parser.add_argument('-j', "--jobs", type=int, default=1, help="Worker processes, simulating the log's segments in parallel (default 1)")
+    parser.add_argument("--policy", choices=list(policies), default='plru', help="Replacement policy (default plru, as in Wally)")
+    parser.add_argument("--victim", type=int, default=0, help="Entries in a victim cache behind this cache (default 0, none)", metavar="N")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the random replacement policy (default 0)")
+    parser.add_argument('-c', "--compare", action='store_true', help="Report miss rates and writebacks of every replacement policy on this geometry")
+    parser.add_argument('-b', "--bus", action='store_true', help="Report bus bytes, bursts and stall cycles per segment")
+    parser.add_argument("--ahbw", type=int, default=64, help="AHB width in bits (default 64)")
+    parser.add_argument("--latency", type=int, default=0, help="RAM_LATENCY cycles per beat (default 0)")
+    parser.add_argument("--burst", type=int, default=0, help="Beats per AHB burst (default 0, a whole line; 1 disables bursts)")
+    parser.add_argument("--snapshot", type=int, default=0, help="Save a snapshot every this many bytes of the log", metavar="BYTES")
+    parser.add_argument("--resume", action='store_true', help="Resume from the latest snapshot")
+    parser.add_argument("--start", type=int, default=0, help="Start checking at this byte offset of the log", metavar="OFFSET")
+    parser.add_argument("--snapdir", help="Snapshot directory (default: the log file name followed by .snapshots)")
 
     args = parser.parse_args()
+
+    if args.sweep or args.compare or args.policy != 'plru' or args.victim:
+        # these report a table of totals, with none of the per-access checking or reports
+        ignored = [flag for flag, given in (("-p", args.perf), ("-d", args.dist), ("-v", args.verbose), ("-m", args.mrc),
+                                            ("-b", args.bus), ("--snapshot", args.snapshot), ("--resume", args.resume),
+                                            ("--start", args.start)) if given]
+        if ignored:
+            parser.error(" ".join(ignored) + " cannot be used with --sweep, --compare, --policy or --victim")
+        comparepolicies = list(policies) if args.compare else [args.policy]
+        geometries = [CacheSweep.Geometry(args.numlines, args.numways, args.addrlen, args.taglen, policy, args.victim)
+                      for policy in comparepolicies]
+        geometries += args.sweep
+        for geometry in geometries:
+            geometry.seed = args.seed
+        CacheSweep.printresults(CacheSweep.sweep(os.path.expanduser(args.file), geometries, args.jobs))
+        sys.exit(0)
+
     cache = Cache(args.numlines, args.numways, args.addrlen, args.taglen)
     extfile = os.path.expanduser(args.file)
-    nofails = True
+    stats = SimStats()
+    if args.perf and args.mrc:
+        import CacheMRC
+        dists = CacheMRC.StackDistances(cache.offsetlen, range(cache.setlen + 1))
+    snapdir = os.path.expanduser(args.snapdir) if args.snapdir else extfile + ".snapshots"
+    snapshots = args.snapshot or args.resume or args.start
 
-    if args.perf:
-        hits = 0
-        misses = 0
+    begin = 0
+    if args.resume:
+        begin, snapstats = loadsnapshot(snapdir, extfile, cache)
+        if snapstats is not None:
+            stats = snapstats
+            print("Resuming from the snapshot at byte", begin)
+    if args.start:
+        begin, snapstats = loadsnapshot(snapdir, extfile, cache, args.start)
+        start = args.start
+        if not LogReader.isbinlog(extfile):
+            # start at the beginning of the next line
+            with open(extfile, "rb") as f:
+                f.seek(start - 1)
+                start += len(f.readline()) - 1
+        with contextlib.redirect_stdout(io.StringIO()):
+            for batch in LogReader.readcachelog(extfile, begin, start):
+                runbatch(cache, batch, SimStats())
+        print("Starting at byte", start, "after replaying from byte", begin)
+        begin = start
+
+    if args.jobs > 1 and not args.verbose and not (args.perf and args.mrc) and not snapshots:
+        stats = runparallel(args.numlines, args.numways, args.addrlen, args.taglen, extfile, args.jobs)
+    else:
+        nextsnapshot = begin + args.snapshot
+        for batch in LogReader.readcachelog(extfile, begin):
+            runbatch(cache, batch, stats, args.verbose)
+            if args.perf and args.mrc:
+                dists.add(batch)
+            if args.snapshot and batch.end >= nextsnapshot:
+                savesnapshot(snapdir, extfile, batch.end, cache, stats)
+                nextsnapshot = batch.end + args.snapshot
 
     if args.dist:
-        loads = 0
-        stores = 0
-        atoms = 0
-        totalops = 0
-
-    with open(extfile, "r") as f:
-        for ln in f:
-            ln = ln.strip()
-            lninfo = ln.split()
-            if len(lninfo) < 3: #non-address line
-                if len(lninfo) > 0 and (lninfo[0] == 'BEGIN' or lninfo[0] == 'TRAIN'):
-                    # currently BEGIN and END traces aren't being recorded correctly
-                    # trying TRAIN clears instead
-                    cache.invalidate() # a new test is starting, so 'empty' the cache
-                    cache.clear_pLRU()
-                    if args.verbose:
-                        print("New Test")
-                        
-            else:
-                if args.dist:
-                    totalops += 1
-                
-                if lninfo[1] == 'F':
-                    cache.flush()
-                    if args.verbose:
-                        print("F")
-                elif lninfo[1] == 'I':
-                    cache.invalidate()
-                    if args.verbose:
-                        print("I")
-                else:
-                    addr = int(lninfo[0], 16)
-                    iswrite = lninfo[1] == 'W' or lninfo[1] == 'A'
-                    result = cache.cacheaccess(addr, iswrite)
-                    
-                    if args.verbose:
-                        tag, setnum, offset = cache.splitaddr(addr)
-                        print(hex(addr), hex(tag), hex(setnum), hex(offset), lninfo[2], result)
-                    
-                    if args.perf:
-                        if result == 'H':
-                            hits += 1
-                        else:
-                            misses += 1
-                    
-                    if args.dist:
-                        if lninfo[1] == 'R':
-                            loads += 1
-                        elif lninfo[1] == 'W':
-                            stores += 1
-                        elif lninfo[1] == 'A':
-                            atoms += 1
-                    
-                    if not result == lninfo[2]:
-                        print("Result mismatch at address", lninfo[0]+ ". Wally:", lninfo[2]+", Sim:", result)
-                        nofails = False
-    if args.dist:
-        percent_loads = str(round(100*loads/totalops))
-        percent_stores = str(round(100*stores/totalops))
-        percent_atoms = str(round(100*atoms/totalops))
+        percent_loads = str(round(100*stats.loads/stats.totalops))
+        percent_stores = str(round(100*stats.stores/stats.totalops))
+        percent_atoms = str(round(100*stats.atoms/stats.totalops))
         print("This log had", percent_loads+"% loads,", percent_stores+"% stores, and", percent_atoms+"% atomic operations.")
     
     if args.perf:
-        ratio = round(hits/misses,3)
-        print("There were", hits, "hits and", misses, "misses. The hit/miss ratio was", str(ratio)+".")
+        ratio = round(stats.hits/stats.misses,3)
+        print("There were", stats.hits, "hits and", stats.misses, "misses. The hit/miss ratio was", str(ratio)+".")
+        if args.mrc:
+            dists.run()
+            lrumisses = dists.misses(cache.setlen, cache.numways)
+            print("True LRU would have had", lrumisses, "misses with this geometry, versus", stats.misses, "for pseudo-LRU.")
+            CacheMRC.printcurves(dists, 4*cache.numways)
+
+    if args.bus:
+        BusModel(1 << cache.offsetlen, args.ahbw, args.burst, args.latency).report(stats.segments)
     
-    if nofails:
-        print("SUCCESS! There were no mismatches between Wally and the sim.")
\ No newline at end of file
+    if stats.mismatches == 0:
+        print("SUCCESS! There were no mismatches between Wally and the sim.")
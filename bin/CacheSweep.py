@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+
+###########################################
+## CacheSweep.py
+##
+## Created: 17 October 2026
+## Modified: 17 October 2026
+##
+## Purpose: Simulate many L1 cache geometries over a single pass of a cache log
+##
+## A component of the CORE-V-WALLY configurable RISC-V project.
+##
+## Copyright (C) 2021-23 Harvey Mudd College & Oklahoma State University
+##
+## SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+##
+## Licensed under the Solderpad Hardware License v 2.1 (the “License”); you may not use this file
+## except in compliance with the License, or, at your option, the Apache License version 2.0. You
+## may obtain a copy of the License at
+##
+## https:##solderpad.org/licenses/SHL-2.1/
+##
+## Unless required by applicable law or agreed to in writing, any work distributed under the
+## License is distributed on an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+## either express or implied. See the License for the specific language governing permissions
+## and limitations under the License.
+################################################################################################
+
+# how to invoke the sweep:
+# CacheSweep.py -f <log file> <geometry> [<geometry> ...] (-j <jobs>)
+# where each geometry is <number of lines>,<number of ways>,<address length>,<tag length>,
+# optionally followed by a replacement policy (plru, lru, fifo, random, srrip or brrip;
+# default plru) and a number of victim cache entries (default 0),
+# e.g. 'CacheSweep.py -f DCache.log 64,4,56,44 128,4,56,43 64,4,56,44,srrip 64,4,56,44,plru,8'.
+# CacheSim.py <geometry arguments> -f <log file> --sweep <geometry> ... does the same,
+# sweeping the geometry on its command line together with the listed ones.
+#
+# The log is streamed once and every geometry is run over each batch as it is
+# decoded; with -j, the log is split at its BEGIN/TRAIN markers and each worker
+# process streams its own part.
+# Geometries with the same number of sets, address and tag length whose
+# replacement is equivalent to true LRU are all evaluated at once by a single
+# per-set LRU stack (Mattson's stack algorithm): a line at depth d of its set's
+# stack is resident in every cache of that shape with more than d ways. That
+# covers the lru policy, and tree pseudo-LRU with 1 and 2 ways; the other
+# geometries fall back to exact Cache simulations.
+#
+# The sweep reports hits, misses, evictions and writebacks per geometry. Hits in a
+# victim cache count as hits, and evictions and writebacks are of lines leaving
+# the victim cache.
+# It does not compare against Wally's results; use CacheSim.py for that.
+
+import os
+import argparse
+import multiprocessing
+import LogReader
+import CacheSim
+
+# A cache shape, as given on the CacheSim.py command line
+# plus a replacement policy and victim cache, which CacheSim.py leaves at pseudo-LRU
+# without a victim cache
+class Geometry:
+    def __init__(self, numlines, numways, addrlen, taglen, policy='plru', victim=0, seed=0):
+        self.numlines = numlines
+        self.numways = numways
+        self.addrlen = addrlen
+        self.taglen = taglen
+        self.policy = policy
+        self.victim = victim
+        self.seed = seed
+
+    # parses '<lines>,<ways>,<addrlen>,<taglen>[,<policy>[,<victim entries>]]'
+    @classmethod
+    def parse(cls, text):
+        fields = text.split(',')
+        if len(fields) < 4 or len(fields) > 6:
+            raise argparse.ArgumentTypeError("geometry must be <lines>,<ways>,<addrlen>,<taglen>[,<policy>[,<victim>]], not " + repr(text))
+        policy = fields[4] if len(fields) > 4 else 'plru'
+        if policy not in CacheSim.policies:
+            raise argparse.ArgumentTypeError("unknown replacement policy " + repr(policy) + " in " + repr(text))
+        try:
+            return cls(*[int(field) for field in fields[:4]], policy, int(fields[5]) if len(fields) > 5 else 0)
+        except ValueError:
+            raise argparse.ArgumentTypeError("geometry fields must be integers: " + repr(text))
+
+    # whether the cache's replacement is exactly true LRU
+    def islru(self):
+        return self.victim == 0 and (self.policy == 'lru' or (self.policy == 'plru' and self.numways <= 2))
+
+    def makecache(self):
+        cache = CacheSim.Cache(self.numlines, self.numways, self.addrlen, self.taglen, self.policy, self.seed)
+        if self.victim:
+            return CacheSim.VictimCache(cache, self.victim)
+        return cache
+
+    def __str__(self):
+        text = "%d,%d,%d,%d" % (self.numlines, self.numways, self.addrlen, self.taglen)
+        if self.policy != 'plru' or self.victim:
+            text += "," + self.policy
+        if self.victim:
+            text += "," + str(self.victim)
+        return text
+
+# hit, miss, eviction and writeback totals for one geometry
+class SweepResult:
+    def __init__(self, geometry, method):
+        self.geometry = geometry
+        self.method = method
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+
+    # adds the H/V/M/E/D results of CacheSim.simaccesses
+    def add(self, results):
+        hits = results.count(b'H') + results.count(b'V')
+        evictions = results.count(b'E')
+        writebacks = results.count(b'D')
+        self.hits += hits
+        self.evictions += evictions + writebacks
+        self.writebacks += writebacks
+        self.misses += results.count(b'M') + evictions + writebacks
+
+    # adds the totals of another SweepResult, such as one for another part of the log
+    def merge(self, other):
+        self.hits += other.hits
+        self.misses += other.misses
+        self.evictions += other.evictions
+        self.writebacks += other.writebacks
+
+# Evaluates every associativity in waylist for caches with the same number of
+# sets, address length and tag length in one pass, using one LRU stack per set.
+# Each stack entry is [tag, dirty], with bit k of dirty set if the line is dirty
+# in the cache with waylist[k] ways; a line only gets dirty in the caches it hits
+# in, and refills clean (or dirty for a write) in the ones it misses in.
+class LRUStackSweep:
+    def __init__(self, geometries):
+        self.geometries = sorted(geometries, key=lambda g: g.numways)
+        self.waylist = [g.numways for g in self.geometries]
+        self.depth = self.waylist[-1]
+        geometry = self.geometries[0]
+        self.cache = CacheSim.Cache(geometry.numlines, 1, geometry.addrlen, geometry.taglen) # used for splitaddr only
+        self.results = [SweepResult(g, "stack") for g in self.geometries]
+        self.invalidate()
+
+    def invalidate(self):
+        self.stacks = [[] for i in range(self.cache.numsets)]
+
+    def flush(self):
+        for stack in self.stacks:
+            for entry in stack:
+                entry[1] = 0
+
+    def access(self, addr, write):
+        tag, setnum, _ = self.cache.splitaddr(addr)
+        stack = self.stacks[setnum]
+        depth = self.depth # deeper than any cache holds, if the line isn't found
+        for d in range(len(stack)):
+            if stack[d][0] == tag:
+                depth = d
+                break
+        writebits = (1 << len(self.waylist)) - 1 if write else 0
+        dirty = 0
+        for k, numways in enumerate(self.waylist):
+            result = self.results[k]
+            bit = 1 << k
+            if depth < numways:
+                result.hits += 1
+                dirty |= (stack[depth][1] & bit) | (writebits & bit)
+            else:
+                result.misses += 1
+                dirty |= writebits & bit
+                # the line at depth numways-1 is pushed out of this cache
+                if numways <= len(stack):
+                    result.evictions += 1
+                    if stack[numways-1][1] & bit:
+                        result.writebacks += 1
+        if depth < len(stack):
+            del stack[depth]
+        stack.insert(0, [tag, dirty])
+        if len(stack) > self.depth:
+            stack.pop()
+
+    def runbatch(self, batch):
+        if batch.marker == 'BEGIN' or batch.marker == 'TRAIN':
+            self.invalidate()
+        for addr, op in zip(batch.addr, batch.op):
+            if op == 70: # F
+                self.flush()
+            elif op == 73: # I
+                self.invalidate()
+            else:
+                self.access(addr, op == 87 or op == 65) # W or A
+
+# sweeps every geometry over the byte range [start, stop) of the log, which starts
+# on a segment boundary, in one streaming pass. Every BEGIN/TRAIN marker starts
+# the exactly simulated geometries on a fresh cache, so that a range gives the
+# same results however the log is split. returns a SweepResult per geometry, in
+# the order given.
+def sweeprange(job):
+    path, geometries, start, stop = job
+    stackgroups = {}
+    simulated = []
+    for geometry in geometries:
+        if geometry.islru():
+            key = (geometry.numlines, geometry.addrlen, geometry.taglen)
+            stackgroups.setdefault(key, []).append(geometry)
+        else:
+            simulated.append([geometry, geometry.makecache(), SweepResult(geometry, "sim")])
+    stacksweeps = [LRUStackSweep(group) for group in stackgroups.values()]
+
+    for batch in LogReader.readcachelog(path, start, stop):
+        for stacksweep in stacksweeps:
+            stacksweep.runbatch(batch)
+        for entry in simulated:
+            if batch.marker == 'BEGIN' or batch.marker == 'TRAIN':
+                entry[1] = entry[0].makecache()
+            entry[2].add(CacheSim.simaccesses(entry[1], batch))
+
+    results = {}
+    for geometry, cache, result in simulated:
+        results[id(geometry)] = result
+    for stacksweep in stacksweeps:
+        for result in stacksweep.results:
+            results[id(result.geometry)] = result
+    return [results[id(geometry)] for geometry in geometries]
+
+# runs every geometry over the log and returns a SweepResult per geometry,
+# in the order given. With more than one job, the log is split at its
+# BEGIN/TRAIN markers and each worker process streams its own byte ranges.
+def sweep(path, geometries, jobs=1):
+    ranges = CacheSim.workranges(path, jobs) if jobs > 1 else [(0, None)]
+    work = [(path, geometries, start, stop) for start, stop in ranges]
+    totals = [SweepResult(geometry, "stack" if geometry.islru() else "sim") for geometry in geometries]
+    if len(work) > 1:
+        with multiprocessing.Pool(min(jobs, len(work))) as pool:
+            rangeresults = pool.map(sweeprange, work)
+    else:
+        rangeresults = [sweeprange(job) for job in work]
+    for results in rangeresults:
+        for total, result in zip(totals, results):
+            total.merge(result)
+    return totals
+
+def printresults(results):
+    print("%-22s %-6s %12s %12s %12s %12s %10s" % ("Geometry", "Method", "Hits", "Misses", "Evictions", "Writebacks", "Miss rate"))
+    for result in results:
+        accesses = result.hits + result.misses
+        missrate = "%.3f%%" % (100*result.misses/accesses) if accesses else "-"
+        print("%-22s %-6s %12d %12d %12d %12d %10s" % (result.geometry, result.method, result.hits,
+              result.misses, result.evictions, result.writebacks, missrate))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulates many L1 cache geometries over one pass of a cache log.")
+    parser.add_argument('geometries', type=Geometry.parse, nargs='+', help="Cache geometries to simulate", metavar="L,W,A,T")
+    parser.add_argument('-f', "--file", required=True, help="Log file to simulate from")
+    parser.add_argument('-j', "--jobs", type=int, default=os.cpu_count(), help="Worker processes, sweeping the log's segments in parallel")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the random replacement policy (default 0)")
+
+    args = parser.parse_args()
+    for geometry in args.geometries:
+        geometry.seed = args.seed
+    printresults(sweep(os.path.expanduser(args.file), args.geometries, args.jobs))
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+
+###########################################
+## FrontEndSim.py
+##
+## Created: 17 October 2026
+## Modified: 17 October 2026
+##
+## Purpose: Trace-driven simulation of Wally's BTB, RAS and instruction class prediction
+##
+## A component of the CORE-V-WALLY configurable RISC-V project.
+##
+## Copyright (C) 2021-23 Harvey Mudd College & Oklahoma State University
+##
+## SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+##
+## Licensed under the Solderpad Hardware License v 2.1 (the “License”); you may not use this file
+## except in compliance with the License, or, at your option, the Apache License version 2.0. You
+## may obtain a copy of the License at
+##
+## https:##solderpad.org/licenses/SHL-2.1/
+##
+## Unless required by applicable law or agreed to in writing, any work distributed under the
+## License is distributed on an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+## either express or implied. See the License for the specific language governing permissions
+## and limitations under the License.
+################################################################################################
+
+# how to invoke this simulator:
+# FrontEndSim.py <log file or directory> [...] (--btb <sets>x<ways> ...) (--ras <depth>[,<policy>] ...)
+#                (-p <direction predictor>) (-s <size>) (--decode) (-j <jobs>) (-b)
+# e.g. 'FrontEndSim.py branch_BP_GSHARE16.log --btb 256x1 1024x1 256x4 --ras 4 16 16,stop'
+# simulates every combination of the listed BTBs and RASes behind a gshare predictor
+# with 2**16 entries. The logs are those of BranchSim.py, and must be written with the
+# target and class of every control flow instruction (CFI), as testbench.sv's
+# BPRED_LOGGER now does.
+#
+# The models, each reset at every TRAIN marker as the RTL is:
+#   BTB - <sets> sets of <ways> ways holding each CFI's class and target, indexed like
+#         btb.sv, {PC[k+1]^PC[1], PC[k:2]}. With one way it is untagged, as in Wally, so
+#         CFIs that alias read each other's entries; with more it is tagged with the PC
+#         and replaces the least recently used way. The default is BTB_SIZE, 1024x1.
+#   RAS - a stack of <depth> return addresses pushed by calls and popped by returns.
+#         The wrap policy is RASPredictor.sv's circular stack, whose oldest entry a push
+#         onto a full stack overwrites; stop drops the push instead. The default is 16,wrap.
+#   class - with INSTR_CLASS_PRED the class of the instruction being fetched comes
+#         from its BTB entry; --decode models INSTR_CLASS_PRED=0 instead, where the
+#         class is decoded in Fetch and never wrong.
+# The direction of conditional branches comes from BranchSim.py's -p/-s predictor.
+#
+# For each combination the simulator reports, over the CFIs between BEGIN and END,
+#   BTMR   - taken branches and jumps (not returns) whose BTB target was wrong, per
+#            branch and non-return jump, as parseHPMC.py computes it
+#   RASMPR - returns the RAS predicted wrongly, per return
+#   ClassMPR - CFIs whose class was predicted wrongly, per CFI. The RTL divides by every
+#            instruction and also counts non-CFIs the BTB calls CFIs, which the trace
+#            does not hold, so this is an upper bound on the RTL's rate.
+#   FEMPR  - CFIs after which the front end fetched from the wrong address, per CFI
+# each the geometric mean in percent over the benchmarks.
+# The log has no instruction lengths, so a RAS prediction counts as right when the
+# return goes 2 or 4 bytes past the call it popped.
+# Add -b to print every benchmark's rates as well, and -j <jobs> to simulate that
+# many TRAIN segments at once (the default is one process per core).
+
+import sys
+import os
+import argparse
+import multiprocessing
+import LogReader
+import BranchSim
+
+METRICS = ('BTMR', 'RASMPR', 'ClassMPR', 'FEMPR')
+RASPOLICIES = ('wrap', 'stop')
+
+# A branch target buffer
+class BTB:
+    def __init__(self, sets, ways):
+        self.sets = sets
+        self.ways = ways
+        self.indexbits = sets.bit_length() - 1
+        # per set, its ways as [tag, class, target] from least to most recently used
+        self.entries = [[[None, None, 0]] if ways == 1 else [] for i in range(sets)]
+
+    # parses '<sets>x<ways>'
+    @classmethod
+    def parse(cls, text):
+        try:
+            sets, ways = (int(field) for field in text.split('x'))
+        except ValueError:
+            raise argparse.ArgumentTypeError("BTB must be <sets>x<ways>, not " + repr(text))
+        if sets < 2 or sets & (sets - 1) or ways < 1:
+            raise argparse.ArgumentTypeError("BTB sets must be a power of 2 of at least 2, and ways at least 1: " + repr(text))
+        return (sets, ways)
+
+    def index(self, pc):
+        k = self.indexbits
+        return ((pc >> 2) & ((1 << k) - 1)) ^ (((pc >> 1) & 1) << (k - 1))
+
+    # returns the (class, target) the BTB holds for pc; class is None if it holds nothing
+    def lookup(self, pc):
+        ways = self.entries[self.index(pc)]
+        if self.ways == 1:
+            return ways[0][1], ways[0][2]
+        for way in ways:
+            if way[0] == pc:
+                return way[1], way[2]
+        return None, 0
+
+    def update(self, pc, cls, target):
+        ways = self.entries[self.index(pc)]
+        if self.ways == 1:
+            ways[0] = [pc, cls, target]
+            return
+        for i, way in enumerate(ways):
+            if way[0] == pc:
+                del ways[i]
+                break
+        else:
+            if len(ways) == self.ways:
+                del ways[0]
+        ways.append([pc, cls, target])
+
+# A return address stack. Entries hold the PC of the call that pushed them.
+class RAS:
+    def __init__(self, depth, policy='wrap'):
+        self.depth = depth
+        self.policy = policy
+        self.memory = [0]*depth
+        self.ptr = 0
+        self.used = 0
+
+    # parses '<depth>[,<policy>]'
+    @classmethod
+    def parse(cls, text):
+        fields = text.split(',')
+        policy = fields[1] if len(fields) > 1 else 'wrap'
+        if len(fields) > 2 or policy not in RASPOLICIES:
+            raise argparse.ArgumentTypeError("RAS must be <depth>[,wrap|stop], not " + repr(text))
+        try:
+            depth = int(fields[0])
+        except ValueError:
+            raise argparse.ArgumentTypeError("RAS depth must be an integer: " + repr(text))
+        if depth < 1:
+            raise argparse.ArgumentTypeError("RAS depth must be at least 1: " + repr(text))
+        return (depth, policy)
+
+    def push(self, pc):
+        if self.policy == 'stop' and self.used == self.depth:
+            return
+        self.ptr = (self.ptr + 1) % self.depth
+        self.memory[self.ptr] = pc
+        self.used = min(self.used + 1, self.depth)
+
+    # pops the top entry, which the wrap policy does even when the stack is empty
+    def pop(self):
+        if self.policy == 'stop' and self.used == 0:
+            return None
+        top = self.memory[self.ptr]
+        self.ptr = (self.ptr - 1) % self.depth
+        self.used = max(self.used - 1, 0)
+        return top
+
+# events per hundred, or 0 out of none
+def rate(events, total):
+    return 100*events/total if total else 0.0
+
+# whether a return to target was predicted by a RAS entry pushed by the call at callpc
+def returnpredicted(callpc, target):
+    return callpc is not None and target - callpc in (2, 4)
+
+# simulates a BTB on the CFIs of a segment, returning its (class, target) per CFI
+def btbpredictions(segment, sets, ways):
+    btb = BTB(sets, ways)
+    predictions = []
+    for pc, cls, target in zip(segment.pcs, segment.classes, segment.targets):
+        predictions.append(btb.lookup(pc))
+        btb.update(pc, cls, target)
+    return predictions
+
+# simulates a RAS on the CFIs of a segment, returning whether it predicted each
+# return right (None for the other CFIs)
+def raspredictions(segment, depth, policy):
+    ras = RAS(depth, policy)
+    predictions = []
+    for pc, cls, target in zip(segment.pcs, segment.classes, segment.targets):
+        if cls == 114: # 'r'
+            predictions.append(returnpredicted(ras.pop(), target))
+        else:
+            predictions.append(None)
+            if cls == 99: # 'c'
+                ras.push(pc)
+    return predictions
+
+# the direction predictor's taken prediction for each CFI of a segment
+# (None for the ones that are not conditional branches)
+def directionpredictions(segment, predictor, k):
+    branches = segment.conditional()
+    predicted = iter(BranchSim.predictdirections(branches, predictor, k))
+    return [bool(next(predicted)) if cls == 98 else None for cls in segment.classes] # 'b'
+
+# simulates every combination of BTB, RAS and class prediction on a segment, and
+# returns a dictionary of (btb, ras): {metric: (events, out of)}
+def predictsegment(segment, btbs, rases, predictor, k, decode):
+    directions = directionpredictions(segment, predictor, k)
+    btbresults = {btb: btbpredictions(segment, *btb) for btb in btbs}
+    rasresults = {ras: raspredictions(segment, *ras) for ras in rases}
+    counted = [i for i in range(len(segment)) if segment.measured[i]]
+    counts = {}
+    for btb in btbs:
+        for ras in rases:
+            btbtargetwrong = targets = rasmissed = returns = classwrong = redirects = 0
+            for i in counted:
+                cls = segment.classes[i]
+                taken = segment.dirs[i] == 116 # 't'
+                target = segment.targets[i]
+                btbclass, btbtarget = btbresults[btb][i]
+                if cls != 114: # not 'r'
+                    targets += 1
+                    btbtargetwrong += taken and btbtarget != target
+                else:
+                    returns += 1
+                    rasmissed += not rasresults[ras][i]
+                predclass = cls if decode else btbclass
+                classwrong += predclass != cls
+                # the front end fetches from the RAS for a predicted return, from the BTB target
+                # for a predicted jump or call or a branch predicted taken, and from the fall
+                # through otherwise. Only real branches have a direction prediction; a CFI the
+                # BTB calls a branch is taken to be predicted taken.
+                if predclass == 114: # 'r'
+                    redirect = not (cls == 114 and rasresults[ras][i])
+                elif predclass in (99, 106) or (predclass == 98 and directions[i] is not False): # 'c', 'j', 'b'
+                    redirect = not (taken and btbtarget == target)
+                else:
+                    redirect = taken
+                redirects += redirect
+            counts[(btb, ras)] = {'BTMR': (btbtargetwrong, targets), 'RASMPR': (rasmissed, returns),
+                                  'ClassMPR': (classwrong, len(counted)), 'FEMPR': (redirects, len(counted))}
+    return counts
+
+# simulates one TRAIN segment, for the worker processes of simulate.
+# returns the benchmark's label and its counts.
+def simsegment(job):
+    path, start, end, btbs, rases, predictor, k, decode = job
+    segment = BranchSim.readsegment(path, start, end)
+    label = segment.label or "%s@%d" % (os.path.basename(path), start)
+    return label, predictsegment(segment, btbs, rases, predictor, k, decode)
+
+# simulates every combination on every TRAIN segment of the logs, jobs segments at a
+# time, and returns a list of (benchmark, counts) in log order, leaving out segments
+# that count no CFIs
+def simulate(paths, btbs, rases, predictor='gshare', k=16, decode=False, jobs=1):
+    work = [(path, start, end, btbs, rases, predictor, k, decode)
+            for path in BranchSim.logfiles(paths) for start, end in BranchSim.trainranges(path)]
+    if jobs > 1 and len(work) > 1:
+        with multiprocessing.Pool(min(jobs, len(work))) as pool:
+            results = pool.map(simsegment, work)
+    else:
+        results = list(map(simsegment, work))
+    return [(label, counts) for label, counts in results
+            if any(metrics['FEMPR'][1] for metrics in counts.values())]
+
+def combinationname(btb, ras):
+    return "btb%dx%d ras%d,%s" % (btb[0], btb[1], ras[0], ras[1])
+
+# the geometric mean in percent of each metric over the benchmarks, per combination
+def summarize(results, btbs, rases):
+    summary = {}
+    for btb in btbs:
+        for ras in rases:
+            summary[(btb, ras)] = {metric: BranchSim.geomean([rate(*counts[(btb, ras)][metric])
+                                                              for label, counts in results if counts[(btb, ras)][metric][1]])
+                                   for metric in METRICS}
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulates Wally's BTB, RAS and class prediction on BPRED_LOGGER logs.")
+    parser.add_argument('logs', nargs='+', help="Log files, or directories of *.log files")
+    parser.add_argument("--btb", nargs='+', type=BTB.parse, default=[(1024, 1)], help="BTBs to simulate (default 1024x1)", metavar="SETSxWAYS")
+    parser.add_argument("--ras", nargs='+', type=RAS.parse, default=[(16, 'wrap')], help="RASes to simulate (default 16,wrap)", metavar="DEPTH[,POLICY]")
+    parser.add_argument('-p', "--predictor", choices=BranchSim.PREDICTORS, default='gshare', help="Direction predictor (default gshare)")
+    parser.add_argument('-s', "--size", type=int, default=16, help="log2 of the direction predictor's PHT entries (default 16)", metavar="K")
+    parser.add_argument("--decode", action='store_true', help="Decode the class in Fetch (INSTR_CLASS_PRED=0) instead of predicting it with the BTB")
+    parser.add_argument('-j', "--jobs", type=int, default=os.cpu_count(), help="Worker processes, simulating the logs' TRAIN segments in parallel")
+    parser.add_argument('-b', "--benchmarks", action='store_true', help="Also report the rates of each benchmark")
+
+    args = parser.parse_args()
+    if args.size < 1 or args.size > BranchSim.MAXHISTORY:
+        sys.exit("size must be between 1 and %d" % BranchSim.MAXHISTORY)
+    for path in BranchSim.logfiles(args.logs):
+        if LogReader.branchlayout(path) == LogReader.OLDBRANCHLAYOUT:
+            sys.exit(path + " holds only conditional branches; log it with the targets and classes of all CFIs")
+    results = simulate(args.logs, args.btb, args.ras, args.predictor, args.size, args.decode, args.jobs)
+    header = "%-28s" + " %9s"*len(METRICS)
+    row = "%-28s" + " %8.3f%%"*len(METRICS)
+    if args.benchmarks:
+        for label, counts in results:
+            print(label)
+            for (btb, ras), metrics in counts.items():
+                print("  " + row % ((combinationname(btb, ras),) + tuple(rate(*metrics[metric]) for metric in METRICS)))
+    print(header % (("Combination",) + METRICS))
+    for (btb, ras), metrics in summarize(results, args.btb, args.ras).items():
+        print(row % ((combinationname(btb, ras),) + tuple(metrics[metric] for metric in METRICS)))
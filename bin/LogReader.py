@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+
+###########################################
+## LogReader.py
+##
+## Created: 17 October 2026
+## Modified: 17 October 2026
+##
+## Purpose: Streaming readers for the logs written by testbench.sv's
+##          I_CACHE_ADDR_LOGGER and D_CACHE_ADDR_LOGGER
+##
+## A component of the CORE-V-WALLY configurable RISC-V project.
+##
+## Copyright (C) 2021-23 Harvey Mudd College & Oklahoma State University
+##
+## SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+##
+## Licensed under the Solderpad Hardware License v 2.1 (the “License”); you may not use this file
+## except in compliance with the License, or, at your option, the Apache License version 2.0. You
+## may obtain a copy of the License at
+##
+## https:##solderpad.org/licenses/SHL-2.1/
+##
+## Unless required by applicable law or agreed to in writing, any work distributed under the
+## License is distributed on an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+## either express or implied. See the License for the specific language governing permissions
+## and limitations under the License.
+################################################################################################
+
+# The cache logs hold one record per line, "<hex address> <op> <result>",
+# where op is one of R/W/A/F/I and result is one of H/M/E/D (X for F and I).
+# The BPRED_LOGGER's branch_<type><size>.log holds "<hex PC> <t/n> <hex target> <class>"
+# records, one per control flow instruction, where class is b (branch), j (jump),
+# c (call) or r (return); logs from before the target and class were logged hold
+# "<hex PC> <t/n>" records of the conditional branches only.
+# Both interleave the records with BEGIN <memfile>, TRAIN and END <memfile>
+# marker lines. These logs can reach gigabytes, so rather than splitting every
+# line in Python the reader memory-maps the log and decodes it in large chunks:
+# the markers are located with bytes.find, and each run of records between
+# two markers is split and converted in one go into typed arrays.
+#
+# Logs converted to the binary format of BinLog.py are read directly from
+# their columns, through the same functions.
+#
+# Run this file directly to time the reader on a log:
+# LogReader.py <log file>
+
+import sys
+import os
+import re
+import mmap
+import time
+from array import array
+from itertools import repeat
+
+CHUNKSIZE = 1 << 24
+
+# the first bytes of a binary log (see BinLog.py)
+BINMAGIC = b'WALLYLOG'
+
+# marker lines start with an upper case keyword; addresses are
+# printed with %h, which only produces lower case hex digits
+markerre = re.compile(rb'^(BEGIN|TRAIN|END)\b[ \t]*([^\r\n]*)\r?$', re.M)
+
+# finds the marker lines in buf[start:end] and returns their matches in order.
+# Markers are rare, so each keyword is located with bytes.find, which is
+# much faster than running markerre over every line of the chunk.
+def findmarkers(buf, start=0, end=None):
+    if end is None:
+        end = len(buf)
+    found = []
+    for keyword in (b'BEGIN', b'TRAIN', b'END'):
+        pos = buf.find(keyword, start, end)
+        while pos >= 0:
+            if pos == 0 or buf[pos-1] == 10: # only at the start of a line
+                m = markerre.match(buf, pos, end)
+                if m:
+                    found.append(m)
+            pos = buf.find(keyword, pos + 1, end)
+    found.sort(key=lambda m: m.start())
+    return found
+
+# The record layouts of the loggers, as (column, kind) pairs in the order
+# the fields appear on a line. A 'hex' field becomes an array of 64-bit
+# integers and a 'char' field a bytes object with one character per record.
+CACHELAYOUT = (('addr', 'hex'), ('op', 'char'), ('result', 'char'))
+BRANCHLAYOUT = (('pc', 'hex'), ('dir', 'char'), ('target', 'hex'), ('cls', 'char'))
+OLDBRANCHLAYOUT = (('pc', 'hex'), ('dir', 'char'))
+
+# A run of consecutive records from one segment of a log.
+#   marker - 'BEGIN', 'TRAIN' or 'END' if the batch starts right after that
+#            marker line, or None if it continues the previous batch
+#   label  - the text following the marker (the memfile for BEGIN and END)
+#   start, end - the byte range of the log the batch was decoded from
+#   addrdigits - the number of hex digits the logger used for addresses
+# plus one attribute per column of the layout. For a cache log these are
+#   addr   - array of addresses
+#   op     - bytes holding one op code character per record
+#   result - bytes holding one expected result character per record
+# and for a branch log
+#   pc     - array of branch PCs
+#   dir    - bytes holding 't' or 'n' per record
+#   target - array of the computed targets (not in logs of the old layout)
+#   cls    - bytes holding 'b', 'j', 'c' or 'r' per record (likewise)
+class LogBatch:
+    def __init__(self, marker, label, start, end, addrdigits=0, **columns):
+        self.marker = marker
+        self.label = label
+        self.start = start
+        self.end = end
+        self.addrdigits = addrdigits
+        self.columns = list(columns)
+        self.__dict__.update(columns)
+
+    def __len__(self):
+        return len(getattr(self, self.columns[0]))
+
+    def __repr__(self):
+        return "LogBatch(%s %s, %d records, bytes %d-%d)" % (self.marker, self.label, len(self), self.start, self.end)
+
+# opens a log as a read-only memory map.
+# returns None for an empty log, which cannot be mapped.
+def maplog(path):
+    with open(os.path.expanduser(path), "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+# splits the records in text into the columns of layout.
+# returns a dictionary of columns and the width of the first hex field, from
+# its longest token, since flush and invalidate records have an address of 0.
+def decoderecords(text, layout):
+    nfields = len(layout)
+    tokens = text.split()
+    fields = [tokens[i::nfields] for i in range(nfields)]
+    count = len(fields[0])
+    wellformed = len(tokens) % nfields == 0
+    columns = {}
+    for (name, kind), field in zip(layout, fields):
+        if kind == 'char':
+            columns[name] = b''.join(field)
+            wellformed = wellformed and len(columns[name]) == count
+    if not wellformed:
+        # something other than a well-formed record is in here, so
+        # fall back to a line at a time and skip what we don't understand
+        fields = [[] for i in range(nfields)]
+        for ln in text.splitlines():
+            lninfo = ln.split()
+            if len(lninfo) == nfields and all(len(tok) == 1 for tok, (name, kind) in zip(lninfo, layout) if kind == 'char'):
+                for field, tok in zip(fields, lninfo):
+                    field.append(tok)
+        for (name, kind), field in zip(layout, fields):
+            if kind == 'char':
+                columns[name] = b''.join(field)
+    digits = 0
+    for (name, kind), field in zip(layout, fields):
+        if kind == 'hex':
+            if not digits and field:
+                digits = max(map(len, field))
+            columns[name] = array('Q', map(int, field, repeat(16)))
+    return columns, digits
+
+# yields the batches in the byte range [start, stop) of a log with the
+# given record layout. start and stop should fall on line boundaries, such
+# as the ones returned by segments(). A batch never spans a marker line,
+# and every marker line produces a batch, even one with no records.
+def readlog(path, layout, start=0, stop=None, chunksize=CHUNKSIZE):
+    if isbinlog(path):
+        import BinLog
+        yield from BinLog.readlog(path, start, stop)
+        return
+    log = maplog(path)
+    if log is None:
+        return
+    with log:
+        if stop is None or stop > len(log):
+            stop = len(log)
+        marker, label = None, ''
+        pos = start
+        while pos < stop:
+            limit = min(pos + chunksize, stop)
+            if limit < stop:
+                # end the chunk on a line boundary
+                nl = log.rfind(b'\n', pos, limit)
+                limit = nl + 1 if nl >= pos else log.find(b'\n', limit, stop) + 1 or stop
+            chunk = log[pos:limit]
+            last = 0
+            for m in findmarkers(chunk):
+                if m.start() > last or marker is not None:
+                    columns, digits = decoderecords(chunk[last:m.start()], layout)
+                    yield LogBatch(marker, label, pos + last, pos + m.start(), digits, **columns)
+                marker, label = m.group(1).decode(), m.group(2).decode()
+                last = m.end() + 1
+            if last < len(chunk) or marker is not None:
+                columns, digits = decoderecords(chunk[last:], layout)
+                yield LogBatch(marker, label, pos + last, limit, digits, **columns)
+            marker, label = None, ''
+            pos = limit
+
+# yields the batches of an ICache.log or DCache.log
+def readcachelog(path, start=0, stop=None, chunksize=CHUNKSIZE):
+    return readlog(path, CACHELAYOUT, start, stop, chunksize)
+
+# picks the layout of a branch log from the number of fields of its first record,
+# or from the columns in the index of a binary log
+def branchlayout(path):
+    if isbinlog(path):
+        import BinLog
+        columns = [name for name, typecode in BinLog.readindex(path)['columns']]
+        return BRANCHLAYOUT if 'cls' in columns and 'target' in columns else OLDBRANCHLAYOUT
+    with open(os.path.expanduser(path), "rb") as f:
+        for line in f:
+            if line.strip() and not markerre.match(line):
+                return OLDBRANCHLAYOUT if len(line.split()) == len(OLDBRANCHLAYOUT) else BRANCHLAYOUT
+    return BRANCHLAYOUT
+
+# yields the batches of a branch_<type><size>.log
+def readbranchlog(path, start=0, stop=None, chunksize=CHUNKSIZE):
+    return readlog(path, branchlayout(path), start, stop, chunksize)
+
+# checks whether path is a binary log written by BinLog.py
+def isbinlog(path):
+    with open(os.path.expanduser(path), "rb") as f:
+        return f.read(len(BINMAGIC)) == BINMAGIC
+
+# finds the BEGIN and TRAIN markers in a log, at which the caches
+# and predictors are emptied, and returns a list of (marker, label, start, end)
+# byte ranges that together cover the log. The first range has a
+# marker of None if the log does not start with a marker.
+def segments(path):
+    if isbinlog(path):
+        import BinLog
+        return BinLog.segments(path)
+    log = maplog(path)
+    if log is None:
+        return []
+    with log:
+        ranges = []
+        marker, label, start = None, '', 0
+        for m in findmarkers(log):
+            if m.group(1) == b'END':
+                continue
+            if m.start() > start or marker is not None:
+                ranges.append((marker, label, start, m.start()))
+            marker, label, start = m.group(1).decode(), m.group(2).decode(), m.start()
+        if len(log) > start or marker is not None:
+            ranges.append((marker, label, start, len(log)))
+        return ranges
+
+
+# picks the record layout for a log from its file name
+def layoutfor(path):
+    if os.path.basename(path).startswith('branch'):
+        return branchlayout(path)
+    return CACHELAYOUT
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("usage: LogReader.py <log file>")
+    size = os.path.getsize(os.path.expanduser(sys.argv[1]))
+    starttime = time.time()
+    records = 0
+    batches = 0
+    for batch in readlog(sys.argv[1], layoutfor(sys.argv[1])):
+        records += len(batch)
+        batches += 1
+    elapsed = time.time() - starttime
+    print("Read", records, "records in", batches, "batches in", round(elapsed, 2), "s:",
+          round(size/elapsed/1e6, 1), "MB/s,", round(records/elapsed/1e6, 2), "M records/s.")
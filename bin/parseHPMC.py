@@ -3,7 +3,7 @@
 ###########################################
 ## Written: Ross Thompson ross1728@gmail.com
 ## Created: 4 Jan 2022
-## Modified: 
+## Modified: 17 October 2026
 ##
 ## Purpose: Parses the performance counters from a modelsim trace.
 ##
@@ -29,6 +29,10 @@ import os
 import sys
 import matplotlib.pyplot as plt
 import re
+import mmap
+import sqlite3
+import hashlib
+import numpy as np
 
 #RefData={'twobitCModel' :(['6', '8', '10', '12', '14', '16'],
 #                          [11.0680836450622, 8.53864970807778, 7.59565430177984, 6.38741598498948, 5.83662961500838, 5.83662961500838]),
@@ -42,77 +46,84 @@ RefData = [('twobitCModel6', 11.0501534891674), ('twobitCModel8', 8.518290522663
            ('gshareCModel12', 8.25796055444401), ('gshareCModel14', 6.23093702707613), ('gshareCModel16', 3.34001125650374)]
 
 
-def ComputeCPI(benchmark):
-    'Computes and inserts CPI into benchmark stats.'
-    (nameString, opt, dataDict) = benchmark
-    CPI = 1.0 * int(dataDict['Mcycle']) / int(dataDict['InstRet'])
-    dataDict['CPI'] = CPI
+# The derived metrics: name, numerator, denominator and scale. The numerator and
+# denominator are counter names, or sums of counters joined by ' + '. A metric whose
+# denominator is 0 for a benchmark, or whose counters were not printed, is NaN there.
+METRICS = [('CPI',      'Mcycle',            'InstRet',                    1.0),
+           ('BDMR',     'BP Dir Wrong',      'Br Count',                   100.0),
+           ('BTMR',     'BP Target Wrong',   'Br Count + Jump Not Return', 100.0), # *** this is wrong in the verilog test bench
+           ('RASMPR',   'RAS Wrong',         'Return',                     100.0),
+           ('ClassMPR', 'Instr Class Wrong', 'InstRet',                    100.0),
+           ('ICacheMR', 'I Cache Miss',      'I Cache Access',             100.0),
+           ('ICacheMT', 'I Cache Cycles',    'I Cache Miss',               100.0),
+           ('DCacheMR', 'D Cache Miss',      'D Cache Access',             100.0),
+           ('DCacheMT', 'D Cache Cycles',    'D Cache Miss',               100.0)]
 
-def ComputeBranchDirMissRate(benchmark):
-    'Computes and inserts branch direction miss prediction rate.'
-    (nameString, opt, dataDict) = benchmark
-    branchDirMissRate = 100.0 * int(dataDict['BP Dir Wrong']) / int(dataDict['Br Count'])
-    dataDict['BDMR'] = branchDirMissRate
+class HPMCTable:
+    '''The counters of every benchmark of every config as one table: a row per (config, test, opt)
+    and a column per counter, NaN where a benchmark did not print the counter.'''
+    def __init__(self, configList):
+        '''configList is a list of (config, benchmarks) with benchmarks as ProcessFile returns them.'''
+        self.config, self.test, self.opt = [], [], []
+        self.counters = {}
+        rows = []
+        for (config, benchmarks) in configList:
+            for (testName, opt, HPMClist) in benchmarks:
+                self.config.append(config)
+                self.test.append(testName)
+                self.opt.append(opt)
+                rows.append(HPMClist)
+                for name in HPMClist:
+                    self.counters.setdefault(name, len(self.counters))
+        self.values = np.full((len(rows), len(self.counters)), np.nan)
+        for (row, HPMClist) in enumerate(rows):
+            for (name, value) in HPMClist.items():
+                self.values[row, self.counters[name]] = value
+        self.configs = list(dict.fromkeys(self.config))
+        self.group = np.array([self.configs.index(config) for config in self.config], dtype=int)
+        self.metrics = {name: self.Metric(numerator, denominator, scale) for (name, numerator, denominator, scale) in METRICS}
 
-def ComputeBranchTargetMissRate(benchmark):
-    'Computes and inserts branch target miss prediction rate.'
-    # *** this is wrong in the verilog test bench
-    (nameString, opt, dataDict) = benchmark
-    branchTargetMissRate = 100.0 * int(dataDict['BP Target Wrong']) / (int(dataDict['Br Count']) + int(dataDict['Jump Not Return']))
-    dataDict['BTMR'] = branchTargetMissRate
+    def Counter(self, expression):
+        'A column of the table, or the sum of the columns in an expression like \'Br Count + Jump Not Return\'.'
+        column = np.zeros(len(self.config))
+        for name in expression.split(' + '):
+            column = column + (self.values[:, self.counters[name]] if name in self.counters else np.nan)
+        return column
 
-def ComputeRASMissRate(benchmark):
-    'Computes and inserts return address stack miss prediction rate.'
-    (nameString, opt, dataDict) = benchmark
-    RASMPR = 100.0 * int(dataDict['RAS Wrong']) / int(dataDict['Return'])
-    dataDict['RASMPR'] = RASMPR
+    def Metric(self, numerator, denominator, scale):
+        'scale * numerator / denominator for every row, NaN where the denominator is 0.'
+        num = self.Counter(numerator)
+        den = self.Counter(denominator)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(den != 0, scale * num / den, np.nan)
 
-def ComputeInstrClassMissRate(benchmark):
-    'Computes and inserts instruction class miss prediction rate.'
-    (nameString, opt, dataDict) = benchmark
-    ClassMPR = 100.0 * int(dataDict['Instr Class Wrong']) / int(dataDict['InstRet'])
-    dataDict['ClassMPR'] = ClassMPR
-    
-def ComputeICacheMissRate(benchmark):
-    'Computes and inserts instruction class miss prediction rate.'
-    (nameString, opt, dataDict) = benchmark
-    ICacheMR = 100.0 * int(dataDict['I Cache Miss']) / int(dataDict['I Cache Access'])
-    dataDict['ICacheMR'] = ICacheMR
+    def GeometricAverage(self, metric):
+        '''The geometric mean of a metric over the benchmarks of each config, computed in log space so
+        that large suites cannot overflow or underflow. NaNs are left out; any 0 makes the mean 0.'''
+        values = self.metrics[metric]
+        valid = ~np.isnan(values)
+        positive = valid & (values > 0)
+        logs = np.log(np.where(positive, values, 1.0))
+        count = np.bincount(self.group, weights=valid, minlength=len(self.configs))
+        zeros = np.bincount(self.group, weights=valid & ~positive, minlength=len(self.configs))
+        total = np.bincount(self.group, weights=logs, minlength=len(self.configs))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            average = np.exp(total / count)
+        average[zeros > 0] = 0.0
+        average[count == 0] = np.nan
+        return dict(zip(self.configs, average))
 
-def ComputeICacheMissTime(benchmark):
-    'Computes and inserts instruction class miss prediction rate.'
-    (nameString, opt, dataDict) = benchmark
-    cycles = int(dataDict['I Cache Miss'])
-    if(cycles == 0): ICacheMR = 0
-    else: ICacheMR = 100.0 * int(dataDict['I Cache Cycles']) / cycles
-    dataDict['ICacheMT'] = ICacheMR
-    
-def ComputeDCacheMissRate(benchmark):
-    'Computes and inserts instruction class miss prediction rate.'
-    (nameString, opt, dataDict) = benchmark
-    DCacheMR = 100.0 * int(dataDict['D Cache Miss']) / int(dataDict['D Cache Access'])
-    dataDict['DCacheMR'] = DCacheMR
+    def Rows(self):
+        'The (test, opt, config, metrics dictionary) of every row.'
+        for row in range(len(self.config)):
+            yield (self.test[row], self.opt[row], self.config[row], {name: values[row] for (name, values) in self.metrics.items()})
 
-def ComputeDCacheMissTime(benchmark):
-    'Computes and inserts instruction class miss prediction rate.'
-    (nameString, opt, dataDict) = benchmark
-    cycles = int(dataDict['D Cache Miss'])
-    if(cycles == 0): DCacheMR = 0
-    else: DCacheMR = 100.0 * int(dataDict['D Cache Cycles']) / cycles
-    dataDict['DCacheMT'] = DCacheMR
+    def Averages(self):
+        'The (\'All\', \'\', config, geometric means of the metrics) of every config.'
+        averages = {metric: self.GeometricAverage(metric) for metric in self.metrics}
+        for config in self.configs:
+            yield ('All', '', config, {metric: averages[metric][config] for metric in self.metrics})
 
-def ComputeAll(benchmarks):
-    for benchmark in benchmarks:
-        ComputeCPI(benchmark)
-        ComputeBranchDirMissRate(benchmark)
-        ComputeBranchTargetMissRate(benchmark)
-        ComputeRASMissRate(benchmark)
-        ComputeInstrClassMissRate(benchmark)
-        ComputeICacheMissRate(benchmark)
-        ComputeICacheMissTime(benchmark)
-        ComputeDCacheMissRate(benchmark)
-        ComputeDCacheMissTime(benchmark)
-    
 def printStats(benchmark):
     (nameString, opt, dataDict) = benchmark
     print('Test', nameString)
@@ -128,42 +139,100 @@ def printStats(benchmark):
     print('D Cache Miss Ave Cycles  %1.4f' % dataDict['DCacheMT'])
     print()
 
-def ProcessFile(fileName):
-    '''Extract preformance counters from a modelsim log.  Outputs a list of tuples for each test/benchmark.
-    The tuple contains the test name, optimization characteristics, and dictionary of performance counters.'''
-    # 1 find lines with Read memfile and extract test name
-    # 2 parse counters into a list of (name, value) tuples (dictionary maybe?)
+# One pass of this regex over a transcript finds every line ProcessFile needs: the
+# memfile of each test, its counters and the end of the test.
+transcriptre = re.compile(rb'^\S+[ \t]+Read[ \t]+memfile[ \t]+(\S+)|^\S+[ \t]+Cnt[^=\n]*=[ \t]*(-?\d+)[ \t]+([^\r\n]*)|(is done)', re.M)
+
+# The parsed transcripts are cached in an SQLite database in the directory of each transcript
+CacheName = 'parseHPMC-cache.db'
+CacheSchema = """
+create table if not exists transcripts (config text primary key, mtime real, size integer, hash text);
+create table if not exists hpmc (config text, seq integer, test text, opt text, counter text, value integer);
+create index if not exists hpmcbyconfig on hpmc (config, seq);
+"""
+
+def ParseTranscript(fileName):
+    '''Extract preformance counters from a modelsim log in one streaming pass.  Outputs a list of tuples
+    for each test/benchmark, with the test name, optimization characteristics, and dictionary of
+    performance counters.'''
     benchmarks = []
-    transcript = open(fileName, 'r')
     HPMClist = { }
     testName = ''
-    for line in transcript.readlines():
-        lineToken = line.split()
-        if(len(lineToken) > 3 and lineToken[1] == 'Read' and lineToken[2] == 'memfile'):
-            opt = lineToken[3].split('/')[-4]
-            testName = lineToken[3].split('/')[-1].split('.')[0]
-            HPMClist = { }
-        elif(len(lineToken) > 4 and lineToken[1][0:3] == 'Cnt'):
-            countToken = line.split('=')[1].split()
-            value = int(countToken[0])
-            name = ' '.join(countToken[1:])
-            HPMClist[name] = value
-        elif ('is done' in line):
-            benchmarks.append((testName, opt, HPMClist))
+    opt = ''
+    with open(fileName, 'rb') as transcript:
+        if os.fstat(transcript.fileno()).st_size == 0:
+            return benchmarks
+        with mmap.mmap(transcript.fileno(), 0, access=mmap.ACCESS_READ) as log:
+            for match in transcriptre.finditer(log):
+                memfile, value, name, done = match.groups()
+                if memfile is not None:
+                    path = memfile.decode(errors='replace').split('/')
+                    opt = path[-4] if len(path) >= 4 else ''
+                    testName = path[-1].split('.')[0]
+                    HPMClist = { }
+                elif value is not None:
+                    HPMClist[' '.join(name.decode(errors='replace').split())] = int(value)
+                else:
+                    benchmarks.append((testName, opt, dict(HPMClist)))
     return benchmarks
 
-def ComputeArithmeticAverage(benchmarks):
-    average = {}
-    index = 0
-    for (testName, opt, HPMClist) in benchmarks:
-        for field in HPMClist:
-            value = HPMClist[field]
-            if field not in average:
-                average[field] = value
+def FileHash(fileName):
+    '''SHA-1 of a file's contents'''
+    digest = hashlib.sha1()
+    with open(fileName, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def ProcessFile(fileName):
+    '''Extract preformance counters from a modelsim log.  Outputs a list of tuples for each test/benchmark.
+    The tuple contains the test name, optimization characteristics, and dictionary of performance counters.
+    The counters are kept in the cache database next to the log, as one (config, test, counter) row per
+    value, and are only parsed again when the log's modification time and contents change.'''
+    config = os.path.abspath(fileName)
+    stat = os.stat(config)
+    try:
+        db = sqlite3.connect(os.path.join(os.path.dirname(config), CacheName))
+        db.executescript(CacheSchema)
+    except sqlite3.Error:
+        return ParseTranscript(fileName) # e.g. a read-only directory
+    try:
+        return CachedProcessFile(db, config, stat)
+    except sqlite3.Error:
+        return ParseTranscript(fileName)
+    finally:
+        db.close()
+
+def CachedProcessFile(db, config, stat):
+    'ProcessFile through the open cache database db.'
+    with db:
+        row = db.execute('select mtime, size, hash from transcripts where config = ?', (config,)).fetchone()
+        fileHash = None
+        if row is not None and (row[0], row[1]) != (stat.st_mtime, stat.st_size):
+            # touched or rewritten; the counters still hold if the contents are the same
+            fileHash = FileHash(config)
+            if fileHash == row[2]:
+                db.execute('update transcripts set mtime = ?, size = ? where config = ?', (stat.st_mtime, stat.st_size, config))
             else:
-                average[field] += value
-        index += 1
-    benchmarks.append(('All', '', average))
+                row = None
+        if row is not None:
+            benchmarks = []
+            for seq, test, opt, counter, value in db.execute('select seq, test, opt, counter, value from hpmc where config = ? order by seq, rowid', (config,)):
+                if seq >= len(benchmarks):
+                    benchmarks.append((test, opt, { }))
+                if counter is not None:
+                    benchmarks[seq][2][counter] = value
+            return benchmarks
+
+        benchmarks = ParseTranscript(config)
+        db.execute('delete from hpmc where config = ?', (config,))
+        db.execute('insert or replace into transcripts (config, mtime, size, hash) values (?, ?, ?, ?)',
+                   (config, stat.st_mtime, stat.st_size, fileHash or FileHash(config)))
+        for seq, (test, opt, HPMClist) in enumerate(benchmarks):
+            rows = [(config, seq, test, opt, counter, value) for counter, value in HPMClist.items()]
+            db.executemany('insert into hpmc (config, seq, test, opt, counter, value) values (?, ?, ?, ?, ?, ?)',
+                           rows or [(config, seq, test, opt, None, None)])
+    return benchmarks
 
 def FormatToPlot(currBenchmark):
     names = []
@@ -174,28 +243,6 @@ def FormatToPlot(currBenchmark):
         values.append(config[1])
     return (names, values)
 
-def GeometricAverage(benchmarks, field):
-    Product = 1
-    index = 0
-    for (testName, opt, HPMCList) in benchmarks:
-        #print(HPMCList)
-        Product *= HPMCList[field]
-        index += 1
-    return Product ** (1.0/index)
-
-def ComputeGeometricAverage(benchmarks):
-    fields = ['BDMR', 'BTMR', 'RASMPR', 'ClassMPR', 'ICacheMR', 'DCacheMR', 'CPI', 'ICacheMT', 'DCacheMT']
-    AllAve = {}
-    for field in fields:
-        Product = 1
-        index = 0
-        for (testName, opt, HPMCList) in benchmarks:
-            #print(HPMCList)
-            Product *= HPMCList[field]
-            index += 1
-        AllAve[field] = Product ** (1.0/index)
-    benchmarks.append(('All', '', AllAve))
-
 if(sys.argv[1] == '-b'):
     configList = []
     summery = 0
@@ -203,39 +250,14 @@ if(sys.argv[1] == '-b'):
         summery = 1
         sys.argv = sys.argv[1::]
     for config in sys.argv[2::]:
-        benchmarks = ProcessFile(config)
-        #ComputeArithmeticAverage(benchmarks)
-        ComputeAll(benchmarks)
-        ComputeGeometricAverage(benchmarks)
-        #print('CONFIG: %s GEO MEAN: %f' % (config, GeometricAverage(benchmarks, 'BDMR')))
-        configList.append((config.split('.')[0], benchmarks))
-
-    # Merge all configruations into a single list
-    benchmarkAll = []
-    for (config, benchmarks) in configList:
-        #print(config)
-        for benchmark in benchmarks:
-            (nameString, opt, dataDict) = benchmark
-            #print("BENCHMARK")
-            #print(nameString)
-            #print(opt)
-            #print(dataDict)
-            benchmarkAll.append((nameString, opt, config, dataDict))
-    #print('ALL!!!!!!!!!!')
-    #for bench in benchmarkAll:
-    #    print('BENCHMARK')
-    #    print(bench)
-    #print('ALL!!!!!!!!!!')
+        configList.append((config.split('.')[0], ProcessFile(config)))
+    table = HPMCTable(configList)
 
     # now extract all branch prediction direction miss rates for each
     # namestring + opt, config
     benchmarkDict = { }
-    for benchmark in benchmarkAll:
-        (name, opt, config, dataDict) = benchmark
-        if name+'_'+opt in benchmarkDict:
-            benchmarkDict[name+'_'+opt].append((config, dataDict['BDMR']))
-        else:
-            benchmarkDict[name+'_'+opt] = [(config, dataDict['BDMR'])]
+    for (name, opt, config, metrics) in list(table.Rows()) + list(table.Averages()):
+        benchmarkDict.setdefault(name+'_'+opt, []).append((config, metrics['BDMR']))
 
     size = len(benchmarkDict)
     index = 1
@@ -304,8 +326,7 @@ else:
     # steps 1 and 2
     benchmarks = ProcessFile(sys.argv[1])
     print(benchmarks[0])
-    ComputeAll(benchmarks)
-    ComputeGeometricAverage(benchmarks)
+    table = HPMCTable([(sys.argv[1], benchmarks)])
     # 3 process into useful data
     # cache hit rates
     # cache fill time
@@ -313,6 +334,5 @@ else:
     # hazard counts
     # CPI
     # instruction distribution
-    for benchmark in benchmarks:
-        printStats(benchmark)
-
+    for (name, opt, config, metrics) in list(table.Rows()) + list(table.Averages()):
+        printStats((name, opt, metrics))
@@ -9,6 +9,13 @@
 # non-zero status code if an error happened, as well as printing human-readable
 # output.
 #
+# With -trace, rather than simulating embench once per branch predictor type
+# and size, embench is simulated once with the BPRED_LOGGER on, and the
+# direction misprediction rates of every type and size are computed from its
+# branch trace by bin/BranchSim.py. -spotcheck <n> (default 2) also runs n of
+# the configurations in RTL with the HPM counters printed, and checks that the
+# trace-driven rates agree with the RTL's within SPOTCHECK_TOLERANCE.
+#
 ##################################
 import sys,os,shutil
 
@@ -48,6 +55,7 @@ configs = [
 
 bpdSize = [6, 8, 10, 12, 14, 16]
 bpdType = ['twobit', 'gshare', 'global', 'gshare_basic', 'global_basic']
+bpdConfigs = {}
 for CurrBPType in bpdType:
     for CurrBPSize in bpdSize:
         name = CurrBPType+str(CurrBPSize)
@@ -58,6 +66,19 @@ for CurrBPType in bpdType:
             cmd="vsim > {} -c <<!\ndo wally-batch.do  rv32gc configOptions " + name + " embench " + configOptions,
             grepstr="")
         configs.append(tc)
+        bpdConfigs[(CurrBPType, CurrBPSize)] = tc
+
+# -trace: one embench run logging its branches, named by testbench.sv after the
+# predictor it runs with, which does not change the branches it logs
+traceLog = "branch_BP_GSHARE16.log"
+traceConfig = TestCase(
+    name="trace",
+    variant="rv32gc",
+    cmd="vsim > {} -c <<!\ndo wally-batch.do  rv32gc configOptions trace embench +define+INSTR_CLASS_PRED=0 +define+BPRED_TYPE=\"BP_GSHARE\" +define+BPRED_SIZE=16 +define+BPRED_LOGGER=1",
+    grepstr="")
+# largest difference in percentage points between the RTL's and the trace's
+# geometric mean direction misprediction rate for a spot check to pass
+SPOTCHECK_TOLERANCE = 0.5
 
 import os
 from multiprocessing import Pool, TimeoutError
@@ -82,6 +103,78 @@ def run_test_case(config):
         print("  Check %s" % logname)
         return 1
 
+def spotcheck_configs(n):
+    """n of the predictor configurations spread over bpdConfigs, rebuilt to print the HPM counters"""
+    keys = list(bpdConfigs)
+    picked = [keys[i*len(keys)//n] for i in range(n)] if n else []
+    return {key: bpdConfigs[key]._replace(name=bpdConfigs[key].name+"_spotcheck",
+                                          cmd=bpdConfigs[key].cmd.replace(bpdConfigs[key].name+" embench", bpdConfigs[key].name+"_spotcheck embench")
+                                          + " +define+PrintHPMCounters=1")
+            for key in picked}
+
+def read_hpm_counters(logname):
+    """A dictionary of benchmark name: {counter name: value} from a log printed with PrintHPMCounters,
+    parsed as bin/parseHPMC.py does; empty if there is no log"""
+    benchmarks = {}
+    counters = {}
+    testName = ''
+    try:
+        transcript = open(logname, errors='replace')
+    except OSError:
+        return benchmarks
+    with transcript:
+        for line in transcript:
+            lineToken = line.split()
+            if len(lineToken) > 3 and lineToken[1] == 'Read' and lineToken[2] == 'memfile':
+                testName = lineToken[3].split('/')[-1].split('.')[0]
+                counters = {}
+            elif len(lineToken) > 4 and lineToken[1][0:3] == 'Cnt':
+                countToken = line.split('=')[1].split()
+                counters[' '.join(countToken[1:])] = int(countToken[0])
+            elif 'is done' in line:
+                benchmarks[testName] = counters
+    return benchmarks
+
+def trace_results(spotchecks):
+    """Compute every predictor's misprediction rates from the trace, print them, and compare
+    the spot checks with the RTL. Returns the number of spot checks that disagree."""
+    sys.path.insert(0, os.path.join(regressionDir, "..", "bin"))
+    import BranchSim
+    tracePath = "logs/rv32gc_trace_branch.log"
+    if not os.path.exists(traceLog):
+        print(f"{bcolors.FAIL}No branch trace %s was written{bcolors.ENDC}" % traceLog)
+        return 1
+    os.replace(traceLog, tracePath)
+    results = BranchSim.simulate([tracePath], bpdType, bpdSize, os.cpu_count())
+    summary = BranchSim.summarize(results, bpdType, bpdSize)
+    print("Branch direction misprediction rate from the trace, geometric mean over %d benchmarks:" % len(results))
+    for name, rate in summary.items():
+        print("%-16s %6.2f%%" % (name, rate))
+
+    num_fail = 0
+    for (bpType, bpSize), config in spotchecks.items():
+        rtl = read_hpm_counters("logs/"+config.variant+"_"+config.name+".log")
+        rtlRates, traceRates = [], []
+        for label, counts in results:
+            test = label.split('/')[-1].split('.')[0]
+            branches, misses = counts[(bpType, bpSize)]
+            if test in rtl and rtl[test].get('Br Count') and branches:
+                rtlRates.append(100.0 * rtl[test]['BP Dir Wrong'] / rtl[test]['Br Count'])
+                traceRates.append(BranchSim.missrate(branches, misses))
+        name = BranchSim.reportname(bpType, bpSize)
+        if not rtlRates:
+            print(f"{bcolors.FAIL}%s: no HPM counters to spot check against{bcolors.ENDC}" % name)
+            num_fail += 1
+            continue
+        rtlRate, traceRate = BranchSim.geomean(rtlRates), BranchSim.geomean(traceRates)
+        if abs(rtlRate - traceRate) <= SPOTCHECK_TOLERANCE:
+            print(f"{bcolors.OKGREEN}%s: RTL %.2f%%, trace %.2f%% over %d benchmarks{bcolors.ENDC}" % (name, rtlRate, traceRate, len(rtlRates)))
+        else:
+            print(f"{bcolors.FAIL}%s: RTL %.2f%%, trace %.2f%% over %d benchmarks differ by more than %.2f points{bcolors.ENDC}"
+                  % (name, rtlRate, traceRate, len(rtlRates), SPOTCHECK_TOLERANCE))
+            num_fail += 1
+    return num_fail
+
 def main():
     """Run the tests and count the failures"""
     TIMEOUT_DUR = 10800 # 3 hours
@@ -105,6 +198,12 @@ def main():
         os.chdir(regressionDir)
         os.system('./make-tests.sh | tee ./logs/make-tests.log')
 
+    spotchecks = {}
+    if '-trace' in sys.argv:
+        n = int(sys.argv[sys.argv.index('-spotcheck')+1]) if '-spotcheck' in sys.argv else 2
+        spotchecks = spotcheck_configs(n)
+        configs = [traceConfig] + list(spotchecks.values())
+
     # Scale the number of concurrent processes to the number of test cases, but
     # max out at a limited number of concurrent processes to not overwhelm the system
     with Pool(processes=min(len(configs),40)) as pool:
@@ -119,6 +218,9 @@ def main():
              num_fail+=1
              print(f"{bcolors.FAIL}%s_%s: Timeout - runtime exceeded %d seconds{bcolors.ENDC}" % (config.variant, config.name, TIMEOUT_DUR))
 
+    if '-trace' in sys.argv:
+        num_fail += trace_results(spotchecks)
+
     # Count the number of failures
     if num_fail:
         print(f"{bcolors.FAIL}Regression failed with %s failed configurations{bcolors.ENDC}" % num_fail)
@@ -1,40 +1,150 @@
 #!/usr/bin/python3
-import sys, os, subprocess
+##################################
+#
+# buildrootBugFinder.py
+#
+# Finds where buildroot first diverges from its trace. The windows between
+# consecutive Linux checkpoints (from maxGoodCount on) are simulated in
+# parallel, each from its checkpoint to the next. Then the first failing
+# window is bisected: checkpoints are generated at -j points between the
+# latest start known to fail and the earliest known to pass, and all of them
+# are simulated at once, until the interval is below -min instructions. A
+# start before the divergence fails; a start after it, from QEMU's state,
+# does not.
+#
+# Windows proven good are kept in logs/buildrootBugFinderLogs/index.json with
+# a hash of the RTL, and are not simulated again until the RTL changes. The
+# outcome of every simulation is appended to summary.log.
+#
+#   ./buildrootBugFinder.py (-j <parallel sims>) (-start <instrs>) (-min <instrs>) (-nobisect)
+#
+##################################
+import sys, os, json
+from multiprocessing import Pool
+import regressionRunner
+import regressionCache
+
+maxGoodCount = 400e6 # num instrs that execute sucessfully starting from 0
+REPORT_INTERVAL = 100000 # testbench-linux reports "Reached" every this many instructions
+riscv = os.environ.get("RISCV", "/opt/riscv")
+linuxTestvectors = riscv+"/linux-testvectors"
+genCheckpointDir = os.path.join(regressionCache.wallyDir, "linux", "testvector-generation")
+logDir = "./logs/buildrootBugFinderLogs/"
+
+def getArg(flag, default):
+    """The number following flag on the command line, or default"""
+    if flag in sys.argv:
+        return int(float(sys.argv[sys.argv.index(flag)+1]))
+    return default
+
+def listCheckpoints():
+    return sorted(int(fileName[len('checkpoint'):]) for fileName in os.listdir(linuxTestvectors)
+                  if fileName.startswith('checkpoint') and fileName[len('checkpoint'):].isdigit())
+
+def reportPoint(instrs):
+    """The first instruction count testbench-linux reports at or after instrs"""
+    return -(-int(instrs) // REPORT_INTERVAL) * REPORT_INTERVAL
+
+def runWindow(window):
+    """Simulate from checkpoint start until limit (0 for the end of the trace), in a work
+    library of its own, and return (start, limit, passed, instructions reached, KIPS)"""
+    start, limit = window
+    logFile = logDir+"checkpoint"+str(start)+"-"+str(limit)+".log"
+    runCommand = "vsim -c <<!\ndo wally-batch.do buildroot buildroot-checkpoint "+riscv+" "+str(limit)+" "+str(start+1)+" "+str(start)+" bugfinder"+str(start)+"\n!"
+    passPattern = str(limit)+" instructions" if limit else "WallyHostname login:"
+    result = regressionRunner.runJob(runCommand, logFile, passPattern, float('inf'))
+    reached = result.instructions if result.instructions else start
+    return start, limit, result.status == "pass", reached, result.kips
+
+def runWindows(windows, jobs, summaryLogFilePath):
+    """Simulate windows jobs at a time, logging each outcome to the summary, and return their results"""
+    results = []
+    with Pool(processes=max(min(jobs, len(windows)), 1)) as pool:
+        for start, limit, passed, reached, kips in pool.imap_unordered(runWindow, windows):
+            summaryStr = "Checkpoint "+str(start)+" reached "+str(reached)+" instrs"
+            if kips:
+                summaryStr += " at "+str(kips)+" KIPS"
+            summaryStr += (" (passed to "+str(limit)+")" if passed else " (failed)")+"\n"
+            print(summaryStr, end="")
+            with open(summaryLogFilePath, 'a') as summaryLogFile:
+                summaryLogFile.write(summaryStr)
+            results.append((start, limit, passed, reached))
+    return sorted(results)
+
+def genCheckpoint(instrs):
+    """Generate a checkpoint at instrs with QEMU. Checkpoints are generated one at a time,
+    since genCheckpoint.sh always uses the same GDB port."""
+    if not os.path.exists(linuxTestvectors+"/checkpoint"+str(instrs)):
+        os.system("cd "+genCheckpointDir+" && echo y | ./genCheckpoint.sh "+str(instrs))
+    return os.path.exists(linuxTestvectors+"/checkpoint"+str(instrs))
 
 def main():
-    maxGoodCount = 400e6 # num instrs that execute sucessfully starting from 0
-    currInstrCount = maxGoodCount
-    linuxTestvectors = "/opt/riscv/linux-testvectors"
+    jobs = getArg('-j', os.cpu_count())
+    startCount = getArg('-start', maxGoodCount)
+    minWindow = getArg('-min', REPORT_INTERVAL)
     if not os.path.exists(linuxTestvectors):
         sys.stderr.write("Error: Linux testvectors not found at "+linuxTestvectors+"\n")
         exit(1)
-    checkpointList = [int(fileName.strip('checkpoint')) for fileName in os.listdir(linuxTestvectors) if 'checkpoint' in fileName]
-    checkpointList.sort()
-    
-    logDir = "./logs/buildrootBugFinderLogs/"
-    os.system("mkdir -p "+logDir)
+    os.makedirs(logDir, exist_ok=True)
     summaryLogFilePath = logDir+"summary.log"
-    summaryLogFile = open(summaryLogFilePath,'w')
-    summaryLogFile.close()
-    while True:
-        checkpointList = [checkpoint for checkpoint in checkpointList if checkpoint > currInstrCount]
-        if len(checkpointList)==0:
+    open(summaryLogFilePath, 'w').close()
+
+    # windows already proven good on this RTL need not run again
+    rtl = regressionCache.ResultCache(logDir+"hashcache").rtlHash()
+    indexPath = logDir+"index.json"
+    try:
+        with open(indexPath) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    if index.get("rtl") != rtl:
+        index = {"rtl": rtl, "good": []}
+    def proven(start, limit):
+        return any(goodStart <= start and (goodLimit == 0 or (limit != 0 and limit <= goodLimit))
+                   for goodStart, goodLimit in index["good"])
+    def saveIndex():
+        with open(indexPath+".tmp", 'w') as f:
+            json.dump(index, f, indent=1)
+        os.replace(indexPath+".tmp", indexPath)
+
+    checkpointList = [checkpoint for checkpoint in listCheckpoints() if checkpoint >= startCount]
+    windows = [(checkpoint, reportPoint(checkpointList[i+1]) if i+1 < len(checkpointList) else 0)
+               for i, checkpoint in enumerate(checkpointList)]
+    windows = [window for window in windows if not proven(*window)]
+    results = runWindows(windows, jobs, summaryLogFilePath)
+    index["good"] += [[start, limit] for start, limit, passed, reached in results if passed]
+    saveIndex()
+    failures = [(start, reached) for start, limit, passed, reached in results if not passed]
+    if not failures:
+        print("No window failed")
+        return 0
+    lo, failedAt = failures[0]
+    # failedAt is the last count reported before the failure, which can be up to
+    # REPORT_INTERVAL instructions before it, so bisect up to the next report
+    hi = reportPoint(failedAt + 1)
+    print("First failure: starting at "+str(lo)+" fails after "+str(failedAt)+" and by "+str(hi)+" instrs")
+
+    # bisect between the latest start that fails and the earliest that passes
+    while '-nobisect' not in sys.argv and hi - lo > minWindow:
+        step = max((hi - lo) // (jobs + 1), 1)
+        points = sorted(set(lo + step*i for i in range(1, jobs + 1) if lo + step*i < hi))
+        points = [point for point in points if genCheckpoint(point)]
+        if not points:
+            print("Could not generate checkpoints between "+str(lo)+" and "+str(hi))
             break
-        checkpoint = checkpointList[0]
-        logFile = logDir+"checkpoint"+str(checkpoint)+".log"
-        runCommand="{\nvsim -c <<!\ndo wally-batch.do buildroot buildroot /opt/riscv 0 "+str(checkpoint+1)+" "+str(checkpoint)+"\n!\n} | tee "+logFile 
-        print(runCommand)
-        os.system(runCommand)
-        try:
-            logOutput = subprocess.check_output(["grep","-e","Reached",logFile])
-            currInstrCount = int(str(logOutput).strip('b').strip('\'').strip('\\n').split(' ')[-2])
-        except subprocess.CalledProcessError:
-            currInstrCount = checkpoint
-        summaryStr="Checkpoint "+str(checkpoint)+" reached "+str(currInstrCount)+" instrs\n"
-        summaryLogFile = open(summaryLogFilePath,'a')
+        limit = reportPoint(failedAt + 1)
+        results = runWindows([(point, limit) for point in points], jobs, summaryLogFilePath)
+        hi = min([hi] + [start for start, limit, passed, reached in results if passed])
+        lo = max([lo] + [start for start, limit, passed, reached in results if not passed and start < hi])
+        index["good"] += [[start, limit] for start, limit, passed, reached in results if passed]
+        saveIndex()
+        print("Divergence is between "+str(lo)+" and "+str(hi)+" instrs")
+    index["divergence"] = [lo, hi]
+    saveIndex()
+    summaryStr = "Divergence between "+str(lo)+" and "+str(hi)+" instrs; first failure at "+str(failedAt)+"\n"
+    print(summaryStr, end="")
+    with open(summaryLogFilePath, 'a') as summaryLogFile:
         summaryLogFile.write(summaryStr)
-        summaryLogFile.close()
-
     return 0
 
 if __name__ == '__main__':
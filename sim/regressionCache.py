@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+##################################
+#
+# regressionCache.py
+#
+# Content-addressed cache of passing regression-wally results. A job's key is
+# a hash of everything its result depends on: its command and pass string, the
+# RTL in src/, its configuration in config/, the testbench and .do scripts, and
+# the memfiles of its tests. A job whose key matches a previous pass is not
+# run again; the log of that pass is reused instead.
+#
+##################################
+import os, re, json, shutil, hashlib
+
+wallyDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+simDir = os.path.join(wallyDir, "sim")
+
+# the config and TEST a simulation command runs, e.g. 'do wally-batch.do rv64gc arch64i'
+docmdre = re.compile(r'do wally(?:-batch)?\.do (\S+) (\S+)')
+
+def listFiles(top, extensions):
+    """All the files below top ending in one of extensions, sorted"""
+    found = []
+    for root, dirs, files in os.walk(top):
+        found += [os.path.join(root, name) for name in files if name.endswith(extensions)]
+    return sorted(found)
+
+def parseTestSuites():
+    """Map each TEST of testbench.sv to the memfiles of the tests it runs, from the
+    case statements of testbench.sv and the test lists of tests.vh. A TEST with
+    alternatives (such as arch64c with and without Zicsr) maps to all of them."""
+    with open(os.path.join(wallyDir, "testbench", "tests.vh")) as f:
+        testsvh = f.read()
+    macros = dict(re.findall(r'`define\s+(\w+)\s+"(\d+)"', testsvh))
+    tvpaths = re.findall(r'"([^"]*)"', re.search(r"string\s+tvpaths\[\]\s*=\s*'\{(.*?)\};", testsvh, re.S).group(1))
+    arrays = {}
+    for name, body in re.findall(r"string\s+(\w+)\[\]\s*=\s*'\{(.*?)\};", testsvh, re.S):
+        kind = re.match(r'\s*`(\w+)', body)
+        if name == "tvpaths" or not kind or kind.group(1) not in macros:
+            continue
+        index = int(macros[kind.group(1)])
+        pathname = os.path.expandvars(tvpaths[index])
+        riscofTest = index == 1 or index == 2
+        suffix = "/ref/ref.elf.memfile" if riscofTest else ".elf.memfile"
+        arrays[name] = [os.path.normpath(os.path.join(simDir, pathname+test+suffix)) for test in re.findall(r'"([^"]*)"', body)]
+    suites = {}
+    with open(os.path.join(wallyDir, "testbench", "testbench.sv")) as f:
+        testbenchsv = f.read()
+    test = None
+    for line in testbenchsv.splitlines():
+        m = re.match(r'\s*"(\w+)"\s*:', line)
+        if m:
+            test = m.group(1)
+        elif "endcase" in line:
+            test = None
+        assignment = re.search(r'\btests\s*=\s*\{?([\w\s,]+)\}?\s*;', line)
+        if test and assignment:
+            for name in re.findall(r'\w+', assignment.group(1)):
+                suites.setdefault(test, []).extend(arrays.get(name, []))
+    return suites, arrays
+
+class ResultCache:
+    """Passing logs, stored as <key>.log in cacheDir. File hashes are remembered
+    in filehashes.json by size and modification time, so unchanged files are not
+    read again."""
+
+    def __init__(self, cacheDir):
+        self.cacheDir = cacheDir
+        os.makedirs(cacheDir, exist_ok=True)
+        self.hashPath = os.path.join(cacheDir, "filehashes.json")
+        try:
+            with open(self.hashPath) as f:
+                self.fileHashes = json.load(f)
+        except (OSError, ValueError):
+            self.fileHashes = {}
+        self.groupHashes = {}
+        self.suites = None
+
+    def fileHash(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return "missing"
+        known = self.fileHashes.get(path)
+        if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            return known[2]
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        self.fileHashes[path] = [st.st_size, st.st_mtime_ns, sha.hexdigest()]
+        return sha.hexdigest()
+
+    def hashFiles(self, group, paths):
+        """A hash of the names and contents of paths, remembered under group"""
+        if group not in self.groupHashes:
+            sha = hashlib.sha256()
+            for path in paths:
+                sha.update((os.path.relpath(path, wallyDir)+" "+self.fileHash(path)+"\n").encode())
+            self.groupHashes[group] = sha.hexdigest()
+        return self.groupHashes[group]
+
+    def rtlHash(self):
+        """A hash of the RTL in src/"""
+        return self.hashFiles("rtl", listFiles(os.path.join(wallyDir, "src"), (".sv", ".vh", ".v")))
+
+    def inputs(self, config):
+        """(group, paths) pairs for the files a TestCase depends on"""
+        groups = [("rtl", listFiles(os.path.join(wallyDir, "src"), (".sv", ".vh", ".v"))),
+                  ("testbench", listFiles(os.path.join(wallyDir, "testbench"), (".sv", ".vh")) +
+                                [os.path.join(simDir, name) for name in sorted(os.listdir(simDir)) if name.endswith(".do")])]
+        shared = listFiles(os.path.join(wallyDir, "config", "shared"), (".vh",))
+        m = docmdre.search(config.cmd)
+        if not m:
+            # not a simulation (the lints): depends on every config and the command's script
+            groups.append(("config", listFiles(os.path.join(wallyDir, "config"), (".vh",))))
+            script = config.cmd.split()[0]
+            if os.path.isfile(os.path.join(simDir, script)):
+                groups.append(("script "+script, [os.path.join(simDir, script)]))
+            return groups
+        variant, test = m.group(1), m.group(2)
+        groups.append(("config "+variant, listFiles(os.path.join(wallyDir, "config", variant), (".vh",)) + shared))
+        if self.suites is None:
+            self.suites, self.arrays = parseTestSuites()
+        if test in self.suites:
+            groups.append(("tests "+test, self.suites[test]))
+        elif test.startswith("buildroot"):
+            groups.append(("linux", listFiles(os.path.expandvars("$RISCV/linux-testvectors"), ("",))))
+        else:
+            # unknown TEST: depends on every test's memfiles
+            groups.append(("tests", sorted(set(path for paths in self.arrays.values() for path in paths))))
+        return groups
+
+    def key(self, config):
+        """The hash identifying a TestCase's result"""
+        sha = hashlib.sha256()
+        sha.update((config.cmd+"\n"+config.grepstr+"\n").encode())
+        for group, paths in self.inputs(config):
+            sha.update((group+" "+self.hashFiles(group, paths)+"\n").encode())
+        return sha.hexdigest()
+
+    def lookup(self, key):
+        """The cached log of a previous pass of the TestCase with this key, or None"""
+        path = os.path.join(self.cacheDir, key+".log")
+        return path if os.path.exists(path) else None
+
+    def store(self, key, logname):
+        """Remembers the log of a passing TestCase with this key"""
+        path = os.path.join(self.cacheDir, key+".log")
+        shutil.copyfile(logname, path+".tmp")
+        os.replace(path+".tmp", path)
+
+    def save(self):
+        with open(self.hashPath+".tmp", "w") as f:
+            json.dump(self.fileHashes, f)
+        os.replace(self.hashPath+".tmp", self.hashPath)
@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+##################################
+#
+# regressionImpact.py
+#
+# Test-impact selection for regression-wally. A coverage regression
+# (regression-wally -coverage) leaves a UCDB per test in cov/; from them this
+# records, for each test, the RTL modules it exercised and the files that
+# define them, together with a hash of every RTL, config and testbench file,
+# in logs/impact.json. regression-wally -impact then runs only the tests
+# that exercised a changed file, the tests the map knows nothing about, and a
+# random sample of the rest. A change to the testbench or the shared config
+# runs everything, and a change to a variant's config runs all of its tests.
+# So does a change to an RTL file no test is recorded as exercising: coverage
+# is only saved for the core, so the map knows nothing of the uncore, of files
+# excluded from coverage or of new files.
+#
+##################################
+import os, re, json, random, subprocess
+import regressionCache
+import regressionScheduler
+
+wallyDir = regressionCache.wallyDir
+# fraction of the unaffected tests that run anyway
+SAMPLE = 0.1
+
+instancere = re.compile(r'=== Design Unit: (?:\w+\.)?(\w+)')
+# a row of a coverage table: name, bins, hits, misses, coverage
+coveragerowre = re.compile(r'^\s+[A-Za-z][\w /-]*?\s+(\d+)\s+(\d+)\s+(\d+)\s+[\d.]+%')
+
+def moduleFiles():
+    """A dictionary of module name: the file in src/ that defines it"""
+    modules = {}
+    for path in regressionCache.listFiles(os.path.join(wallyDir, "src"), (".sv", ".v")):
+        with open(path, errors='replace') as f:
+            for name in re.findall(r'^\s*module\s+(\w+)', f.read(), re.M):
+                modules[name] = os.path.relpath(path, wallyDir)
+    return modules
+
+def coveredModules(ucdb):
+    """The design units with any coverage hits in a UCDB, from vcover's report. A design
+    unit whose report has no coverage counts counts as exercised."""
+    report = subprocess.run(["vcover", "report", "-byinstance", ucdb], capture_output=True, text=True).stdout
+    modules = set()
+    unit = None
+    hits = None
+    for line in report.splitlines() + ["=== Design Unit: end"]:
+        m = instancere.search(line)
+        if m:
+            if unit and (hits is None or hits > 0):
+                modules.add(unit)
+            unit, hits = m.group(1), None
+            continue
+        m = coveragerowre.match(line)
+        if m and unit:
+            hits = (hits or 0) + int(m.group(2))
+    return modules
+
+def trackedFiles():
+    """The files whose changes select tests: the RTL, the configs and the testbench"""
+    return (regressionCache.listFiles(os.path.join(wallyDir, "src"), (".sv", ".vh", ".v")) +
+            regressionCache.listFiles(os.path.join(wallyDir, "config"), (".vh",)) +
+            regressionCache.listFiles(os.path.join(wallyDir, "testbench"), (".sv", ".vh")))
+
+class ImpactMap:
+    """The files each test exercised, and the hashes of the tracked files when they were
+    recorded, kept in a JSON file as {"files": {path: hash}, "tests": {jobKey: [paths]}}"""
+
+    def __init__(self, path, resultCache):
+        self.path = path
+        self.resultCache = resultCache
+        try:
+            with open(path) as f:
+                self.map = json.load(f)
+        except (OSError, ValueError):
+            self.map = {"files": {}, "tests": {}}
+
+    def fileHashes(self):
+        return {os.path.relpath(path, wallyDir): self.resultCache.fileHash(path) for path in trackedFiles()}
+
+    def record(self, configs, covDir):
+        """Records the files exercised by each config with a UCDB in covDir"""
+        modules = moduleFiles()
+        for config in configs:
+            ucdb = os.path.join(covDir, regressionScheduler.jobKey(config)+".ucdb")
+            if os.path.exists(ucdb):
+                files = sorted(set(modules[name] for name in coveredModules(ucdb) if name in modules))
+                self.map["tests"][regressionScheduler.jobKey(config)] = files
+        self.map["files"] = self.fileHashes()
+
+    def changedFiles(self):
+        """The tracked files that are new, changed or gone since the map was recorded"""
+        now = self.fileHashes()
+        before = self.map["files"]
+        return sorted(path for path in set(now) | set(before) if now.get(path) != before.get(path))
+
+    def select(self, configs, sample=SAMPLE, seed=None):
+        """(selected configs, affected count, sampled count) for the changes since the map
+        was recorded. The sample of unaffected tests is drawn with seed."""
+        changed = self.changedFiles()
+        everything = not self.map["files"] or any(path.startswith("testbench/") or path.startswith("config/shared/")
+                                                  for path in changed)
+        changedConfigs = set(path.split("/")[1] for path in changed if path.startswith("config/"))
+        changedRTL = set(path for path in changed if path.startswith("src/"))
+        mapped = set(path for files in self.map["tests"].values() for path in files)
+        unmapped = sorted(changedRTL - mapped)
+        if unmapped and not everything:
+            print("Test impact: running everything, since no test is recorded as exercising %s" % ", ".join(unmapped))
+            everything = True
+        affected, rest = [], []
+        for config in configs:
+            files = self.map["tests"].get(regressionScheduler.jobKey(config))
+            if everything or files is None or config.variant in changedConfigs or changedRTL & set(files):
+                affected.append(config)
+            else:
+                rest.append(config)
+        sampled = random.Random(seed).sample(rest, round(len(rest)*sample))
+        return [config for config in configs if config in affected or config in sampled], len(affected), len(sampled)
+
+    def save(self):
+        with open(self.path+".tmp", "w") as f:
+            json.dump(self.map, f, indent=1, sort_keys=True)
+        os.replace(self.path+".tmp", self.path)
@@ -0,0 +1,265 @@
+#!/usr/bin/python3
+##################################
+#
+# regressionRemote.py
+#
+# Runs regression-wally jobs on other machines. regression-wally -remote <port>
+# becomes a coordinator that listens for workers and hands each one jobs as
+# it has free slots, longest-first; a worker runs each job with
+# regressionRunner.runJob in its own checkout and sends back the result and
+# the log. A worker that disconnects or stops sending heartbeats is dropped,
+# and the jobs it was running are queued again.
+#
+# Start a worker on each host, in the sim directory of a checkout at the same
+# version as the coordinator's:
+#   ./regressionRemote.py -connect <coordinator host>:<port> -slots <jobs>
+# The coordinator and workers must share a secret key in $WALLY_REGRESSION_KEY;
+# neither starts without one. Jobs and results are pickled, so anyone holding
+# the key can run commands on the workers and the coordinator. The coordinator
+# only listens on localhost unless regression-wally is given -bind <address>,
+# so only bind it to an interface on a trusted network.
+#
+# The coordinator gives up on the jobs still unfinished when no worker has been
+# connected for NO_WORKERS seconds, or once the run's deadline (by default, the
+# sum of the jobs' timeouts) has passed; those jobs count as not run.
+#
+# For a local test, -localworkers <n> on regression-wally starts n workers on
+# this machine to stand in for hosts, and ./regressionRemote.py -selftest runs
+# a few shell jobs through three local workers, one of which dies mid-job.
+#
+##################################
+import os, sys, time, socket, tempfile, threading
+import multiprocessing
+from multiprocessing.connection import Listener, Client, wait
+import regressionRunner
+
+# seconds between heartbeats from a worker, and the silence after which it is dropped
+HEARTBEAT = 5
+WORKER_LOST = 6*HEARTBEAT
+# times a job is queued again after its worker is lost before it counts as failed
+MAX_REQUEUES = 3
+# seconds the coordinator waits with jobs left and no workers connected before giving up
+NO_WORKERS = 10*60
+
+def authKey():
+    """The shared key from $WALLY_REGRESSION_KEY; there is no default, since a known
+    key would let anyone who can reach the port run commands"""
+    key = os.environ.get("WALLY_REGRESSION_KEY")
+    if not key:
+        sys.exit("Set $WALLY_REGRESSION_KEY to a secret shared by the regression coordinator and its workers")
+    return key.encode()
+
+class RemoteWorker:
+    """A connected worker, as seen by the coordinator"""
+    def __init__(self, conn, name, slots):
+        self.conn = conn
+        self.name = name
+        self.slots = slots
+        self.jobs = {}  # job id -> config
+        self.lastHeard = time.time()
+
+def runRemote(configs, history, port, defaultTimeout, onResult, localWorkers=0, bind="localhost", deadline=None):
+    """Run every config on remote workers listening on bind:port and return a dictionary of
+    config: (result, seconds), like regressionScheduler.runScheduled. onResult(config,
+    jobResult, timeout, log) is called with each JobResult and the bytes of its log, and its
+    return value is the config's result. A job that loses too many workers, or is unfinished
+    after deadline seconds or NO_WORKERS seconds without a worker, has the result None."""
+    def expected(config):
+        runtime = history.runtime(config)
+        return float('inf') if runtime is None else runtime
+    pending = sorted(configs, key=expected, reverse=True)
+    timeouts = {id(config): history.timeout(config, defaultTimeout) for config in configs}
+    requeues = {id(config): 0 for config in configs}
+    results = {}
+    workers = []
+    newConns = []
+    lock = threading.Lock()
+
+    if deadline is None:
+        deadline = sum(timeouts.values())
+    endTime = time.time() + deadline
+    lastWorker = time.time()
+
+    listener = Listener((bind, port), authkey=authKey())
+    def accept():
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                return # the listener was closed
+            except Exception:
+                continue # a client with the wrong key
+            with lock:
+                newConns.append(conn)
+    threading.Thread(target=accept, daemon=True).start()
+    print("Waiting for regression workers on %s:%d" % (bind, port))
+    local = [startLocalWorker("localhost:%d" % port, name="local%d" % i) for i in range(localWorkers)]
+
+    def dropWorker(worker, why):
+        print("Lost regression worker %s (%s); requeueing %d jobs" % (worker.name, why, len(worker.jobs)))
+        workers.remove(worker)
+        worker.conn.close()
+        for jobId, config in worker.jobs.items():
+            requeues[jobId] += 1
+            if requeues[jobId] > MAX_REQUEUES:
+                results[config] = (None, 0)
+                print("%s_%s: Failed - lost %d workers" % (config.variant, config.name, requeues[jobId]))
+            else:
+                pending.append(config)
+        pending.sort(key=expected, reverse=True)
+
+    while len(results) < len(configs):
+        with lock:
+            conns, newConns[:] = list(newConns), []
+        for conn in conns:
+            try:
+                hello = conn.recv()
+                workers.append(RemoteWorker(conn, hello[1], hello[2]))
+                print("Regression worker %s connected with %d slots" % (hello[1], hello[2]))
+            except (EOFError, OSError):
+                conn.close()
+        # hand out jobs, longest first, to the workers with free slots
+        for worker in list(workers):
+            while pending and len(worker.jobs) < worker.slots:
+                config = pending.pop(0)
+                try:
+                    worker.conn.send(("job", id(config), config.cmd, config.grepstr, timeouts[id(config)]))
+                except OSError:
+                    pending.insert(0, config)
+                    dropWorker(worker, "send failed")
+                    break
+                worker.jobs[id(config)] = config
+        ready = wait([worker.conn for worker in workers], timeout=1)
+        now = time.time()
+        for worker in list(workers):
+            if worker.conn in ready:
+                try:
+                    message = worker.conn.recv()
+                except (EOFError, OSError):
+                    dropWorker(worker, "disconnected")
+                    continue
+                worker.lastHeard = now
+                if message[0] == "result":
+                    jobId, jobResult, log = message[1], regressionRunner.JobResult(*message[2]), message[3]
+                    config = worker.jobs.pop(jobId, None)
+                    if config is not None and config not in results:
+                        results[config] = (onResult(config, jobResult, timeouts[jobId], log), jobResult.seconds)
+            elif now - worker.lastHeard > WORKER_LOST:
+                dropWorker(worker, "no heartbeat")
+        if workers:
+            lastWorker = now
+        if now > endTime or now - lastWorker > NO_WORKERS:
+            why = "deadline of %d seconds passed" % deadline if now > endTime else "no workers for %d seconds" % NO_WORKERS
+            unfinished = [config for config in configs if config not in results]
+            print("Giving up on %d unfinished regression jobs: %s" % (len(unfinished), why))
+            for config in unfinished:
+                results[config] = (None, 0)
+    for worker in workers:
+        try:
+            worker.conn.send(("stop",))
+        except OSError:
+            pass
+        worker.conn.close()
+    listener.close()
+    for process in local:
+        process.join(timeout=HEARTBEAT)
+    return results
+
+def runWorker(address, slots, name=None, workDir=None):
+    """Connect to the coordinator at address (host:port) and run the jobs it sends,
+    up to slots at a time, until it says to stop or goes away"""
+    host, port = address.rsplit(":", 1)
+    name = name or socket.gethostname()+":"+str(os.getpid())
+    if workDir:
+        os.chdir(workDir)
+    for attempt in range(30):
+        try:
+            conn = Client((host, int(port)), authkey=authKey())
+            break
+        except ConnectionRefusedError:
+            time.sleep(1)
+    else:
+        sys.exit("Could not connect to the regression coordinator at "+address)
+    sendLock = threading.Lock()
+    def send(message):
+        with sendLock:
+            conn.send(message)
+    send(("hello", name, slots))
+
+    def runOne(jobId, cmd, grepstr, timeout):
+        fd, logname = tempfile.mkstemp(prefix="regression-", suffix=".log")
+        os.close(fd)
+        try:
+            result = regressionRunner.runJob(cmd, logname, grepstr, timeout)
+            with open(logname, "rb") as f:
+                log = f.read()
+        finally:
+            os.remove(logname)
+        try:
+            send(("result", jobId, tuple(result), log))
+        except OSError:
+            pass
+
+    while True:
+        try:
+            if wait([conn], timeout=HEARTBEAT):
+                message = conn.recv()
+                if message[0] == "stop":
+                    break
+                threading.Thread(target=runOne, args=message[1:], daemon=True).start()
+            send(("heartbeat",))
+        except (EOFError, OSError):
+            break
+    conn.close()
+
+def startLocalWorker(address, slots=2, name=None):
+    """Start a worker process on this machine, standing in for a remote host. It is
+    spawned rather than forked, since the coordinator has threads running."""
+    process = multiprocessing.get_context("spawn").Process(target=runWorker, args=(address, slots, name))
+    process.daemon = True
+    process.start()
+    return process
+
+def dyingWorker(port):
+    """A worker for selftest that takes one job and exits without answering"""
+    for attempt in range(30):
+        try:
+            conn = Client(("localhost", port), authkey=authKey())
+            break
+        except ConnectionRefusedError:
+            time.sleep(0.2)
+    conn.send(("hello", "dying", 1))
+    conn.recv()
+    conn.close()
+
+def selftest():
+    """Run shell jobs through three local workers, one of which dies mid-job,
+    and check every job comes back with the right status"""
+    import regressionScheduler, secrets
+    os.environ.setdefault("WALLY_REGRESSION_KEY", secrets.token_hex(16))
+    from collections import namedtuple
+    TestCase = namedtuple("TestCase", ['name', 'variant', 'cmd', 'grepstr', 'cpus', 'mem'], defaults=[1, 2])
+    configs = [TestCase("pass%d" % i, "selftest", "sleep 0.%d; echo All tests ran without failures" % i, "All tests ran") for i in range(8)]
+    configs.append(TestCase("fail", "selftest", "echo FAILURE: Watch Dog Time Out; sleep 30", "All tests ran"))
+    history = regressionScheduler.JobHistory(os.devnull)
+    port = 40000 + os.getpid() % 20000
+    victim = multiprocessing.get_context("spawn").Process(target=dyingWorker, args=(port,), daemon=True)
+    victim.start()
+    logs = {}
+    def onResult(config, result, timeout, log):
+        logs[config] = (result.status, log)
+        return result
+    results = runRemote(configs, history, port, 60, onResult, localWorkers=2)
+    ok = all(results[config][0].status == ("fail" if config.name == "fail" else "pass") for config in configs)
+    ok = ok and all(b"FAILURE" in logs[config][1] if config.name == "fail" else b"All tests ran" in logs[config][1] for config in configs)
+    print("selftest", "passed" if ok else "FAILED", {config.name: logs[config][0] for config in configs})
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    if '-selftest' in sys.argv:
+        exit(selftest())
+    if '-connect' not in sys.argv:
+        sys.exit("usage: regressionRemote.py -connect <host>:<port> [-slots <n>] | -selftest")
+    address = sys.argv[sys.argv.index('-connect')+1]
+    slots = int(sys.argv[sys.argv.index('-slots')+1]) if '-slots' in sys.argv else os.cpu_count()
+    runWorker(address, slots, workDir=os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+##################################
+#
+# regressionResults.py
+#
+# Machine-readable results of regression-wally. Each regression adds a row
+# to the runs table of an SQLite database, logs/regression-results.db, and a
+# row per TestCase to its jobs table, and writes the same records with a
+# summary of the run to logs/regression-results.json. A job record has the
+# job's variant, name and command, its start and end times and wall time, the
+# peak RSS of the simulator, the instructions it simulated, and its status
+# with the line that decided it, and the simulator's throughput in thousands
+# of instructions (KIPS) and in cycles per second. A run records the git
+# commit and a hash of the RTL it ran on, so runtimes can be compared across
+# RTL changes:
+#   ./regressionResults.py          jobs that got slower with the latest RTL
+#   ./regressionResults.py -job <variant>_<name>   the runtime and throughput history of a job
+#
+# A job whose throughput falls to THROUGHPUT_DROP of its median over its last
+# THROUGHPUT_RUNS passing runs is a throughput regression, which regression-wally
+# counts as a failure.
+#
+##################################
+import os, sys, json, time, sqlite3, subprocess, statistics
+import regressionCache
+
+# a passing job is slower than usual when it takes SLOWDOWN times its expected
+# runtime, and at least SLOWDOWN_SECONDS longer
+SLOWDOWN = 1.5
+SLOWDOWN_SECONDS = 30
+# a job's throughput has regressed when it is below THROUGHPUT_DROP times its median
+# over its last THROUGHPUT_RUNS passing runs; jobs shorter than THROUGHPUT_SECONDS
+# are dominated by compiling and loading, and are not checked
+THROUGHPUT_DROP = 0.67
+THROUGHPUT_RUNS = 5
+THROUGHPUT_SECONDS = 60
+
+SCHEMA = """
+create table if not exists runs (id integer primary key, start real, end real, seconds real,
+    gitcommit text, rtl text, args text, jobs integer, passed integer, failed integer,
+    cached integer, lowerbound real);
+create table if not exists jobs (run integer references runs(id), variant text, name text,
+    cmd text, start real, end real, seconds real, maxrss integer, instructions integer,
+    tests integer, status text, line text, cached integer, kips real, cycles integer, cps real);
+create index if not exists jobsbyname on jobs (variant, name);
+"""
+JOBFIELDS = ["variant", "name", "cmd", "start", "end", "seconds", "maxrss", "instructions",
+             "tests", "status", "line", "cached", "kips", "cycles", "cps"]
+# columns added to the jobs table since it was first created
+NEWJOBCOLUMNS = {"kips": "real", "cycles": "integer", "cps": "real"}
+
+def gitCommit():
+    """The commit the tree is at, or "" if git cannot say"""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=regressionCache.wallyDir,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+def jobRecord(config, result, cached=False):
+    """The record of a TestCase's regressionRunner.JobResult, as a dictionary. A job whose
+    runner failed (result None) has the status "error"; a cached pass has no times. regression-wally
+    changes the status of a pass that is a throughput regression to "slow"."""
+    record = {"variant": config.variant, "name": config.name, "cmd": config.cmd,
+              "start": None, "end": None, "seconds": 0, "maxrss": None, "instructions": None,
+              "tests": None, "status": "error", "line": "", "cached": cached, "kips": None, "cycles": None, "cps": None}
+    if cached:
+        record["status"] = "pass"
+    elif result is not None:
+        record.update(start=result.start, end=result.end, seconds=result.seconds, maxrss=result.maxrss,
+                      instructions=result.instructions, tests=result.tests, status=result.status, line=result.line,
+                      kips=result.kips, cycles=result.cycles)
+        if result.cycles and result.seconds > 0:
+            record["cps"] = round(result.cycles/result.seconds, 1)
+    return record
+
+def rate(pairs):
+    """The total of the counts of (count, seconds) pairs per total second"""
+    seconds = sum(seconds for count, seconds in pairs)
+    return round(sum(count for count, seconds in pairs)/seconds, 2) if seconds else 0
+
+def summarize(records, start, end, lowerBound, rtl):
+    """The rolled-up summary of a run's job records"""
+    ran = [record for record in records if not record["cached"]]
+    passed = [record for record in ran if record["status"] == "pass"]
+    rss = [record["maxrss"] for record in ran if record["maxrss"]]
+    return {"start": start, "end": end, "seconds": round(end - start, 1), "gitcommit": gitCommit(), "rtl": rtl,
+            "args": " ".join(sys.argv[1:]), "jobs": len(records), "passed": len(passed),
+            "failed": len(ran) - len(passed), "cached": len(records) - len(ran),
+            "statuses": {status: sum(record["status"] == status for record in ran) for status in ("pass", "fail", "timeout", "error", "slow")},
+            "jobseconds": round(sum(record["seconds"] for record in ran), 1),
+            "instructions": sum(record["instructions"] or 0 for record in ran),
+            "kips": rate([(record["kips"]*record["seconds"], record["seconds"]) for record in ran if record["kips"]]),
+            "cycles": sum(record["cycles"] or 0 for record in ran),
+            "cps": rate([(record["cycles"], record["seconds"]) for record in ran if record["cps"]]),
+            "maxrss": max(rss, default=0), "lowerbound": round(lowerBound, 1)}
+
+def slowdowns(records, history):
+    """(record, expected seconds) for the passing jobs, given as a dictionary of config: record,
+    that were slower than their regressionScheduler.JobHistory expects. Call it before the
+    run is recorded in history."""
+    slow = []
+    for config, record in records.items():
+        if record["status"] != "pass" or record["cached"]:
+            continue
+        expected = history.runtime(config)
+        if expected is None:
+            continue
+        if record["seconds"] > SLOWDOWN*expected and record["seconds"] - expected > SLOWDOWN_SECONDS:
+            slow.append((record, expected))
+    return slow
+
+def writeJSON(path, summary, records):
+    with open(path+".tmp", "w") as f:
+        json.dump({"summary": summary, "jobs": records}, f, indent=1)
+    os.replace(path+".tmp", path)
+
+class ResultsDB:
+    """The database of every run's summary and job records"""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        columns = [row[1] for row in self.db.execute("pragma table_info(jobs)")]
+        for column, kind in NEWJOBCOLUMNS.items():
+            if column not in columns:
+                self.db.execute("alter table jobs add column %s %s" % (column, kind))
+
+    def addRun(self, summary, records):
+        """Stores a run and its job records, and returns the run's id"""
+        with self.db:
+            cursor = self.db.execute("insert into runs (start, end, seconds, gitcommit, rtl, args, jobs, passed, failed, cached, lowerbound) "
+                                     "values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                     [summary[field] for field in ("start", "end", "seconds", "gitcommit", "rtl", "args", "jobs",
+                                                                   "passed", "failed", "cached", "lowerbound")])
+            run = cursor.lastrowid
+            self.db.executemany("insert into jobs (run, %s) values (?, %s)" % (", ".join(JOBFIELDS), ", ".join("?"*len(JOBFIELDS))),
+                                [[run] + [record[field] for field in JOBFIELDS] for record in records])
+        return run
+
+    def jobHistory(self, job):
+        """(run, start, rtl, gitcommit, seconds, maxrss, kips, cps, status) for every run of a job, oldest first"""
+        return self.db.execute("select runs.id, jobs.start, runs.rtl, runs.gitcommit, jobs.seconds, jobs.maxrss, jobs.kips, jobs.cps, jobs.status "
+                               "from jobs join runs on jobs.run = runs.id where jobs.variant || '_' || jobs.name = ? "
+                               "and not jobs.cached order by runs.id", (job,)).fetchall()
+
+    def throughputDrops(self, records):
+        """(record, measure, value, usual value) for the passing jobs, given as a dictionary of
+        config: record, whose KIPS or cycles per second fell to THROUGHPUT_DROP of their median
+        over their last THROUGHPUT_RUNS passing runs. Call it before the run is added."""
+        drops = []
+        for config, record in records.items():
+            if record["status"] != "pass" or record["cached"] or record["seconds"] < THROUGHPUT_SECONDS:
+                continue
+            for measure in ("kips", "cps"):
+                if not record[measure]:
+                    continue
+                previous = [row[0] for row in self.db.execute("select %s from jobs where variant = ? and name = ? and status = 'pass' "
+                                                              "and %s is not null order by run desc limit ?" % (measure, measure),
+                                                              (config.variant, config.name, THROUGHPUT_RUNS))]
+                if previous and record[measure] < THROUGHPUT_DROP*statistics.median(previous):
+                    drops.append((record, measure, record[measure], statistics.median(previous)))
+        return drops
+
+    def slower(self):
+        """(job, seconds before, seconds after, RTL before, RTL after) for the jobs whose median passing
+        runtime on the newest RTL is SLOWDOWN times that on the RTL before it"""
+        rows = self.db.execute("select jobs.variant || '_' || jobs.name, runs.rtl, jobs.seconds from jobs join runs on jobs.run = runs.id "
+                               "where jobs.status = 'pass' and not jobs.cached order by runs.id").fetchall()
+        rtls = []  # in the order they were last run
+        for job, rtl, seconds in rows:
+            if rtl in rtls:
+                rtls.remove(rtl)
+            rtls.append(rtl)
+        if len(rtls) < 2:
+            return []
+        before, after = rtls[-2], rtls[-1]
+        runtimes = {}
+        for job, rtl, seconds in rows:
+            if rtl == before or rtl == after:
+                runtimes.setdefault(job, {}).setdefault(rtl, []).append(seconds)
+        slow = []
+        for job, byRtl in sorted(runtimes.items()):
+            if before in byRtl and after in byRtl:
+                old, new = statistics.median(byRtl[before]), statistics.median(byRtl[after])
+                if new > SLOWDOWN*old and new - old > SLOWDOWN_SECONDS:
+                    slow.append((job, old, new, before, after))
+        return slow
+
+if __name__ == '__main__':
+    db = ResultsDB(os.path.join(regressionCache.simDir, "logs", "regression-results.db"))
+    if '-job' in sys.argv:
+        job = sys.argv[sys.argv.index('-job')+1]
+        print("%6s %-20s %-12s %-10s %10s %10s %10s %12s  %s" % ("Run", "Started", "RTL", "Commit", "Seconds", "RSS (MB)",
+              "KIPS", "Cycles/s", "Status"))
+        for run, start, rtl, commit, seconds, maxrss, kips, cps, status in db.jobHistory(job):
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start)) if start else "-"
+            print("%6d %-20s %-12s %-10s %10.1f %10s %10s %12s  %s" % (run, started, rtl[:12], commit[:10], seconds,
+                  "%.0f" % (maxrss/1024) if maxrss else "-", "%.1f" % kips if kips else "-", "%.0f" % cps if cps else "-", status))
+    else:
+        slow = db.slower()
+        for job, old, new, before, after in slow:
+            print("%s: %.1f s -> %.1f s (RTL %s -> %s)" % (job, old, new, before[:12], after[:12]))
+        if not slow:
+            print("No job got slower with the latest RTL")
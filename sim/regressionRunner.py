@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+##################################
+#
+# regressionRunner.py
+#
+# Runs one regression job, scanning its output as it streams: the output
+# is copied to the job's log file, the job is killed as soon as a failure
+# marker appears (or its timeout passes), and its progress is kept up to
+# date in a small JSON status file. The result records the job's start and
+# end times, the peak RSS of its largest process (from wait4, unless the job
+# was killed), and the simulator's throughput: the instructions per second
+# between the first and last "Reached" lines of the Linux testbenches, and the
+# cycles simulated, from the simulation time of the simulator's final Time: line.
+#
+##################################
+import os, re, json, time, signal, selectors, subprocess
+from collections import namedtuple
+
+# output that means the job has failed, whatever else it prints
+FAIL_MARKERS = [b"FAILURE", b"Watch Dog Time Out"]
+# progress lines of the Linux testbenches and of testbench.sv
+reachedre = re.compile(rb'Reached\s+(\d+) instructions')
+processedre = re.compile(rb'processed (\d+) instructions')
+# the simulation time vsim prints when it stops, and the testbench clock period in ns
+simtimere = re.compile(rb'Time: (\d+) (fs|ps|ns|us|ms)\b')
+TIMEUNITS_NS = {b"fs": 1e-6, b"ps": 1e-3, b"ns": 1, b"us": 1e3, b"ms": 1e6}
+CLOCK_PERIOD_NS = 10
+memfilere = re.compile(rb'Read memfile ')
+# seconds between updates of a job's status file
+STATUS_INTERVAL = 2
+
+JobResult = namedtuple("JobResult", ['status', 'line', 'instructions', 'tests', 'seconds', 'start', 'end', 'maxrss',
+                                     'kips', 'cycles'])
+# status:       "pass", "fail" or "timeout"
+# line:         the output line that decided the status (the line matching the
+#               pass pattern, or the failure marker), or "" if there was none
+# instructions: the last instruction count the job reported
+# tests:        the number of test programs the job started
+# seconds:      the wall time of the job
+# start, end:   the times the job started and finished (seconds since the epoch)
+# maxrss:       the peak resident set size, in KB, of the largest process of the
+#               job that was waited for (normally the simulator), or None if the
+#               job was killed, since its killed processes are never waited for
+# kips:         thousands of instructions simulated per second of wall time, between
+#               the first and last instruction counts the job reported if there were
+#               two, else over the whole job; None if it reported no instructions
+# cycles:       the testbench clock cycles simulated, or None if the simulator did
+#               not report its simulation time
+
+def writeStatus(statusPath, status):
+    if statusPath:
+        with open(statusPath+".tmp", "w") as f:
+            json.dump(status, f)
+        os.replace(statusPath+".tmp", statusPath)
+
+def throughput(instructions, seconds, firstReached, lastReached):
+    """Thousands of instructions simulated per second, or None. firstReached and lastReached
+    are the (instructions, time) of the first and last progress lines, which exclude the
+    compile and load time of the simulator when they differ."""
+    if firstReached and lastReached[1] > firstReached[1]:
+        return round((lastReached[0] - firstReached[0])/(lastReached[1] - firstReached[1])/1000, 2)
+    if instructions and seconds > 0:
+        return round(instructions/seconds/1000, 2)
+    return None
+
+def runJob(cmd, logname, passPattern, timeout, statusPath=None, echo=False):
+    """Run the shell command cmd, writing its output to logname, and return a JobResult.
+    The job passes if a line of its output matches the regular expression passPattern
+    and it prints none of FAIL_MARKERS before it exits. It runs in a process group of
+    its own, which is killed as soon as a failure marker is seen or timeout seconds pass.
+    With echo, the output is also copied to this process's standard output."""
+    startTime = time.time()
+    passre = re.compile(passPattern.encode())
+    proc = subprocess.Popen(cmd, shell=True, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, start_new_session=True)
+    status = {"state": "running", "pid": proc.pid, "start": startTime, "elapsed": 0,
+              "instructions": 0, "tests": 0, "line": ""}
+    result = None
+    passLine = None
+    firstReached = lastReached = None
+    simtime = None
+    lastStatus = 0
+    pending = b""
+    selector = selectors.DefaultSelector()
+    selector.register(proc.stdout, selectors.EVENT_READ)
+    with open(logname, "wb") as log:
+        while result is None:
+            now = time.time()
+            if now - startTime > timeout:
+                result = "timeout"
+                break
+            if now - lastStatus >= STATUS_INTERVAL:
+                status["elapsed"] = round(now - startTime, 1)
+                writeStatus(statusPath, status)
+                lastStatus = now
+            if not selector.select(timeout=min(STATUS_INTERVAL, max(timeout - (now - startTime), 0))):
+                continue
+            data = os.read(proc.stdout.fileno(), 1 << 16)
+            now = time.time()
+            if not data:
+                break
+            log.write(data)
+            if echo:
+                os.write(1, data)
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                if any(marker in line for marker in FAIL_MARKERS):
+                    result = "fail"
+                    status["line"] = line.decode(errors='replace').strip()
+                    break
+                m = reachedre.search(line)
+                if m:
+                    status["instructions"] = int(m.group(1))
+                    lastReached = (status["instructions"], now)
+                    firstReached = firstReached or lastReached
+                m = processedre.search(line) or simtimere.search(line)
+                if m and m.re is processedre:
+                    status["instructions"] = int(m.group(1))
+                elif m:
+                    simtime = max(simtime or 0, int(m.group(1))*TIMEUNITS_NS[m.group(2)])
+                if memfilere.search(line):
+                    status["tests"] += 1
+                if passLine is None and passre.search(line):
+                    passLine = line.decode(errors='replace').strip()
+        if pending and result is None:
+            if any(marker in pending for marker in FAIL_MARKERS):
+                result = "fail"
+                status["line"] = pending.decode(errors='replace').strip()
+            elif passLine is None and passre.search(pending):
+                passLine = pending.decode(errors='replace').strip()
+    selector.close()
+    killed = result is not None
+    if killed:
+        # stop the whole job now, not just the shell
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    proc.stdout.close()
+    # wait4 rather than wait, for the peak RSS of the shell and the processes it waited for
+    pid, waitStatus, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(waitStatus)
+    if result is None:
+        result = "pass" if passLine is not None else "fail"
+        if passLine is not None:
+            status["line"] = passLine
+    status["state"] = result
+    endTime = time.time()
+    status["elapsed"] = round(endTime - startTime, 1)
+    status["end"] = endTime
+    status["maxrss"] = None if killed else rusage.ru_maxrss
+    status["kips"] = throughput(status["instructions"], endTime - startTime, firstReached, lastReached)
+    status["cycles"] = None if simtime is None else int(simtime/CLOCK_PERIOD_NS)
+    writeStatus(statusPath, status)
+    return JobResult(result, status["line"], status["instructions"], status["tests"], status["elapsed"],
+                     startTime, endTime, status["maxrss"], status["kips"], status["cycles"])
@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+##################################
+#
+# regressionScheduler.py
+#
+# Runs the TestCases of regression-wally longest-first, packed by their CPU
+# and memory cost under a limit on concurrent simulator licenses, with
+# per-job timeouts derived from the runtimes of previous regressions.
+#
+##################################
+import os, json, time, queue, hashlib
+from multiprocessing import Pool
+
+# a job's timeout is this many times its longest recent passing runtime,
+# but at least MIN_TIMEOUT seconds
+TIMEOUT_SCALE = 3
+MIN_TIMEOUT = 120
+# passing runtimes remembered per job
+HISTORY_RUNS = 10
+
+def jobKey(config):
+    """The name a TestCase is known by in the logs"""
+    return config.variant+"_"+config.name
+
+def historyKey(config):
+    """The name a TestCase is known by in the history: its jobKey and a hash of its command,
+    so that runs of a different kind, such as -coverage or -fp runs, have their own runtimes"""
+    return jobKey(config)+"_"+hashlib.sha1(config.cmd.encode()).hexdigest()[:8]
+
+class JobHistory:
+    """Runtimes (in seconds) of the passing runs of each job in previous regressions,
+    kept in a JSON file as {historyKey: {"runtimes": [...]}}, newest last"""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.jobs = json.load(f)
+        except (OSError, ValueError):
+            self.jobs = {}
+
+    def runtimes(self, config):
+        return self.jobs.get(historyKey(config), {}).get("runtimes", [])
+
+    def runtime(self, config):
+        """The expected runtime of a job: the median of its recent runs, or None if it has never passed"""
+        runtimes = sorted(self.runtimes(config))
+        return runtimes[len(runtimes)//2] if runtimes else None
+
+    def timeout(self, config, default):
+        """The timeout for a job, from its history, or default if it has none"""
+        runtimes = self.runtimes(config)
+        if not runtimes:
+            return default
+        return max(TIMEOUT_SCALE*max(runtimes), MIN_TIMEOUT)
+
+    def record(self, config, seconds):
+        job = self.jobs.setdefault(historyKey(config), {})
+        job["runtimes"] = (job.get("runtimes", []) + [round(seconds, 1)])[-HISTORY_RUNS:]
+
+    def save(self):
+        tmpPath = self.path+".tmp"
+        with open(tmpPath, "w") as f:
+            json.dump(self.jobs, f, indent=1, sort_keys=True)
+        os.replace(tmpPath, self.path)
+
+def totalMemoryGB():
+    """The physical memory of this machine in GB"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE')*os.sysconf('SC_PHYS_PAGES')/2**30
+    except (ValueError, OSError):
+        return float('inf')
+
+def runScheduled(configs, runJob, history, slots, cpus, memGB, defaultTimeout):
+    """Run runJob(config, timeout) for every config in a pool of slots worker processes
+    and return a dictionary of config: (result, seconds), where result is what runJob
+    returned, or None if it raised an exception.
+
+    Jobs are started longest expected runtime first; jobs that have never passed
+    count as the longest, since nothing bounds them. A job only starts while the
+    CPU (config.cpus) and memory (config.mem, in GB) costs of the running jobs
+    leave room for it, so a shorter job that fits may start ahead of a longer one
+    that does not (but a job too large for the machine still runs, alone)."""
+    def expected(config):
+        runtime = history.runtime(config)
+        return float('inf') if runtime is None else runtime
+    pending = sorted(configs, key=expected, reverse=True)
+    done = queue.Queue()
+    running = {}
+    results = {}
+    usedCpus = usedMem = 0
+    with Pool(processes=max(min(slots, len(configs)), 1)) as pool:
+        while pending or running:
+            for config in list(pending):
+                if len(running) >= slots:
+                    break
+                fits = usedCpus+config.cpus <= cpus and usedMem+config.mem <= memGB
+                if fits or not running:
+                    pending.remove(config)
+                    timeout = history.timeout(config, defaultTimeout)
+                    running[config] = time.time()
+                    usedCpus += config.cpus
+                    usedMem += config.mem
+                    pool.apply_async(runJob, (config, timeout),
+                                     callback=lambda result, config=config: done.put((config, result)),
+                                     error_callback=lambda error, config=config: done.put((config, None)))
+            config, result = done.get()
+            seconds = time.time() - running.pop(config)
+            usedCpus -= config.cpus
+            usedMem -= config.mem
+            results[config] = (result, seconds)
+    return results
+
+def lowerBound(results, slots, cpus):
+    """The critical-path lower bound on the wall time of a regression with these
+    job runtimes: the longest job, or all the work spread over every slot"""
+    seconds = [seconds for result, seconds in results.values()]
+    if not seconds:
+        return 0
+    return max(max(seconds), sum(seconds)/max(min(slots, cpus), 1))
@@ -35,6 +35,10 @@ import argparse
 # Add -p or --perf to report the hit/miss ratio. 
 # Add -d or --dist to report the distribution of loads, stores, and atomic ops.
 # These distributions may not add up to 100; this is because of flushes or invalidations.
+# Add -s or --sweep followed by geometries (L,W,A,T) to also evaluate those geometries
+# against each log in a single pass, e.g. -s 128,4,56,43 64,8,56,44.
+# Add --l2 followed by a geometry (L,W,A,T) to also run both logs through the L1s
+# and a shared L2 of that geometry (see CacheHier.py), e.g. --l2 512,8,56,41.
 
 class bcolors:
     HEADER = '\033[95m'
@@ -60,6 +64,8 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Runs the cache simulator on all rv64gc test suites")
     parser.add_argument('-p', "--perf", action='store_true', help="Report hit/miss ratio")
     parser.add_argument('-d', "--dist", action='store_true', help="Report distribution of operations")
+    parser.add_argument('-s', "--sweep", nargs='+', default=[], help="Cache geometries to sweep over each log", metavar="L,W,A,T")
+    parser.add_argument("--l2", help="Shared L2 geometry to simulate behind both L1s", metavar="L,W,A,T")
 
     args = parser.parse_args()
 
@@ -70,6 +76,8 @@ if __name__ == '__main__':
         cachecmd += " -p"
     if args.dist:
         cachecmd += " -d"
+    sweepcmd = "CacheSim.py 64 4 56 44 -f {} -s " + " ".join(args.sweep)
+    hiercmd = "CacheHier.py -i ICache.log -d DCache.log --l2 {}"
     
     for test in tests64gc:
         print(f"{bcolors.HEADER}Commencing test", test+f":{bcolors.ENDC}")
@@ -77,4 +85,10 @@ if __name__ == '__main__':
         for cache in cachetypes:
             print(f"{bcolors.OKCYAN}Running the", cache, f"simulator.{bcolors.ENDC}")
             os.system(cachecmd.format(cache+".log"))
+            if args.sweep:
+                print(f"{bcolors.OKCYAN}Sweeping the", cache, f"geometries.{bcolors.ENDC}")
+                os.system(sweepcmd.format(cache+".log"))
+        if args.l2:
+            print(f"{bcolors.OKCYAN}Running the L1s with a shared L2.{bcolors.ENDC}")
+            os.system(hiercmd.format(args.l2))
         print()
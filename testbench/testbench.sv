@@ -28,8 +28,13 @@
 `include "wally-config.vh"
 `include "tests.vh"
 
+// PrintHPMCounters and BPRED_LOGGER can also be set with +define+ on the vlog command line
+`ifndef PrintHPMCounters
 `define PrintHPMCounters 0
+`endif
+`ifndef BPRED_LOGGER
 `define BPRED_LOGGER 0
+`endif
 `define I_CACHE_ADDR_LOGGER 0
 `define D_CACHE_ADDR_LOGGER 0
 
@@ -634,7 +639,7 @@ module testbench;
 
   if (`BPRED_SUPPORTED) begin : BranchLogger
     if (`BPRED_LOGGER) begin
-      string direction;
+      string direction, cficlass;
       int    file;
       logic  PCSrcM;
       string LogFile;
@@ -649,9 +654,12 @@ module testbench;
       always @(posedge clk) begin
         if(resetEdge) $fwrite(file, "TRAIN\n");
         if(StartSample) $fwrite(file, "BEGIN %s\n", memfilename);
-        if(dut.core.ifu.InstrClassM[0] & ~dut.core.StallW & ~dut.core.FlushW & dut.core.InstrValidM) begin
+        // one record per control flow instruction: PC, taken, computed target and class
+        // (branch, jump, call or return), for bin/BranchSim.py and bin/FrontEndSim.py
+        if((|dut.core.ifu.InstrClassM) & ~dut.core.StallW & ~dut.core.FlushW & dut.core.InstrValidM) begin
           direction = PCSrcM ? "t" : "n";
-          $fwrite(file, "%h %s\n", dut.core.PCM, direction);
+          cficlass = dut.core.ifu.InstrClassM[3] ? "c" : dut.core.ifu.InstrClassM[2] ? "r" : dut.core.ifu.InstrClassM[1] ? "j" : "b";
+          $fwrite(file, "%h %s %h %s\n", dut.core.PCM, direction, dut.core.IEUAdrM, cficlass);
         end
         if(EndSample) $fwrite(file, "END %s\n", memfilename);
       end
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+###########################################
+## BranchSimTest.py
+##
+## Created: 17 October 2026
+## Modified: 17 October 2026
+##
+## Purpose: Confirm that the branch direction predictor simulator behaves as expected.
+##
+## A component of the CORE-V-WALLY configurable RISC-V project.
+##
+## Copyright (C) 2021-23 Harvey Mudd College & Oklahoma State University
+##
+## SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+##
+## Licensed under the Solderpad Hardware License v 2.1 (the “License”); you may not use this file
+## except in compliance with the License, or, at your option, the Apache License version 2.0. You
+## may obtain a copy of the License at
+##
+## https:##solderpad.org/licenses/SHL-2.1/
+##
+## Unless required by applicable law or agreed to in writing, any work distributed under the
+## License is distributed on an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+## either express or implied. See the License for the specific language governing permissions
+## and limitations under the License.
+################################################################################################
+
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.expanduser("~/cvw/bin"))
+import BranchSim as bs
+
+# One TRAIN segment. The branch at 80000100 indexes entry 0 of every PHT with 2**6
+# entries. The first one comes before BEGIN, so only the C models count it, and the
+# last one comes after END, so nothing does. The jump is not a conditional branch,
+# so the predictors neither see it nor put it in their history.
+LOG = """TRAIN
+80000100 t 80000200 b
+BEGIN bench.elf.memfile
+80000100 t 80000200 b
+80000100 t 80000200 b
+80000180 t 80000300 j
+80000100 t 80000200 b
+80000100 n 80000104 b
+END bench.elf.memfile
+80000100 n 80000104 b
+"""
+
+def check(logpath):
+    results = bs.simulate([logpath], ['twobit', 'twobitCModel', 'gshare'], [6])
+    assert ([label for label, counts in results] == ['bench.elf.memfile'])
+    counts = results[0][1]
+
+    #twobit starts at 0: the branch before BEGIN moves it to 1, then n(miss) t t n(miss)
+    assert (counts[('twobit', 6)] == (4, 2))
+    #twobitCModel starts at 2 and counts from TRAIN to END: t t t t then n(miss)
+    assert (counts[('twobitCModel', 6)] == (5, 1))
+    #gshare: every taken branch shifts the history, so each indexes a fresh entry
+    #still at 0 and misses, until the not taken one, which is predicted right
+    assert (counts[('gshare', 6)] == (4, 3))
+
+    summary = bs.summarize(results, ['twobit', 'twobitCModel', 'gshare'], [6])
+    assert ({name: round(rate, 9) for name, rate in summary.items()} == {'twobit6': 50.0, 'twobitCModel6': 20.0, 'gshare6': 75.0})
+
+if __name__ == "__main__":
+    assert (bs.reportname('gshare_basic', 10) == 'gshareBasic10')
+
+    #the RTL folds PC[1] into the top bit of the index; the C model does not
+    assert (bs.phtindex('twobit', 6, 0x80000102, 0) == 0x20)
+    assert (bs.phtindex('twobitCModel', 6, 0x80000102, 0) == 0)
+    assert (bs.phtindex('gshare', 6, 0x80000100, 0x21) == 0x21)
+    assert (bs.phtindex('global', 6, 0x80000104, 0x21) == 0x21)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logpath = os.path.join(tmpdir, "branch_gshare6.log")
+        with open(logpath, "w") as f:
+            f.write(LOG)
+        #the NumPy and the branch at a time simulations give the same counts
+        check(logpath)
+        if bs.np is not None:
+            bs.np = None
+            check(logpath)
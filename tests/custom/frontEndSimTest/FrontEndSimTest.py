@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+###########################################
+## FrontEndSimTest.py
+##
+## Created: 17 October 2026
+## Modified: 17 October 2026
+##
+## Purpose: Confirm that the BTB, RAS and class prediction simulator behaves as expected.
+##
+## A component of the CORE-V-WALLY configurable RISC-V project.
+##
+## Copyright (C) 2021-23 Harvey Mudd College & Oklahoma State University
+##
+## SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+##
+## Licensed under the Solderpad Hardware License v 2.1 (the “License”); you may not use this file
+## except in compliance with the License, or, at your option, the Apache License version 2.0. You
+## may obtain a copy of the License at
+##
+## https:##solderpad.org/licenses/SHL-2.1/
+##
+## Unless required by applicable law or agreed to in writing, any work distributed under the
+## License is distributed on an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+## either express or implied. See the License for the specific language governing permissions
+## and limitations under the License.
+################################################################################################
+
+import sys
+import os
+import tempfile
+import subprocess
+
+sys.path.append(os.path.expanduser("~/cvw/bin"))
+import FrontEndSim as fe
+import LogReader
+import BinLog
+
+# A call and its return, twice, then a taken branch, each CFI on its own BTB entry
+LOG = """TRAIN
+BEGIN bench.elf.memfile
+80000100 t 80000200 c
+80000200 t 80000104 r
+80000100 t 80000200 c
+80000200 t 80000104 r
+80000300 t 80000100 b
+END bench.elf.memfile
+"""
+
+# A log of the old layout, with only the conditional branches and no targets or classes
+OLDLOG = """TRAIN
+BEGIN bench.elf.memfile
+80000300 t
+80000300 n
+80000300 t
+END bench.elf.memfile
+"""
+
+if __name__ == "__main__":
+    J, C = ord('j'), ord('c')
+
+    #a one way BTB is untagged: 0x108 aliases 0x100 in a BTB of 2 sets
+    btb = fe.BTB(2, 1)
+    assert (btb.lookup(0x100) == (None, 0))
+    btb.update(0x100, J, 0x200)
+    assert (btb.lookup(0x108) == (J, 0x200))
+    assert (btb.lookup(0x104) == (None, 0))
+
+    #with more ways it is tagged, and replaces the least recently updated way
+    btb = fe.BTB(2, 2)
+    btb.update(0x100, J, 0x200)
+    assert (btb.lookup(0x108) == (None, 0))
+    btb.update(0x108, C, 0x300)
+    btb.update(0x110, J, 0x400)
+    assert (btb.lookup(0x100) == (None, 0))
+    assert (btb.lookup(0x108) == (C, 0x300))
+    assert (btb.lookup(0x110) == (J, 0x400))
+
+    #a full wrap stack overwrites its oldest entry, and pops even when empty
+    ras = fe.RAS(2, 'wrap')
+    for pc in (1, 2, 3):
+        ras.push(pc)
+    assert ([ras.pop() for i in range(3)] == [3, 2, 3])
+
+    #a full stop stack drops the push, and pops nothing when empty
+    ras = fe.RAS(2, 'stop')
+    for pc in (1, 2, 3):
+        ras.push(pc)
+    assert ([ras.pop() for i in range(3)] == [2, 1, None])
+
+    #a return goes 2 or 4 bytes past its call
+    assert (fe.returnpredicted(0x100, 0x104))
+    assert (fe.returnpredicted(0x100, 0x102))
+    assert (not fe.returnpredicted(0x100, 0x108))
+    assert (not fe.returnpredicted(None, 0x104))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logpath = os.path.join(tmpdir, "branch_gshare6.log")
+        with open(logpath, "w") as f:
+            f.write(LOG)
+        btb, ras = (1024, 1), (16, 'wrap')
+
+        #the BTB misses the first call, the first return and the branch, so it gets
+        #their classes wrong, and the first call's and the branch's targets; the
+        #RAS gets both returns right. The front end goes wrong after each BTB miss.
+        results = fe.simulate([logpath], [btb], [ras], 'twobit', 6)
+        assert (results[0][1][(btb, ras)] == {'BTMR': (2, 3), 'RASMPR': (0, 2), 'ClassMPR': (3, 5), 'FEMPR': (3, 5)})
+
+        #decoding the class in Fetch leaves the first call, whose target the BTB
+        #does not hold yet, and the branch, which twobit predicts not taken
+        results = fe.simulate([logpath], [btb], [ras], 'twobit', 6, decode=True)
+        assert (results[0][1][(btb, ras)] == {'BTMR': (2, 3), 'RASMPR': (0, 2), 'ClassMPR': (0, 5), 'FEMPR': (2, 5)})
+        assert (round(fe.summarize(results, [btb], [ras])[(btb, ras)]['FEMPR'], 9) == 40.0)
+
+        #a log of the old layout is refused, as text and converted to a binary log
+        oldpath = os.path.join(tmpdir, "branch_old6.log")
+        with open(oldpath, "w") as f:
+            f.write(OLDLOG)
+        binpath = os.path.join(tmpdir, "branch_old6.binlog")
+        BinLog.convert(oldpath, binpath, 'branch')
+        newbinpath = os.path.join(tmpdir, "branch_gshare6.binlog")
+        BinLog.convert(logpath, newbinpath, 'branch')
+        assert (LogReader.branchlayout(oldpath) == LogReader.OLDBRANCHLAYOUT)
+        assert (LogReader.branchlayout(binpath) == LogReader.OLDBRANCHLAYOUT)
+        assert (LogReader.branchlayout(newbinpath) == LogReader.BRANCHLAYOUT)
+        script = os.path.join(os.path.dirname(os.path.abspath(fe.__file__)), "FrontEndSim.py")
+        for path in (oldpath, binpath):
+            run = subprocess.run([sys.executable, script, path, "-j", "1"], capture_output=True, text=True)
+            assert (run.returncode == 1 and "only conditional branches" in run.stderr)
+        run = subprocess.run([sys.executable, script, newbinpath, "-j", "1"], capture_output=True, text=True)
+        assert (run.returncode == 0)
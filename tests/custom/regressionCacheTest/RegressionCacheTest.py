@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+###########################################
+## RegressionCacheTest.py
+##
+## Created: 17 October 2026
+## Modified: 17 October 2026
+##
+## Purpose: Confirm that regression-wally's result cache keys change with a job's inputs, and only then.
+##
+## A component of the CORE-V-WALLY configurable RISC-V project.
+##
+## Copyright (C) 2021-23 Harvey Mudd College & Oklahoma State University
+##
+## SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+##
+## Licensed under the Solderpad Hardware License v 2.1 (the “License”); you may not use this file
+## except in compliance with the License, or, at your option, the Apache License version 2.0. You
+## may obtain a copy of the License at
+##
+## https:##solderpad.org/licenses/SHL-2.1/
+##
+## Unless required by applicable law or agreed to in writing, any work distributed under the
+## License is distributed on an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+## either express or implied. See the License for the specific language governing permissions
+## and limitations under the License.
+################################################################################################
+
+import sys
+import os
+import time
+import tempfile
+from collections import namedtuple
+
+sys.path.append(os.path.expanduser("~/cvw/sim"))
+import regressionCache as rc
+
+TestCase = namedtuple("TestCase", ['name', 'variant', 'cmd', 'grepstr'])
+
+# a tree with just enough of src/, config/, testbench/, sim/ and the tests for the keys
+FILES = {
+    "src/core.sv": "module core; endmodule\n",
+    "config/shared/shared.vh": "`define SHARED 1\n",
+    "config/rv64gc/config.vh": "`define XLEN 64\n",
+    "config/rv32gc/config.vh": "`define XLEN 32\n",
+    "testbench/tests.vh": '`define WALLYTEST "0"\n'
+                          "string tvpaths[] = '{\"tests/\"};\n"
+                          "string arch64i[] = '{`WALLYTEST, \"add\"};\n"
+                          "string arch64m[] = '{`WALLYTEST, \"mul\"};\n",
+    "testbench/testbench.sv": "case (TEST)\n"
+                              '  "arch64i": tests = arch64i;\n'
+                              '  "arch64m": tests = arch64m;\n'
+                              "endcase\n",
+    "sim/wally-batch.do": "vsim\n",
+    "sim/tests/add.elf.memfile": "00000013\n",
+    "sim/tests/mul.elf.memfile": "02000033\n",
+}
+
+def write(path, text):
+    with open(os.path.join(rc.wallyDir, path), "w") as f:
+        f.write(text)
+
+# the key a new run of regression-wally would compute
+def key(config):
+    return rc.ResultCache(cacheDir).key(config)
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmpdir:
+        rc.wallyDir = tmpdir
+        rc.simDir = os.path.join(tmpdir, "sim")
+        cacheDir = os.path.join(tmpdir, "sim", "logs", "resultcache")
+        for path, text in FILES.items():
+            os.makedirs(os.path.dirname(os.path.join(tmpdir, path)), exist_ok=True)
+            write(path, text)
+        test = TestCase("arch64i", "rv64gc", "vsim -c <<!\ndo wally-batch.do rv64gc arch64i\n!", "All tests ran without failures")
+        other = TestCase("arch64m", "rv64gc", "vsim -c <<!\ndo wally-batch.do rv64gc arch64m\n!", "All tests ran without failures")
+
+        #the key is the same from run to run, whether the file hashes are
+        #computed afresh or come from filehashes.json
+        first = key(test)
+        assert (key(test) == first)
+        cache = rc.ResultCache(cacheDir)
+        assert (cache.key(test) == first)
+        cache.save()
+        assert (rc.ResultCache(cacheDir).fileHashes)
+        assert (key(test) == first)
+        assert (key(other) != first)
+
+        #touching a file does not change the key, but changing its contents does
+        os.utime(os.path.join(tmpdir, "src/core.sv"), ns=(time.time_ns() + 10**9,)*2)
+        assert (key(test) == first)
+        write("src/core.sv", "module core(input logic clk); endmodule\n")
+        rtl = key(test)
+        assert (rtl != first)
+
+        #a job depends on its own config and tests, not on another variant's or test's
+        write("config/rv32gc/config.vh", "`define XLEN 32 // changed\n")
+        write("sim/tests/mul.elf.memfile", "02000033\n02000033\n")
+        assert (key(test) == rtl)
+        write("config/rv64gc/config.vh", "`define XLEN 64 // changed\n")
+        config = key(test)
+        assert (config != rtl)
+        write("sim/tests/add.elf.memfile", "00000013\n00000013\n")
+        assert (key(test) != config)
+
+        #a -coverage run of the same test is a different job
+        assert (key(test._replace(cmd=test.cmd.replace("arch64i", "arch64i -coverage"))) != key(test))